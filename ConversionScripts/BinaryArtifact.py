@@ -0,0 +1,48 @@
+"""
+The helpers shared by the binary artifacts of the pipeline, such as the compiled model of ModelCompiler.py. Each artifact begins with
+its own 4-byte magic and stores its arrays little-endian, whatever the byte order of the host writing or reading it; the artifact
+modules read and write them through these helpers, rather than each keeping its own copy.
+
+Usage:
+	ofile.write(ArrayBytes(array.array("i", [1, 2, 3])))
+	ReadArray("i", data[start:end])	-> array.array("i", [1, 2, 3])
+	HasMagic(path, b"PMC1"), ReadMagic(path)
+"""
+
+from __future__ import print_function
+import sys
+import array
+
+"""
+Returns the bytes of the array @arr, little-endian.
+"""
+def ArrayBytes(arr):
+	if sys.byteorder == "big":
+		arr = array.array(arr.typecode, arr)
+		arr.byteswap()
+	return arr.tobytes()
+
+"""
+Returns an array of @typecode holding the little-endian @data, any bytes-like object.
+"""
+def ReadArray(typecode, data):
+	arr = array.array(typecode)
+	arr.frombytes(data)
+	if sys.byteorder == "big":
+		arr.byteswap()
+	return arr
+
+"""
+Returns the first 4 bytes of the file at @path, the magic of an artifact.
+"""
+def ReadMagic(path):
+	ifile = open(path, "rb")
+	magic = ifile.read(4)
+	ifile.close()
+	return magic
+
+"""
+Returns true if the file at @path begins with @magic.
+"""
+def HasMagic(path, magic):
+	return ReadMagic(path) == magic
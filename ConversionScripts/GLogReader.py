@@ -0,0 +1,169 @@
+"""
+A streaming reader of .g logs, the graph-per-trace format read and written by gbad/subdue, the compressor and the conversion scripts:
+
+	% 159
+	XP # 1
+	v 1 "START"
+	v 2 "A"
+	d 1 2 "e"
+
+The log is read line by line, and each trace is yielded as a GRecord as soon as its declarations are complete, so memory is bounded
+by the largest trace rather than the log. A record begins at its "XP" line; the vertex ("v id label") and edge ("d", "u" or "e"
+src dst [label]) declarations that follow belong to it, until the next "XP" line. Labels may be quoted, in which case they may contain
+spaces, quotes of their own aside; nothing else in a label is special. The last comment line ("%" or "//") before a record, such as the
+o2g "% traceName" lines, is kept as the record's Comment; all other lines are disregarded. Gzipped logs (as written by the compressor's
+--gzip option) are read transparently.
+
+Usage:
+	for record in ReadTraces(path):
+		record.Header, record.Comment, record.Vertices, record.Edges
+"""
+
+from __future__ import print_function
+import sys
+import gzip
+
+"""
+One trace of a .g log.
+
+@Header: The trace's "XP" line, such as "XP # 12"
+@Comment: The last comment line preceding the trace, or None
+@Vertices: The vertex declarations, as a dict of vertex id (int) -> label
+@Edges: The edge declarations, as a list of (src id, dst id, label) tuples in declaration order; the label is "" if not given
+"""
+class GRecord(object):
+	__slots__ = ("Header", "Comment", "Vertices", "Edges")
+
+	def __init__(self, header, comment=None):
+		self.Header = header
+		self.Comment = comment
+		self.Vertices = {}
+		self.Edges = []
+
+	"""
+	Returns the trace id given by the header, the token after "#", or None if the header doesn't have one.
+	"""
+	def XpId(self):
+		if "#" not in self.Header:
+			return None
+		return self.Header.split("#")[1].strip()
+
+"""
+Returns the label @s, with its quotes removed if it is quoted.
+"""
+def _parseLabel(s):
+	s = s.strip()
+	if s[0:1] == "\"":
+		end = s.find("\"", 1)
+		if end < 0:
+			return s[1:]
+		return s[1:end]
+	return s
+
+"""
+Parses a single vertex or edge declaration line, @ln (stripped), into @vertices or @edges.
+Returns false if @ln isn't a declaration.
+"""
+def _parseDeclaration(ln, vertices, edges):
+	kind = ln[0:2]
+	if kind == "v ":
+		tokens = ln.split(None, 2)
+		vertices[int(tokens[1])] = _parseLabel(tokens[2]) if len(tokens) > 2 else ""
+	elif kind == "d " or kind == "u " or kind == "e ":
+		tokens = ln.split(None, 3)
+		edges.append((int(tokens[1]), int(tokens[2]), _parseLabel(tokens[3]) if len(tokens) > 3 else ""))
+	else:
+		return False
+	return True
+
+"""
+Parses the vertex and edge declarations among @lines, which have no "XP" header, such as the substructures printed by gbad.
+
+Returns: (vertex dict, edge list), as in GRecord
+"""
+def ParseDeclarations(lines):
+	vertices = {}
+	edges = []
+	for line in lines:
+		_parseDeclaration(line.strip(), vertices, edges)
+	return vertices, edges
+
+"""
+Yields the traces declared among @lines, any iterable of .g lines (an open file, a list), one GRecord at a time.
+"""
+def ParseTraces(lines):
+	record = None
+	comment = None
+	for line in lines:
+		ln = line.strip()
+		if len(ln) == 0:
+			continue
+		if ln[0:2] == "XP":
+			if record is not None:
+				yield record
+			record = GRecord(ln, comment)
+			comment = None
+		elif ln[0] == "%" or ln[0:2] == "//":
+			comment = ln
+		elif record is not None:
+			_parseDeclaration(ln, record.Vertices, record.Edges)
+	if record is not None:
+		yield record
+
+"""
+Returns true if the file at @path is gzipped, by its magic bytes.
+"""
+def IsGzipped(path):
+	ifile = open(path, "rb")
+	magic = ifile.read(2)
+	ifile.close()
+	return magic == b"\x1f\x8b"
+
+"""
+Opens the .g log at @path for reading as text, decompressing it if it is gzipped.
+"""
+def OpenLog(path):
+	if IsGzipped(path):
+		return gzip.open(path, "rt")
+	return open(path, "r")
+
+"""
+Yields the traces of the .g log at @path, one GRecord at a time.
+"""
+def ReadTraces(path):
+	with OpenLog(path) as logFile:
+		for record in ParseTraces(logFile):
+			yield record
+
+"""
+Returns @record in .g format, declaring its edges as @edgeKind ("d" for subdue/gbad, "u" for gbad-fsm), with linux line endings.
+"""
+def FormatRecord(record, edgeKind="d"):
+	lines = []
+	if record.Comment is not None:
+		lines.append(record.Comment)
+	lines.append(record.Header)
+	for vId in record.Vertices:
+		lines.append("v "+str(vId)+" \""+record.Vertices[vId]+"\"")
+	for src, dst, label in record.Edges:
+		#gbad requires a label on every edge
+		lines.append(edgeKind+" "+str(src)+" "+str(dst)+" \""+(label or "e")+"\"")
+	return "\n".join(lines)+"\n"
+
+def usage():
+	print("Usage: python GLogReader.py [.g log path], to print the number of traces, vertices and edges in the log")
+
+def main():
+	if len(sys.argv) < 2:
+		print("ERROR incorrect number of arguments passed to GLogReader.py")
+		usage()
+		exit()
+	numTraces = numVertices = numEdges = 0
+	for record in ReadTraces(sys.argv[1]):
+		numTraces += 1
+		numVertices += len(record.Vertices)
+		numEdges += len(record.Edges)
+	print(sys.argv[1]+": "+str(numTraces)+" traces, "+str(numVertices)+" vertices, "+str(numEdges)+" edges")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,305 @@
+"""
+Compiles a graphml process model into a compact binary artifact, so that the pipeline stages (DataGenerator, the Retracer,
+the sampling algorithm, graph comparison) don't each re-parse the graphml xml and rebuild their own lookup structures.
+
+The artifact holds the model in compressed-sparse-row form: the out-edges of vertex v occupy the slots rowPtr[v] to rowPtr[v+1]-1
+of the per-edge arrays. Each slot stores the edge's target, its original igraph edge id, an edge-type enum into the artifact's
+edge-type table ("SEQ", "AND", "OR", "LOOP", ...), its probability and its anomaly flag. The header also holds the vertex name
+table (vertex id == index into the table), the START/END vertex ids, the graph-level attributes, the sha1 of the source graphml,
+and a content hash over the model itself, such that two artifacts with the same hash are the same model.
+
+File layout:
+	4 bytes		magic "PMC1"
+	uint32		length of the json header
+	json header
+	int32[numVertices+1]	rowPtr
+	int32[numEdges]		targets
+	int32[numEdges]		edgeIds
+	uint8[numEdges]		edge types
+	float64[numEdges]	probabilities
+	uint8[numEdges]		isAnomalous flags
+All arrays are little-endian.
+
+Usage: python ModelCompiler.py [graphml path] [optional output path; defaults to the graphml path with .pmc extension]
+
+Other scripts can pass either a graphml or a compiled .pmc path to ReadModel(), which returns an igraph graph equivalent to
+igraph.Graph.Read(graphmlPath), or to LoadModel(), which returns the CompiledModel itself.
+"""
+
+from __future__ import print_function
+import sys
+import json
+import struct
+import hashlib
+import array
+import BinaryArtifact
+
+MAGIC = b"PMC1"
+
+class CompiledModel(object):
+	def __init__(self):
+		self.Names = []		#vertex id -> activity name
+		self.Ids = {}		#activity name -> vertex id
+		self.Start = -1
+		self.End = -1
+		self.GraphAttributes = {}
+		self.EdgeTypes = []	#the edge-type table; the types array holds indices into this list
+		self.RowPtr = array.array("i")
+		self.Targets = array.array("i")
+		self.EdgeIds = array.array("i")
+		self.Types = array.array("B")
+		self.Probabilities = array.array("d")
+		self.Anomalous = array.array("B")
+		self.HasProbability = False
+		self.HasType = False
+		self.HasAnomalous = False
+		self.SourceHash = ""
+		self.Hash = ""
+
+	"""
+	Builds the compiled representation from an igraph graph, as read from graphml.
+
+	@graph: an igraph graph with vertex "name" attributes and a START and END vertex
+	@sourceHash: sha1 hex digest of the graphml from which @graph was read, if any
+	"""
+	def Compile(self, graph, sourceHash=""):
+		self.Names = [str(name) for name in graph.vs["name"]]
+		self.Ids = dict([(name, vId) for vId, name in enumerate(self.Names)])
+		self.Start = self.Ids.get("START", -1)
+		self.End = self.Ids.get("END", -1)
+		self.GraphAttributes = dict([(attr, graph[attr]) for attr in graph.attributes()])
+		self.SourceHash = sourceHash
+
+		edgeAttributes = graph.es.attributes()
+		self.HasProbability = "probability" in edgeAttributes
+		self.HasType = "type" in edgeAttributes
+		self.HasAnomalous = "isAnomalous" in edgeAttributes
+
+		#bucket the edge ids by source; a stable bucketing preserves the igraph order of each vertex's out-edges
+		n = len(self.Names)
+		buckets = [[] for i in range(n)]
+		for e in graph.es:
+			buckets[e.source].append(e)
+
+		self.EdgeTypes = []
+		typeIndex = {}
+		self.RowPtr = array.array("i", [0])
+		self.Targets = array.array("i")
+		self.EdgeIds = array.array("i")
+		self.Types = array.array("B")
+		self.Probabilities = array.array("d")
+		self.Anomalous = array.array("B")
+		for bucket in buckets:
+			for e in bucket:
+				self.Targets.append(e.target)
+				self.EdgeIds.append(e.index)
+				edgeType = str(e["type"]) if self.HasType else ""
+				if edgeType not in typeIndex:
+					typeIndex[edgeType] = len(self.EdgeTypes)
+					self.EdgeTypes.append(edgeType)
+				self.Types.append(typeIndex[edgeType])
+				self.Probabilities.append(float(e["probability"]) if self.HasProbability and e["probability"] is not None else 1.0)
+				self.Anomalous.append(1 if self.HasAnomalous and e["isAnomalous"] else 0)
+			self.RowPtr.append(len(self.Targets))
+
+		self.Hash = self._contentHash()
+
+	def NumVertices(self):
+		return len(self.Names)
+
+	def NumEdges(self):
+		return len(self.Targets)
+
+	"""
+	Returns the csr slots of @vId's out-edges; each slot indexes Targets, EdgeIds, Types, Probabilities and Anomalous.
+	"""
+	def OutSlots(self, vId):
+		return range(self.RowPtr[vId], self.RowPtr[vId+1])
+
+	"""
+	Returns the vertex ids of @vId's successors, in the igraph order of @vId's out-edges.
+	"""
+	def Successors(self, vId):
+		return self.Targets[self.RowPtr[vId]:self.RowPtr[vId+1]]
+
+	"""
+	Returns the (srcName, dstName) -> igraph edge id index, as built by several of the stages after reading the graphml.
+	"""
+	def EdgeIndex(self):
+		index = {}
+		for vId in range(len(self.Names)):
+			srcName = self.Names[vId]
+			for slot in range(self.RowPtr[vId], self.RowPtr[vId+1]):
+				index[(srcName, self.Names[self.Targets[slot]])] = self.EdgeIds[slot]
+		return index
+
+	"""
+	Rebuilds the igraph graph, with the vertex/edge order and the name, label, type, probability, isAnomalous and color
+	attributes of the graph from which this model was compiled.
+	"""
+	def ToGraph(self):
+		import igraph
+		m = len(self.Targets)
+		edges = [None] * m
+		types = [None] * m
+		probabilities = [None] * m
+		anomalous = [None] * m
+		for vId in range(len(self.Names)):
+			for slot in range(self.RowPtr[vId], self.RowPtr[vId+1]):
+				eId = self.EdgeIds[slot]
+				edges[eId] = (vId, self.Targets[slot])
+				types[eId] = self.EdgeTypes[self.Types[slot]]
+				probabilities[eId] = self.Probabilities[slot]
+				anomalous[eId] = self.Anomalous[slot] == 1
+
+		graph = igraph.Graph(n=len(self.Names), edges=edges, directed=True)
+		graph.vs["name"] = self.Names
+		graph.vs["label"] = self.Names
+		for attr in self.GraphAttributes:
+			graph[attr] = self.GraphAttributes[attr]
+		if self.HasType:
+			graph.es["type"] = types
+		if self.HasProbability:
+			graph.es["probability"] = probabilities
+		if self.HasAnomalous:
+			graph.es["isAnomalous"] = anomalous
+			graph.es["color"] = ["orange" if isAnomalous else "black" for isAnomalous in anomalous]
+
+		return graph
+
+	def _header(self):
+		header = {}
+		header["numVertices"] = len(self.Names)
+		header["numEdges"] = len(self.Targets)
+		header["names"] = self.Names
+		header["start"] = self.Start
+		header["end"] = self.End
+		header["graphAttributes"] = self.GraphAttributes
+		header["edgeTypes"] = self.EdgeTypes
+		header["hasProbability"] = self.HasProbability
+		header["hasType"] = self.HasType
+		header["hasAnomalous"] = self.HasAnomalous
+		return header
+
+	def _arrays(self):
+		return [self.RowPtr, self.Targets, self.EdgeIds, self.Types, self.Probabilities, self.Anomalous]
+
+	"""
+	The hash of the model content only (names, structure and edge data), independent of the source file or artifact header.
+	"""
+	def _contentHash(self):
+		h = hashlib.sha1()
+		h.update(json.dumps(self._header(), sort_keys=True).encode("utf-8"))
+		for arr in self._arrays():
+			h.update(BinaryArtifact.ArrayBytes(arr))
+		return h.hexdigest()
+
+	def Save(self, path):
+		header = self._header()
+		header["sourceHash"] = self.SourceHash
+		header["hash"] = self.Hash
+		headerBytes = json.dumps(header, separators=(",",":")).encode("utf-8")
+
+		ofile = open(path, "wb")
+		ofile.write(MAGIC)
+		ofile.write(struct.pack("<I", len(headerBytes)))
+		ofile.write(headerBytes)
+		for arr in self._arrays():
+			ofile.write(BinaryArtifact.ArrayBytes(arr))
+		ofile.close()
+
+	def Load(self, path):
+		ifile = open(path, "rb")
+		data = ifile.read()
+		ifile.close()
+		if data[0:4] != MAGIC:
+			raise ValueError("Not a compiled process model: "+path)
+
+		headerLen = struct.unpack("<I", data[4:8])[0]
+		header = json.loads(data[8:8+headerLen].decode("utf-8"))
+		self.Names = [str(name) for name in header["names"]]
+		self.Ids = dict([(name, vId) for vId, name in enumerate(self.Names)])
+		self.Start = header["start"]
+		self.End = header["end"]
+		self.GraphAttributes = header["graphAttributes"]
+		self.EdgeTypes = [str(edgeType) for edgeType in header["edgeTypes"]]
+		self.HasProbability = header["hasProbability"]
+		self.HasType = header["hasType"]
+		self.HasAnomalous = header["hasAnomalous"]
+		self.SourceHash = header["sourceHash"]
+		self.Hash = header["hash"]
+
+		n = header["numVertices"]
+		m = header["numEdges"]
+		offset = 8 + headerLen
+		arrays = []
+		for typecode, length in [("i", n+1), ("i", m), ("i", m), ("B", m), ("d", m), ("B", m)]:
+			nbytes = length * array.array(typecode).itemsize
+			arrays.append(BinaryArtifact.ReadArray(typecode, data[offset:offset+nbytes]))
+			offset += nbytes
+		self.RowPtr, self.Targets, self.EdgeIds, self.Types, self.Probabilities, self.Anomalous = arrays
+
+		return self
+
+"""
+Returns true if the file at @path is a compiled model artifact, by its magic bytes.
+"""
+def IsCompiledModel(path):
+	return BinaryArtifact.HasMagic(path, MAGIC)
+
+def _fileHash(path):
+	ifile = open(path, "rb")
+	h = hashlib.sha1(ifile.read()).hexdigest()
+	ifile.close()
+	return h
+
+"""
+Compiles the graphml model at @graphmlPath, saving the artifact to @outputPath if given.
+Returns: the CompiledModel
+"""
+def CompileModel(graphmlPath, outputPath=None):
+	import igraph
+	model = CompiledModel()
+	model.Compile(igraph.Graph.Read(graphmlPath), _fileHash(graphmlPath))
+	if outputPath is not None:
+		model.Save(outputPath)
+	return model
+
+"""
+Returns the CompiledModel for @path, which may be either a compiled artifact or a graphml model (compiled in memory).
+"""
+def LoadModel(path):
+	if IsCompiledModel(path):
+		return CompiledModel().Load(path)
+	return CompileModel(path)
+
+"""
+A drop-in replacement for igraph.Graph.Read(@path) over process models: accepts either a graphml model or a compiled artifact,
+skipping the xml parse for the latter.
+"""
+def ReadModel(path):
+	if IsCompiledModel(path):
+		return CompiledModel().Load(path).ToGraph()
+	import igraph
+	return igraph.Graph.Read(path)
+
+def usage():
+	print("Usage: python ModelCompiler.py [graphml path] [optional output path; defaults to the graphml path with .pmc extension]")
+
+def main():
+	if len(sys.argv) < 2:
+		print("ERROR incorrect number of arguments passed to ModelCompiler.py")
+		usage()
+		exit()
+
+	graphmlPath = sys.argv[1]
+	if len(sys.argv) > 2:
+		outputPath = sys.argv[2]
+	else:
+		outputPath = graphmlPath.replace(".graphml", "") + ".pmc"
+
+	model = CompileModel(graphmlPath, outputPath)
+	print("Compiled "+graphmlPath+" to "+outputPath+": "+str(model.NumVertices())+" vertices, "+str(model.NumEdges())+" edges, hash "+model.Hash)
+
+if __name__ == "__main__":
+	main()
@@ -1,9 +1,10 @@
 """
 The gbad-fsm version of gbad requires undirected edge declaration in the .g input format.
-This script just performs a find-replace of all 'd ' edge declarations with 'u '.
+This script streams the log one trace at a time, rewriting all edge declarations as 'u '.
 """
 from __future__ import print_function
 import sys
+import GLogReader
 
 def usage():
 	print("python SubdueLogToGbadFsm.py [input subdue .g file] [output for fsm-formatted .g file]")
@@ -16,13 +17,10 @@ if len(sys.argv) != 3:
 inputFile = sys.argv[1]
 outputFile = sys.argv[2]
 print("Converting subdue .g file "+inputFile+" to .g format at "+outputFile)
-ifile = open(inputFile, "r")
 ofile = open(outputFile,"w+")
 
-log = ifile.read()
-log = log.replace("\nd ","\nu ")
-ofile.write(log)
+for record in GLogReader.ReadTraces(inputFile):
+	ofile.write(GLogReader.FormatRecord(record, "u"))
 
-ifile.close()
 ofile.close()
 
@@ -49,6 +49,7 @@ from __future__ import print_function
 import sys
 import xes
 import copy
+import GLogReader
 
 def usage():
 	print("Usage: python ./g2xes.py [path to .g input file] [path to output file] [optional process name]")
@@ -66,49 +67,24 @@ The trace name is whatever is the line led by '% ' in the .g file at the top of
 The trace number is just the sequential numbr of the trace as it occurred in the .g file, starting from 0.
 """
 def BuildTraceList(inputPath):
-	vertices = {}
-	edges = []  #edges will be stored as list of tuples: (vertex source id, vertex dest id, activity)
-	name = ""
-	traceNo = 0
 	traces = []
+	traceNo = 0
 	
-	inputFile = open(inputPath,"r")
-	#iteratively builds the vertex dictionary {vertex id: name string} and edge list from the .g data, and add them to the trace list
-	for rline in inputFile.readlines():
-		line = rline.strip()
-		#when empty line found, add the previous trace, then clear the trace structure
-		if len(line) == 0:
-			traces += [[traceNo + 1, traceNote.strip(), traceVertices, traceEvents]]
-			traceNo += 1
-		if len(line.strip()) >= 2:
-			tokens = line.split(" ")
-			#store the trace header as the trace's name
-			if line[0] == "%":
-				traceNote = line[2:].strip()
-				traceVertices = {}
-				traceEvents = []
-			#store a vertex
-			if line[0:2] == "v ":
-				if len(tokens) == 3:
-					id = int(tokens[1])
-					name = tokens[2]
-					traceVertices[id] = name
-				else:
-					print("ERROR failed to parse vertex tokens from vertex line: "+line)
-			#store an edge
-			if line[0:2] == "e ":
-				if len(tokens) == 4:
-					src = int(tokens[1])
-					dest = int(tokens[2])
-					activity = tokens[3]
-					traceEvents += [(src,dest,activity)]
-					#validate the vertex ids:
-					if src not in traceVertices or dest not in traceVertices:
-						print("ERROR vertex id of edge not found in vertex dict for trace number "+str(traceNo)+" for line: "+line)
-				else:
-					print("ERROR Incorrect number of tokens from event line: "+line+" Make sure the event names contain no spaces.")
-
-	traces += [[traceNo + 1, traceNote.strip(), traceVertices, traceEvents]]
+	#the .g data is streamed one trace at a time; each trace's vertex dictionary {vertex id: name string} and edge list are added to the trace list
+	for record in GLogReader.ReadTraces(inputPath):
+		#store the trace header as the trace's name; o2g logs give it on the '% ' line preceding each trace
+		if record.Comment is not None:
+			traceNote = record.Comment[2:].strip()
+		else:
+			traceNote = str(record.XpId())
+		traceEvents = []
+		for src, dest, activity in record.Edges:
+			traceEvents += [(src,dest,activity)]
+			#validate the vertex ids:
+			if src not in record.Vertices or dest not in record.Vertices:
+				print("ERROR vertex id of edge not found in vertex dict for trace number "+str(traceNo)+" for edge: "+str((src,dest,activity)))
+		traces += [[traceNo + 1, traceNote, record.Vertices, traceEvents]]
+		traceNo += 1
 
 	#print("Parsed "+str(traceNo)+"/"+str(len(traces))+" from file: "+inputPath)
 	
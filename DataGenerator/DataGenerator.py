@@ -29,6 +29,9 @@ import sys
 import math
 import os
 import matplotlib.pyplot as plt
+#the model compiler lives with the other conversion scripts; it reads either graphml or compiled (.pmc) models
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import ModelCompiler
 
 class DataGenerator(object):
 	def __init__(self):
@@ -46,9 +49,9 @@ class DataGenerator(object):
 	and hence the probabilistic logic/parameters for choosing walks.
 	
 	Notes: This method requires that every activity in the model is unique. Also, every AND must be appended with some activity,
-	to guarantee that a recursive search down the AND-branches recombine at some node, which can then be found by chopping off
-	the non-matching prefixes of these searches. For example, the left and right searches for (ABC&EFG)H gives "ABCH..." and "EFGH...". 
-	Given the constraints, the joining node of the AND is H, and can be detected as such, as the first matching char in the left and right strings.
+	to guarantee that the AND-branches recombine at some node. For example, the branches of (ABC&EFG)H rejoin at H. That join node is
+	the immediate post-dominator of the split node over the non-anomalous edges, precomputed in _buildGraph(), so each branch is walked only up to the join. (Walking
+	each branch to END and matching the prefixes is exponential in the number of sequential ANDs, which is prohibitive for large models.)
 	
 	Returns: A list of (igraph-edge,time) tuples, representing all transitions for this trace. The reason for this construction is we need to preserve some of the
 	edge info for post-processing analysis, but primarily because AND splits (parallel paths) can't be represented as a string. The 'time' member of the tuple
@@ -61,14 +64,22 @@ class DataGenerator(object):
 	@startTime: The discrete time step (some integer) representing the start time for this walk.
 	"""
 	def _generateTrace(self,startNode, startTime):
+		return self._walk(startNode, startTime)[0]
+
+	"""
+	The walk underlying _generateTrace(), which also stops at @stopNode, if given.
+	
+	Returns: A tuple of the (igraph-edge,time) transition list and the time step at which the walk reached END or @stopNode.
+	"""
+	def _walk(self, startNode, startTime, stopNode=None):
 		curNode = startNode
 		isAnomalousTrace = False
 		transitionList = []
 		currentTime = startTime
 		
-		while curNode["label"] != "END":
+		while curNode["label"] != "END" and curNode != stopNode:
 			#randomly select and follow an outgoing edge from the current node, until we reach the last node; there should be at most 2 outgoing edges for any node
-			outEdges = [outEdge for outEdge in self._graph.es if outEdge.source == curNode.index]
+			outEdges = self._outEdges[curNode.index]
 			numEdges = len(outEdges)
 			edgeTypes = [e["type"] for e in outEdges]
 			#print(str(edgeTypes))
@@ -124,42 +135,23 @@ class DataGenerator(object):
 					transitionList.append((outEdges[0], currentTime))
 					transitionList.append((outEdges[1], currentTime))
 					currentTime += 1
-					#For AND splits, go down both branches, then glue their shared prefixes to get the re-join point of the branches
+					#For AND splits, go down both branches up to the node at which they rejoin
+					joinNode = self._andJoins[curNode.index]
 					leftNode = self._graph.vs[outEdges[0].target]
-					leftPath = self._generateTrace(leftNode,currentTime)
+					leftPrefix, leftTime = self._walk(leftNode, currentTime, joinNode)
 					rightNode = self._graph.vs[outEdges[1].target]
-					rightPath = self._generateTrace(rightNode, currentTime)
-
-					#TODO: MAKE THIS A FUNCTION
-					#make sure this whole search returns index of END node if no match is found; although, we do guarantee each AND split is appended with an alpha
-					#find the first char at which the two strings match; on a 'mostly' acyclic graph, this is the node (via its name/label) at which the AND rejoined
-					i = 0
-					matchFound = False
-					#for each char in leftPath, search for match in rightPath
-					while i < len(leftPath) and not matchFound:
-						j = 0
-						while j < len(rightPath) and not matchFound:
-							if self._getNode(leftPath[i][0].source)["label"] == self._getNode(rightPath[j][0].source)["label"]:
-								matchFound = True
-								leftJoinIndex = i
-								rightJoinIndex = j
-							j += 1
-						i += 1
-					#returns index of first matching node, which can be proven to be the join-point of the AND split
-					leftPrefix = leftPath[0:leftJoinIndex]
-					if len(leftPrefix) > 0:
-						transitionList += leftPath[0:leftJoinIndex]
-					rightPrefix = rightPath[0:rightJoinIndex]
-					if len(rightPrefix) > 0:
-						transitionList += rightPath[0:rightJoinIndex]
+					rightPrefix, rightTime = self._walk(rightNode, currentTime, joinNode)
+					transitionList += leftPrefix
+					transitionList += rightPrefix
+
+					#this should be unreachable, since every AND is appended with some char. Should never reach END node.
+					if joinNode is None:
+						print("ERROR no join node found in _generate() for AND split at node: "+curNode["label"])
+						joinNode = self._endNode
 					#restart walk from the Join node, at which the two AND branches rejoined
-					curNode = self._graph.vs[leftPath[leftJoinIndex][0].source]
+					curNode = joinNode
 					#for AND splits, the join point of the two paths will occur at time max(time-at-end-of-right-path, time-at-end-of-left-path) + 1
-					currentTime = max(rightPath[rightJoinIndex][1], leftPath[leftJoinIndex][1]) + 1
-					
-					#this should be unreachable, since every AND is appended with some char. Should never reach END node.
-					if not matchFound:
-						print("ERROR not matchFound in _generate() for AND. "+str(matchFound)+"  node: "+curNode["label"])
+					currentTime = max(rightTime, leftTime) + 1
 				
 				#OR split detected, so stochastically choose ANY of available edges to follow based on their probability
 				elif edgeType == "OR":
@@ -202,13 +194,13 @@ class DataGenerator(object):
 						currentTime += 1
 					curNode = self._graph.vs[outEdges[0].target]
 					
-		return transitionList
+		return transitionList, currentTime
 	
 	"""
 	Builds the graph and stores some of its basic info for querying.
 	"""
 	def _buildGraph(self, graphmlPath):
-		self._graph = igraph.Graph.Read(graphmlPath)
+		self._graph = ModelCompiler.ReadModel(graphmlPath)
 		#find and store the start and end nodes, so we don't have to look them up constantly
 		for v in self._graph.vs:
 			if v["label"] == "START":
@@ -217,6 +209,26 @@ class DataGenerator(object):
 				self._endNode = v
 		#store edge-travesal info; this is only so we can detect when a LOOP edge has already been traversed, to prevent endless recursion
 		self._graph.es["isTraversed"] = False #mark all edges as not having been walked
+		#cache each vertex's out-edges, in edge order, rather than scanning all edges at every step of a walk
+		self._outEdges = [[] for v in self._graph.vs]
+		for edge in self._graph.es:
+			self._outEdges[edge.source].append(edge)
+		#the join node of each AND split is its immediate post-dominator over the model's regular edges: the first node through which every
+		#regular path from the split to END passes. Anomalous edges are left out, since OR and null-transition anomalies may jump past the join
+		if "isAnomalous" in self._graph.es.attributes():
+			regularEdges = [edge.index for edge in self._graph.es if not edge["isAnomalous"]]
+		else:
+			regularEdges = range(self._graph.ecount())
+		regularGraph = self._graph.subgraph_edges(regularEdges, delete_vertices=False)
+		postDominators = regularGraph.dominator(self._endNode.index, mode="in")
+		self._andJoins = dict()
+		for v in self._graph.vs:
+			if "AND" in [edge["type"] for edge in self._outEdges[v.index]]:
+				joinId = postDominators[v.index]
+				if joinId >= 0:
+					self._andJoins[v.index] = self._graph.vs[joinId]
+				else:
+					self._andJoins[v.index] = None
 	
 	"""
 	TODO: This function is no longer used, empty transition nodes are just preserved, which shouldn't effect graph compression since the
@@ -298,13 +310,14 @@ class DataGenerator(object):
 	"""
 	def _deduplicateANDSplits(self, trace):
 		filteredTraces = []
+		andSplits = set() #the (source node, timestamp) pairs of the AND edges kept so far
 		for et in trace: #for event tuple
 			#check if this event-tuple et is already in the filteredTraces, based on its timestamp and source node of the edge
 			isNewEdge = True
-			for fet in filteredTraces:
-				#if timestamp and source node match, consider this event tuple a duplicate
-				if et[0]["type"] == "AND" and fet[0]["type"] == "AND" and fet[1] == et[1] and fet[0].source == et[0].source:
-					isNewEdge = False
+			if et[0]["type"] == "AND":
+				split = (et[0].source, et[1])
+				isNewEdge = split not in andSplits
+				andSplits.add(split)
 			#append this event tuple if it is new
 			if isNewEdge:
 				filteredTraces.append(et)
@@ -581,8 +594,8 @@ class DataGenerator(object):
 	for structural anomalies, not just potentially trivial-to-find uniquely labeled anomalies
 	"""
 	def GenerateTraces(self, graphmlPath, n, outputPath="./syntheticTraces.log", thetaTrace=None, thetaAnomaly=None, useNonUniqAnomalies=False):
-		if not graphmlPath.endswith(".graphml"):
-			print("ERROR graphml path is not a graphml file. Path must end with '.graphml'.")
+		if not graphmlPath.endswith(".graphml") and not graphmlPath.endswith(".pmc"):
+			print("ERROR graphml path is not a graphml file. Path must end with '.graphml', or '.pmc' for a compiled model.")
 			return
 	
 		print("Generating traces...")
@@ -650,7 +663,7 @@ class DataGenerator(object):
 				traceDistFile.write(str(ys))
 
 def usage():
-	print("python ./DataGenerator\n\t[path to graphml file]\n\t-n=[integer number of traces]\n\t[-ofile=(path to output file; defaults to ./syntheticTraces.log if not passed)]")
+	print("python ./DataGenerator\n\t[path to graphml file, or its compiled .pmc model]\n\t-n=[integer number of traces]\n\t[-ofile=(path to output file; defaults to ./syntheticTraces.log if not passed)]")
 	print("Optional: --traceTheta=[float]  This parameter, if passed, will overwrite all negative @probability values\n(for OR and LOOP only presumaby) for transitions stored in the graphml")
 """
 
@@ -2,6 +2,27 @@ import igraph
 import copy
 import sys
 import os
+import json
+import multiprocessing
+
+#The legacy single-char activity alphabet. Models of up to 62 activities draw their activity names from it, unchanged.
+LEGACY_ACTIVITIES = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+#Larger models extend the alphabet past the legacy chars into the CJK unified ideographs block (U+4E00-U+9FFF). Activity id i
+#is always rendered as the single code point GetActivityAlphabet(n)[i], so model strings, traces and .g labels stay one symbol per activity.
+EXTENDED_ACTIVITY_BASE = 0x4E00
+MAX_ACTIVITIES = len(LEGACY_ACTIVITIES) + (0x9FFF - EXTENDED_ACTIVITY_BASE + 1)
+
+"""
+Returns the activity alphabet for models of up to @n activities, as a string whose i-th symbol names activity id i.
+For n <= 62 this is the legacy alphanumeric alphabet.
+"""
+def GetActivityAlphabet(n):
+	if n > MAX_ACTIVITIES:
+		print("WARNING "+str(n)+" activities requested, but the activity alphabet only has "+str(MAX_ACTIVITIES))
+		n = MAX_ACTIVITIES
+	if n <= len(LEGACY_ACTIVITIES):
+		return LEGACY_ACTIVITIES
+	return LEGACY_ACTIVITIES + "".join([chr(EXTENDED_ACTIVITY_BASE + i) for i in range(n - len(LEGACY_ACTIVITIES))])
 
 """
 TODO: If this is ever used again, factor out the ModelGenerator and ModelConverter into separate objects, and
@@ -38,10 +59,7 @@ class ModelConverter(object):
 	Returns -1 if node not found, which will occur often as new empty branches are created.
 	"""
 	def _getNodeId(self,nodeName):
-		for v in self._graph.vs:
-			if v["name"] == nodeName:
-				return v.index
-		return -1
+		return self._nodeIds.get(nodeName, -1)
 
 	def _generateUniqueEmptyNodeLabel(self):
 		self._emptyBranchCtr += 1
@@ -69,8 +87,8 @@ class ModelConverter(object):
 	"""
 	def _createNode(self,vName):
 		self._graph.add_vertex(vName)
-		#vertex added, now go look it up so we can decorate some more. This inefficiency is just part of the igraph api.
-		vId = self._getNodeId(vName)
+		vId = len(self._graph.vs) - 1
+		self._nodeIds[vName] = vId
 		self._graph.vs[vId]["label"] = vName
 		return vId
 
@@ -207,7 +225,7 @@ class ModelConverter(object):
 	Detects whether or not this alpha is an activity: either a base activity or "^".
 	"""
 	def _isActivity(self,alpha):
-		return alpha in self._activities or alpha == "^"
+		return alpha in self._activitySet or alpha == "^"
 	
 	"""
 	The recursive model string parser.
@@ -345,7 +363,7 @@ class ModelConverter(object):
 				while i < len(modelString) and modelString[i] != ">":
 					i += 1
 				i+=1
-			if i < len(modelString) and modelString[i] in self._validActivityChars:
+			if i < len(modelString) and (modelString[i] in self._validActivityChars or ord(modelString[i]) >= EXTENDED_ACTIVITY_BASE):
 				exprChars += modelString[i]
 			i+=1
 			
@@ -359,8 +377,9 @@ class ModelConverter(object):
 	
 	@modelString: the parseable model string
 	@showPlot: Whether or not to show the graph to the user
+	@maxPathCount: Optional bound on the START-END path count, for large models whose path count explodes; see _countPaths
 	"""
-	def ConvertModel(self, modelString, showPlot=True):
+	def ConvertModel(self, modelString, showPlot=True, maxPathCount=None):
 		#create the graph
 		self._graph = igraph.Graph(directed=True)
 		#add the edge attributes
@@ -377,6 +396,9 @@ class ModelConverter(object):
 		#add the activities as graph vertices
 		self._graph.add_vertices(self._activities)
 		self._graph.vs["label"] = self._activities
+		self._activitySet = set(self._activities)
+		#maps vertex names to their ids, for constant-time lookups as edges are added
+		self._nodeIds = dict([(activity, vId) for vId, activity in enumerate(self._activities)])
 		#print("ACTIVITIES: "+str(self._activities))
 
 		#recursively add nodes to the graph
@@ -389,7 +411,7 @@ class ModelConverter(object):
 		self._graph.vs[endId]["label"] = "END"
 		#count and store the number of paths from start to end node in graph, allowing loop repeats a max of 2 times
 		print("Counting num traces via path from START to END for k=2 (per Bezerra)")
-		self._graph["PathCount"] = self._countPaths(self._graph, "START", "END", 2)
+		self._graph["PathCount"] = self._countPaths(self._graph, "START", "END", 2, maxPathCount)
 		#print("START: "+str(startNodes)+"  END: "+str(endNodes))
 
 		self._graph["numAnomalousEdges"] = self._countAnomalousEdges(self._graph)
@@ -428,7 +450,7 @@ class ModelConverter(object):
 			q = q[1:]
 
 			#enque non-anomalous out-edges of this vertex
-			for edge in graph.es.select(_source=v.index):
+			for edge in graph.es[graph.incident(v.index, mode="out")]:
 				if not edge["isAnomalous"]:
 					edge["visited"] = True
 					if edge.target not in visited:
@@ -449,7 +471,13 @@ class ModelConverter(object):
 	def _getOutNeighbors(self, g, node):
 		return [e.target for e in g.es[g.incident(node,mode="OUT")]]
 
-	def _countPaths(self, g, startName, endName, k):
+	"""
+	Counts the START-END paths of @g, traversing loops at most @k times.
+	
+	@maxPaths: If given, the count stops once @maxPaths paths are found, so the result is a lower bound. The search is then depth-first,
+	such that complete paths are found early even if the number of partial paths explodes, as it does for models with thousands of activities.
+	"""
+	def _countPaths(self, g, startName, endName, k, maxPaths=None):
 		#mark all the nodes per number of times traversed (max of k)
 		g.vs["pathCountHits"] = 0
 		#get start node
@@ -457,15 +485,22 @@ class ModelConverter(object):
 		#get immediate out-edge neighbors of START
 		q = self._getOutNeighbors(g, startNode)
 		pathct = 0
+		#get type of the first edge pointing to each node, once; in our topology loops only have one entrant edge
+		firstInEdgeTypes = dict()
+		for e in g.es:
+			if e.target not in firstInEdgeTypes:
+				firstInEdgeTypes[e.target] = e["type"]
 
 		#print("out neighbors: "+str(q))
-		while len(q) > 0:
-			#pop front node
-			nodeId = q[0]
+		while len(q) > 0 and (maxPaths is None or pathct < maxPaths):
+			#pop front node, or the back node for a bounded, depth-first count
+			if maxPaths is None:
+				nodeId = q[0]
+				q = q[1:]
+			else:
+				nodeId = q.pop()
 			node = g.vs[nodeId]
-			q = q[1:]
-			#get type of edge pointing to this node; note this detects if any edge pointing to node is LOOP type--unnecessary in our topology (loops only have one entrant edge), but robust
-			isLoop = [e for e in g.es if e.target == nodeId][0]["type"] == "LOOP"
+			isLoop = firstInEdgeTypes[nodeId] == "LOOP"
 			#print("isloop: "+str(isLoop))
 			
 			#print(str(node["pathCountHits"]))
@@ -485,8 +520,20 @@ class ModelConverter(object):
 	Utility for plotting the generated graph, detecting anomalous edges and the like.
 	
 	@graphmlPath: Path to which graphml and png plot of graph will be saved.
+	@headless: If true, skip the layout and png rendering, which dominate the save time in large model sweeps. Only the graphml
+	and a compact json descriptor (see _writeDescriptor) are written.
+	@renderQueuePath: Optional; in headless mode, @graphmlPath is appended to this file so the png can be rendered later by RenderQueue()
 	"""
-	def Save(self, graph, graphmlPath, showPlot=False):
+	def Save(self, graph, graphmlPath, showPlot=False, headless=False, renderQueuePath=None):
+		if headless:
+			graph.write_graphml(graphmlPath)
+			self._writeDescriptor(graph, graphmlPath.replace(".graphml", ".json"))
+			if renderQueuePath is not None:
+				queueFile = open(renderQueuePath, "a")
+				queueFile.write(graphmlPath+"\n")
+				queueFile.close()
+			return
+
 		#the sugiyama layout tends to have the best layout for a cyclic, left-to-right graph
 		layout = graph.layout("sugiyama")
 		#see: http://stackoverflow.com/questions/24597523/how-can-one-set-the-size-of-an-igraph-plot
@@ -500,15 +547,76 @@ class ModelConverter(object):
 		if showPlot:
 			self.Plot(graph)
 
+	"""
+	Writes a compact json summary of the model alongside its graphml: the vertex names, the edges as
+	[source, target, probability, type, isAnomalous] lists over vertex indices, and the model-level attributes.
+	"""
+	def _writeDescriptor(self, graph, descriptorPath):
+		descriptor = dict()
+		descriptor["vertices"] = graph.vs["name"]
+		descriptor["edges"] = [[e.source, e.target, e["probability"], e["type"], bool(e["isAnomalous"])] for e in graph.es]
+		for attr in ["PathCount", "numAnomalousEdges"]:
+			if attr in graph.attributes():
+				descriptor[attr] = graph[attr]
+
+		descriptorFile = open(descriptorPath, "w+")
+		json.dump(descriptor, descriptorFile, separators=(",",":"))
+		descriptorFile.close()
+
 	def Plot(self, graph):
 		#the sugiyama layout tends to have the best layout for a cyclic, left-to-right graph
 		layout = graph.layout("sugiyama")
 		igraph.plot(graph, layout = layout, bbox = (1000,1000), vertex_size=35, vertex_label_size=15)
 		
+"""
+Renders the png plot of a single graphml model, as skipped by a headless Save(). Module-level so it can be mapped over a process pool.
+"""
+def _renderGraphml(graphmlPath):
+	graph = igraph.Graph.Read(graphmlPath)
+	layout = graph.layout("sugiyama")
+	imgSavePath = graphmlPath.replace(".graphml", ".png")
+	igraph.plot(graph, imgSavePath, layout = layout, bbox = (1000,1000), vertex_size=35, vertex_label_size=15)
+	return imgSavePath
+
+"""
+Renders the pngs of all models saved in headless mode, after a sweep has finished.
+
+@queuePath: The render queue file given to Save(), one graphml path per line
+@numWorkers: Number of processes over which to render the queued models
+"""
+def RenderQueue(queuePath, numWorkers=1):
+	queueFile = open(queuePath, "r")
+	paths = []
+	for line in queueFile.readlines():
+		path = line.strip()
+		if len(path) > 0 and path not in paths:
+			paths.append(path)
+	queueFile.close()
+
+	print("Rendering "+str(len(paths))+" queued models from "+queuePath+" with "+str(numWorkers)+" workers")
+	if numWorkers > 1:
+		pool = multiprocessing.Pool(numWorkers)
+		pool.map(_renderGraphml, paths)
+		pool.close()
+		pool.join()
+	else:
+		for path in paths:
+			_renderGraphml(path)
+
 def usage():
 	print("python ./ModelConverter.py [modelFile] [optional graphml output path; default is 'model.graphml'] [--quiet: optional; whether or not to show the graph]")
+	print("python ./ModelConverter.py --renderQueue=[render queue file written by headless saves] [--workers=N]")
 
 def main():
+	for arg in sys.argv:
+		if "--renderQueue=" in arg:
+			numWorkers = 1
+			for workerArg in sys.argv:
+				if "--workers=" in workerArg:
+					numWorkers = int(workerArg.split("=")[1])
+			RenderQueue(arg.split("=")[1], numWorkers)
+			return
+
 	if len(sys.argv) < 2:
 		print("ERROR insufficient parameters passed.")
 		usage()
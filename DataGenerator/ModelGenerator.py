@@ -2,7 +2,7 @@ import sys
 import math
 import random
 import igraph
-from ModelConverter import ModelConverter
+from ModelConverter import ModelConverter, GetActivityAlphabet, LEGACY_ACTIVITIES, MAX_ACTIVITIES
 
 """
 Randomly generates process models according to Algorithm 4, in Bezerra's paper on process-mining anomaly detection.
@@ -14,7 +14,10 @@ in the edges of the workflows. These embedded probabilities are then used to gen
 can implement Bezerra's generation method in the base-case, but can extend it by incorporating probability data
 into workflow edges.
 
-Input:  print("python ./ModelGenerator -n=(some +integer <= 62) [-config=configPath] [-file=(path to output file)]")
+Input:  print("python ./ModelGenerator -n=(some +integer <= 10000) [-config=configPath] [-file=(path to output file)]")
+
+Activities are identified by integer ids, rendered as single symbols of the activity alphabet (see ModelConverter.GetActivityAlphabet).
+Models of up to 60 activities use the legacy alphanumeric symbols; larger models, as needed for scaling tests, extend the alphabet.
 
 Output: A graph in graphML format, with probabilistic edges.
 
@@ -53,8 +56,9 @@ class ModelGenerator(object):
 	def __init__(self, configPath):
 		#activity dictionary; let activities be defined by simple symbols in Sigma, each with some label
 		#self.activities = {'A':"PullLever",'B':"PushButton",'C':"SpinWheel",'D':"TwistKnob",'E':"PullSpring",'F':"TootWhistle",'G':"RingBell",'H':"TapGauge",'I':"WipeForehead",'J':"ReadGauge",'K':"SmellSmoke",'L':"TapKeys",'M':"PushPedal"}
-		self._remainingActivities = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+		self._remainingActivities = LEGACY_ACTIVITIES
 		self._activities = self._remainingActivities.strip() # a pseudo deep copy
+		self._activitySet = set(self._activities)
 		self._model = ""
 		self._abnormalOrProbRange = (-1.0,-1.0)
 		self._normalOrProbRange = (-1.0,-1.0)
@@ -68,6 +72,8 @@ class ModelGenerator(object):
 		self._parseConfig(configPath)
 		self._loopUntilKAnomalies = False
 		self._modelConverter = ModelConverter()
+		self._downstreamRadius = 5 #search-depth bound for join-back vertices of OR and null-transition anomalies
+		self._placementIndex = None #candidate sets for placing anomalies; only built for the duration of _addAnomalies()
 
 	"""
 	Parses in the parameters/vals of the config file. All are required.
@@ -327,6 +333,17 @@ class ModelGenerator(object):
 		return "["+self._generateRandomActivity()+self._seq(n1,n2,True)+"]"+probExpr #preventLoop=True prevents invalid double loops: [[AB]GHFJ]
 	####### End of the grammar rules
 
+	"""
+	Sizes the activity alphabet for models of approximately @n activities. AND/OR constructs consume activities beyond @n,
+	so the alphabet is over-provisioned; models of up to 60 activities keep the legacy 62-symbol alphabet.
+	"""
+	def _setActivityAlphabet(self, n):
+		if n <= 60:
+			self._activities = LEGACY_ACTIVITIES
+		else:
+			self._activities = GetActivityAlphabet(2 * n)
+		self._activitySet = set(self._activities)
+
 	"""
 	Resets the object state such that we're ready to create a fresh model
 	"""
@@ -344,39 +361,53 @@ class ModelGenerator(object):
 	@a: num anomalies to generate with model
 	@graphmlPath: Relative path of current execution context to which graphml and graph .png will be saved
 	@loopUntilKAnomalies: boolean, whether or not to generate models with 
+	@headless: Skip rendering the model png on save, writing only graphml and a json descriptor (see ModelConverter.Save)
+	@renderQueuePath: Optional file to which headless saves are appended, for rendering later via ModelConverter.py --renderQueue
 	"""
-	def CreateModel(self, n, a, graphmlPath, showPlot, loopUntilKAnomalies):
+	def CreateModel(self, n, a, graphmlPath, showPlot, loopUntilKAnomalies, headless=False, renderQueuePath=None):
 		if a > 3:
 			print("WARNING generating "+str(a)+" anomalies, or more than about 3, may take too long for generator to terminate for low-probability anomalies")
 			
 		self._loopUntilKAnomalies = loopUntilKAnomalies
+		self._setActivityAlphabet(n)
+		#the path count of large models explodes combinatorially, so it is bounded for models beyond the legacy alphabet
+		maxPathCount = None
+		if len(self._activities) > len(LEGACY_ACTIVITIES):
+			maxPathCount = 1000
 			
-		#while invalid models are generated, or models without enough anomalies, create and test a new one
-		isValidModel = False
-		while not isValidModel:
-			self._reset()
-			self._model = self._createModel(n, preventLoop=True) #On the first call preventLoop is set, since the outermost expr as a loop make no sense
-			#print('Before post-processing, model is: \n'+self._model)
-			self._postProcessing() # a bandaid
-			isValidModelStr = self._isValidModelStr(a) and self._isBezerraValidModelStr(self._model)
-			#print(self._model)
-			if isValidModelStr:
-				#preliminary checks passed; so build the in-memory graph, and then check graph validation metrics
-				self._graphicalModel = self._modelConverter.ConvertModel(self._model, False)
-				if self._loopUntilKAnomalies: #The model string is verified to include at least 4 anomalies, but more than that need to be added manually to the graph
-					isValidModel = self._addAnomalies(a)
-
-				self._pathCount = self._graphicalModel["PathCount"]
-				isValidModel = isValidModel and self._isBezerraValidModel(self._graphicalModel) and self._meetsAnomalyRequirements(self._graphicalModel) and self._meetsMinPathLengthRequirements(self._graphicalModel)
-				if isValidModel:
-					#only show valid model
-					print("Model anomalous edges: "+str(self._graphicalModel["numAnomalousEdges"]))
-					print("Model shortest path length from START to END: "+str(self._graphicalModel.get_shortest_paths("START",to="END",mode="OUT",output='vpath')[0]))
-					self._modelConverter.Save(self._graphicalModel, graphmlPath, showPlot)
+		#the model grammar and converter are recursive, with depth growing with the number of activities; the recursion limit is raised
+		#for the generation only, and restored for the caller
+		previousRecursionLimit = sys.getrecursionlimit()
+		sys.setrecursionlimit(max(previousRecursionLimit, 10 * n))
+		try:
+			#while invalid models are generated, or models without enough anomalies, create and test a new one
+			isValidModel = False
+			while not isValidModel:
+				self._reset()
+				self._model = self._createModel(n, preventLoop=True) #On the first call preventLoop is set, since the outermost expr as a loop make no sense
+				#print('Before post-processing, model is: \n'+self._model)
+				self._postProcessing() # a bandaid
+				isValidModelStr = self._isValidModelStr(a) and self._isBezerraValidModelStr(self._model)
+				#print(self._model)
+				if isValidModelStr:
+					#preliminary checks passed; so build the in-memory graph, and then check graph validation metrics
+					self._graphicalModel = self._modelConverter.ConvertModel(self._model, False, maxPathCount)
+					if self._loopUntilKAnomalies: #The model string is verified to include at least 4 anomalies, but more than that need to be added manually to the graph
+						isValidModel = self._addAnomalies(a)
+
+					self._pathCount = self._graphicalModel["PathCount"]
+					isValidModel = isValidModel and self._isBezerraValidModel(self._graphicalModel) and self._meetsAnomalyRequirements(self._graphicalModel) and self._meetsMinPathLengthRequirements(self._graphicalModel)
+					if isValidModel:
+						#only show valid model
+						print("Model anomalous edges: "+str(self._graphicalModel["numAnomalousEdges"]))
+						print("Model shortest path length from START to END: "+str(self._graphicalModel.get_shortest_paths("START",to="END",mode="OUT",output='vpath')[0]))
+						self._modelConverter.Save(self._graphicalModel, graphmlPath, showPlot, headless, renderQueuePath)
+					else:
+						print("INVALID graphical model")
 				else:
-					print("INVALID graphical model")
-			else:
-				print("INVALID MODEL STR")
+					print("INVALID MODEL STR")
+		finally:
+			sys.setrecursionlimit(previousRecursionLimit)
 
 		return self._graphicalModel
 		
@@ -396,57 +427,94 @@ class ModelGenerator(object):
 
 		#if self._countNonAnomalousEdges() < (numAnomalies - self._anomalyCount):
 		#	return False #not enough splittable edges remaining to add anomalies too
+		#precompute the candidate sets once; the adders below sample from these and keep them current as edges are added
+		if self._anomalyCount < numAnomalies:
+			self._buildPlacementIndex()
+
 		i = 1
 		while self._anomalyCount < numAnomalies:
 			if not self._addAnomaly():
 				print("ERROR: could not add anomaly "+str(i)+"     aCount="+str(self._anomalyCount)+"     "+str(numAnomalies))
+				self._placementIndex = None
 				return False
 			else:
 				self._anomalyCount += 1
 				i += 1
-				
+
+		self._placementIndex = None
 		return True
-		
-	#Vertex is treated as anomalous if no non-anomalous edge points to it
-	def _isAnomalousVertex(self, vId):
-		return not any([not edge["isAnomalous"] for edge in self._graphicalModel.es.select(_target=vId)])
-		#anomalousTargets = set([edge.target for edge in self._graphicalModel.es if edge["isAnomalous"]])
-		#regularTargets =  set([edge.target for edge in self._graphicalModel.es if not edge["isAnomalous"]])
-		#return vId in anomalousTargets and vId not in regularTargets
-		
+
+	"""
+	Builds the anomaly placement index for the current graphical model, so anomalies can be placed without
+	randomly selecting vertices and retrying. The index holds:
+		"eligible": vertices to which an anomaly may be affixed: those with some incoming non-anomalous edge, which are
+		neither START/END nor adjacent to END, and whose names do not contain "^" (null transitions).
+		"downstream": for each eligible vertex, the vertices reachable within self._downstreamRadius steps, minus the vertex
+		itself and its immediate successors. These are the join-back points for OR and null-transition anomalies.
+		"end": the END vertex id, cached since cloned vertices may later share its name.
+	A vertex is treated as anomalous if no non-anomalous edge points to it. Added anomalies only introduce anomalous edges, so
+	vertices never become non-anomalous; hence the index only needs updating per added edge, via _updatePlacementIndex().
+	"""
+	def _buildPlacementIndex(self):
+		g = self._graphicalModel
+		endId = g.vs.find(name="END").index
+		prohibited = set(g.neighbors(endId, mode="in"))
+		regularTargets = set([edge.target for edge in g.es if not edge["isAnomalous"]])
+		eligible = [v.index for v in g.vs if v.index in regularTargets and v.index not in prohibited and v["name"] not in ["START","END"] and "^" not in v["name"]]
+
+		#one bounded reachability pass over all eligible vertices; mindist=2 excludes the vertex itself and its immediate neighbors
+		reachable = g.neighborhood(eligible, order=self._downstreamRadius, mode="out", mindist=2)
+		downstream = dict()
+		for vId, vertices in zip(eligible, reachable):
+			downstream[vId] = set(vertices)
+
+		self._placementIndex = {"eligible" : set(eligible), "downstream" : downstream, "end" : endId}
+
+	"""
+	Incrementally updates the placement index after the edge @srcId->@destId has been added to the model.
+	
+	The new edge can only grow downstream sets: every eligible vertex x within radius-1 steps upstream of @srcId (at distance d)
+	now reaches the vertices within radius-1-d steps of @destId. @destId is now an immediate neighbor of @srcId, so it is removed from
+	@srcId's set, and @srcId is no longer eligible if @destId is END.
+	"""
+	def _updatePlacementIndex(self, srcId, destId):
+		g = self._graphicalModel
+		index = self._placementIndex
+		if destId == index["end"]:
+			index["eligible"].discard(srcId)
+
+		downstream = index["downstream"]
+		for d in range(self._downstreamRadius):
+			#vertices at exactly distance d upstream of srcId
+			upstream = [vId for vId in g.neighborhood(srcId, order=d, mode="in", mindist=d) if vId in downstream]
+			if len(upstream) > 0:
+				reach = set(g.neighborhood(destId, order=self._downstreamRadius-1-d, mode="out"))
+				for vId in upstream:
+					downstream[vId] |= reach
+					downstream[vId] -= set(g.neighbors(vId, mode="out"))
+					downstream[vId].discard(vId)
+
 	#Utility for adding anomalies: returns a vertex with no incoming edges marked anomalous. I originally
 	#required outdegree==1, but this constraint seems needless. The constraints are that the node is
 	#not adjacent to END, such that there is one intervening node to jump over and join back with for branches.
 	#The node must also not contain "^" indicating it is a null transition node.
+	#@requireDownstream: only return vertices having some downstream join-back vertex, so that callers needn't retry
 	#Returns: a non-anomalous vertex, or None if none remaining.
-	def _getNonAnomalousVertex(self):
-		#build non-anomalous vertices: not anomalous and not END or within one-step of END
-		prohibitedNodes = set([self._graphicalModel.vs[index]["name"] for index in self._graphicalModel.neighbors("END",mode="in")])
-		prohibitedNodes.add("END")
-		prohibitedNodes.add("START")
-		vertices = [v.index for v in self._graphicalModel.vs if not self._isAnomalousVertex(v.index) and v["name"] not in prohibitedNodes and "^" not in v["name"]]
+	def _getNonAnomalousVertex(self, requireDownstream=False):
+		index = self._placementIndex
+		vertices = sorted(index["eligible"])
+		if requireDownstream:
+			vertices = [vId for vId in vertices if len(index["downstream"][vId]) > 0]
 
 		if len(vertices) == 0:
 			return None
 
 		return vertices[ random.randint(0,len(vertices)-1) ]
-	
-	def _getDownstreamVertices(self, vId, visited, radius):
-		if radius <= 0:
-			return
-
-		for neighborId in self._graphicalModel.neighbors(vId, mode="out"):
-			if neighborId not in visited:
-				visited.add(neighborId)
-				self._getDownstreamVertices(neighborId, visited, radius-1)
 
-	#Searches a random vertex downstream of (but not adjacent to) some vertex v. @visited stores downstream nodes. @radius controls search-depth bound.
+	#Returns a random vertex downstream of (but not adjacent to) some vertex v, within self._downstreamRadius steps.
 	#Returns None if no vertex found
 	def _getRandomDownstreamVertex(self, vId):
-		vertices = set()
-		neighbors = self._graphicalModel.neighbors(vId, mode="out")
-		self._getDownstreamVertices(vId, vertices, 5)
-		vertices = [vId for vId in vertices if vId not in neighbors]
+		vertices = sorted(self._placementIndex["downstream"][vId])
 
 		if len(vertices) == 0:
 			return None
@@ -457,7 +525,7 @@ class ModelGenerator(object):
 	def _addNullTransitionAnomaly(self):
 		success = False
 		#get a vertex to which an anomaly can be affixed
-		vId = self._getNonAnomalousVertex()
+		vId = self._getNonAnomalousVertex(requireDownstream=True)
 		if vId is not None:
 			#get a downstream vertex at which to join back
 			downstreamId = self._getRandomDownstreamVertex(vId)
@@ -517,6 +585,8 @@ class ModelGenerator(object):
 		edge["color"] = color
 		edge["type"] = edgeType
 		edge["isAnomalous"] = isAnomalous
+		if self._placementIndex is not None:
+			self._updatePlacementIndex(srcVertex, destVertex)
 
 	def _addLoopAnomaly(self):
 		success = False
@@ -552,7 +622,7 @@ class ModelGenerator(object):
 	def _addOrAnomaly(self):
 		success = False
 		#get a vertex to which an anomaly can be affixed
-		vId = self._getNonAnomalousVertex()
+		vId = self._getNonAnomalousVertex(requireDownstream=True)
 		if vId is not None:
 			#get a downstream vertex at which to join back
 			downstreamId = self._getRandomDownstreamVertex(vId)
@@ -610,7 +680,7 @@ class ModelGenerator(object):
 				leftBraces += 1
 			if self._model[i] == ">":
 				leftBraces -= 1
-			if leftBraces == 0 and self._model[i] in self._activities:
+			if leftBraces == 0 and self._model[i] in self._activitySet:
 				ct += 1
 			i += 1
 
@@ -723,7 +793,7 @@ class ModelGenerator(object):
 			i = 1
 			while i < len(self._model):
 				#if pattern is not A^ or ^A, append current char to output model
-				if not (self._model[i] == "^" and self._model[i-1] in self._activities):
+				if not (self._model[i] == "^" and self._model[i-1] in self._activitySet):
 					temp += self._model[i]
 				i += 1
 			self._model = temp
@@ -806,8 +876,9 @@ class ModelGenerator(object):
 		return model
 
 def usage():
-	print("python ./ModelGenerator -n=(some +integer <= 60) -a=(number of anomalies to include) -config=configPath [-file=(path to output file)] [-graph=graphml save location] [-quiet dont show graph]")
+	print("python ./ModelGenerator -n=(some +integer <= "+str(MAX_ACTIVITIES // 2)+") -a=(number of anomalies to include) -config=configPath [-file=(path to output file)] [-graph=graphml save location] [-quiet dont show graph]")
 	print("Optional: --loopUntilKAnomalies    If passed, models will be generated until one with k (-a) anomalies is generated, using a parameter search over pAnom.")
+	print("Optional: -headless [-renderQueue=path]    Save only graphml and a json descriptor, deferring the png to: python ModelConverter.py --renderQueue=path")
 	
 def main():
 	if len(sys.argv) < 4:
@@ -837,10 +908,9 @@ def main():
 
 	#get n, the approximate number of activities to generate
 	n = int(sys.argv[1].split("=")[1])
-	#verify no more than 62 activities are specified; this constraint only exists because I'm using single-char, alphanumeric activity id's.
-	#In the future, any arbitrary number of activities could be used, I would just need to delimit/parse the activity names.
-	if n > 60: # 60 < all upper and lowercase alphanumeric chars minus some expected number of AND's, which used two activities
-		print("ERROR too many activities specified. No more than 60 allowed.")
+	#verify the activity alphabet can name the activities; the generator over-provisions the alphabet by 2x (see _setActivityAlphabet)
+	if n > MAX_ACTIVITIES // 2:
+		print("ERROR too many activities specified. No more than "+str(MAX_ACTIVITIES // 2)+" allowed.")
 		usage()
 		exit()
 
@@ -854,9 +924,14 @@ def main():
 			graphPath = arg.split("=")[1]
 
 	showPlot = "-quiet" not in sys.argv
+	headless = "-headless" in sys.argv
+	renderQueuePath = None
+	for arg in sys.argv:
+		if "-renderQueue=" in arg:
+			renderQueuePath = arg.split("=")[1]
 
 	generator = ModelGenerator(configPath)
-	generator.CreateModel(n, a, graphPath, showPlot, loopUntilKAnomalies)
+	generator.CreateModel(n, a, graphPath, showPlot, loopUntilKAnomalies, headless, renderQueuePath)
 	generator.PrintModel()
 
 	if ofile != None:
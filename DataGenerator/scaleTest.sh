@@ -0,0 +1,42 @@
+#!/bin/bash
+#Times the pipeline end to end on a large-alphabet model: model generation, trace generation, trace replay (the Retracer),
+#and one gbad/SubdueLogCompressor iteration if the gbad executable is available. Run from the DataGenerator folder.
+#Usage: ./scaleTest.sh [approx number of activities, defaults to 2000] [number of traces, defaults to 1000]
+
+numActivities=${1:-2000}
+numTraces=${2:-1000}
+outFolder="../SyntheticData/scaleTest"
+graphmlPath="$outFolder/largeModel.graphml"
+modelPath="$outFolder/largeModel.txt"
+logPath="$outFolder/largeTraces.log"
+subdueLogPath="$outFolder/largeTraces.g"
+traceGraphPath="$outFolder/largeTraceGraphs.ptg"
+compressedLog="$outFolder/largeCompressed.g"
+mdlResult="$outFolder/largeMdlResult.txt"
+
+gbadMdlPath="../../gbad-tool-kit_3.2/gbad-tool-kit_3.2/bin/gbad-mdl.exe"
+if [ "$(uname)" = "Linux" ]; then
+	gbadMdlPath="../../gbad-tool-kit_3.2/gbad-tool-kit_3.2/bin/gbad-mdl_linux"
+fi
+
+mkdir -p $outFolder
+
+echo Building process model with appr $numActivities activities...
+#anomalies are looped until found, since the config's anomaly parameters are sized for small models
+time python ModelGenerator.py -n=$numActivities -a=3 -config=generator.config -file=$modelPath -graph=$graphmlPath -quiet -headless --loopUntilKAnomalies
+
+echo Generating $numTraces traces...
+time python DataGenerator.py $graphmlPath -n=$numTraces -ofile=$logPath
+
+echo Replaying traces on the generating model...
+time python ../Testing/GenerateTraceSubgraphs.py --graphml=$graphmlPath --tracePath=$logPath --outputPath=$subdueLogPath --traceGraphs=$traceGraphPath > /dev/null
+
+if [ -f $gbadMdlPath ]; then
+	echo Running gbad-mdl and one compression iteration...
+	time $gbadMdlPath -mdl 0.01 $subdueLogPath > $mdlResult
+	cd ../Testing
+	time python SubdueLogCompressor.py ../DataGenerator/$subdueLogPath ../DataGenerator/$mdlResult ../DataGenerator/$compressedLog name=SUB_init --deleteSubs=false
+	cd ../DataGenerator
+else
+	echo gbad not found at $gbadMdlPath, skipping compression
+fi
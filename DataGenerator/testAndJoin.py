@@ -0,0 +1,60 @@
+"""
+Tests the AND-join detection of DataGenerator.py, on a model in which an anomalous OR branch jumps past the join of an AND split:
+
+	START -> S, S -AND-> {A, B}, A -> H, B -> H, H -> C, C -> END, plus the anomalous A -> X -> C
+
+The branches of the split rejoin at H, so every trace not taking the anomaly walks H -> C exactly once. Were the join taken over all edges,
+including the anomalous ones, it would land on C instead, and both branch walks would pass through H.
+
+Usage: python testAndJoin.py, or run it with pytest.
+"""
+
+from __future__ import print_function
+import os
+import random
+import tempfile
+import igraph
+import DataGenerator
+
+def _buildModel(graphmlPath):
+	g = igraph.Graph(directed=True)
+	names = ["START", "S", "A", "B", "H", "C", "X", "END"]
+	g.add_vertices(len(names))
+	g.vs["name"] = names
+	g.vs["label"] = names
+	#(source, target, type, probability, isAnomalous)
+	edges = [("START", "S", "SEQ", 1.0, False), ("S", "A", "AND", 1.0, False), ("S", "B", "AND", 1.0, False), ("A", "H", "SEQ", 1.0, False),
+		("B", "H", "SEQ", 1.0, False), ("H", "C", "SEQ", 1.0, False), ("C", "END", "SEQ", 1.0, False),
+		("A", "X", "OR", 0.05, True), ("X", "C", "SEQ", 1.0, True)]
+	g.add_edges([(names.index(edge[0]), names.index(edge[1])) for edge in edges])
+	g.es["type"] = [edge[2] for edge in edges]
+	g.es["probability"] = [edge[3] for edge in edges]
+	g.es["isAnomalous"] = [edge[4] for edge in edges]
+	g.write_graphml(graphmlPath)
+
+def _edgeNames(generator, trace):
+	return [(generator._graph.vs[edge.source]["label"], generator._graph.vs[edge.target]["label"]) for edge, time in trace]
+
+def test_andJoinIgnoresAnomalousEdges():
+	graphmlPath = os.path.join(tempfile.mkdtemp(), "andJoin.graphml")
+	_buildModel(graphmlPath)
+	generator = DataGenerator.DataGenerator()
+	generator._buildGraph(graphmlPath)
+	split = generator._graph.vs.find(label="S")
+	assert generator._andJoins[split.index]["label"] == "H"
+
+	random.seed(0)
+	numRegular = 0
+	for i in range(200):
+		edges = _edgeNames(generator, generator._generateTrace(generator._startNode, 0))
+		generator._reset()
+		if ("A", "X") in edges:
+			continue
+		numRegular += 1
+		assert edges.count(("H", "C")) == 1, str(edges)
+		assert edges.count(("C", "END")) == 1, str(edges)
+	assert numRegular > 0
+
+if __name__ == "__main__":
+	test_andJoinIgnoresAnomalousEdges()
+	print("PASSED")
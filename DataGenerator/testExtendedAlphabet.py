@@ -0,0 +1,63 @@
+"""
+Tests models of more activities than the legacy alphabet (see ModelConverter.GetActivityAlphabet), whose extended activities are named by
+CJK code points, through the pipeline: the model is generated and saved as graphml, traces are generated from it and replayed on it by the
+Retracer, and the .g log it writes is parsed back and its activities compared with the traces'.
+
+gbad and subdue tokenize .g lines on ascii whitespace and quotes, so the test also checks that the utf-8 encoding of every extended label
+is made of non-ascii bytes only, and so is read back by them as a single label.
+
+Usage: python testExtendedAlphabet.py, or run it with pytest.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import random
+import tempfile
+import ModelGenerator
+import DataGenerator
+from ModelConverter import EXTENDED_ACTIVITY_BASE
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Testing"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import GenerateTraceSubgraphs
+import GLogReader
+
+def test_extendedAlphabetRoundTrip():
+	random.seed(0)
+	outputDir = tempfile.mkdtemp()
+	graphmlPath = os.path.join(outputDir, "model.graphml")
+	logPath = os.path.join(outputDir, "traces.log")
+	gPath = os.path.join(outputDir, "traces.g")
+	configPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generator.config")
+
+	recursionLimit = sys.getrecursionlimit()
+	model = ModelGenerator.ModelGenerator(configPath).CreateModel(80, 1, graphmlPath, False, True, True)
+	assert sys.getrecursionlimit() == recursionLimit
+	names = set(model.vs["name"])
+	extended = [name for name in names if ord(name[0]) >= EXTENDED_ACTIVITY_BASE]
+	assert len(extended) > 0
+	for name in extended:
+		assert min(bytearray(name.encode("utf-8"))) >= 0x80, name
+
+	DataGenerator.DataGenerator().GenerateTraces(graphmlPath, 50, logPath)
+	GenerateTraceSubgraphs.Retracer(False).GenerateTraces(graphmlPath, logPath, gPath, False, os.path.join(outputDir, "traceGraphs.ptg"))
+
+	sequences = {}
+	with open(logPath, "r", encoding="utf-8") as logFile:
+		for line in logFile:
+			tokens = line.strip().split(",")
+			sequences[tokens[0]] = tokens[2]
+	numTraces = 0
+	for record in GLogReader.ReadTraces(gPath):
+		numTraces += 1
+		labels = [record.Vertices[vId] for vId in sorted(record.Vertices)]
+		assert labels[0] == "START" and labels[-1] == "END"
+		#the activities of AND branches may be replayed in another order than they were logged
+		assert sorted(labels[1:-1]) == sorted(sequences[record.XpId()])
+		for src, dst, label in record.Edges:
+			assert record.Vertices[src] in names and record.Vertices[dst] in names
+	assert numTraces == len(sequences)
+
+if __name__ == "__main__":
+	test_extendedAlphabetRoundTrip()
+	print("PASSED")
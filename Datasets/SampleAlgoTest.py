@@ -19,6 +19,9 @@ import os
 import traceback
 import igraph
 import random
+#the model compiler lives with the other conversion scripts; it reads either graphml or compiled (.pmc) models
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import ModelCompiler
 
 #fix these
 #from SampleAlgoUtilities.SynData2Xes import ToXes
@@ -115,7 +118,7 @@ class SampleAlgoRunner(object):
 
 		subprocess.call(script)
 		
-		graphmlProcessModel = igraph.Graph.Read("SampleAlgoUtilities/minedModel.graphml")
+		graphmlProcessModel = ModelCompiler.ReadModel("SampleAlgoUtilities/minedModel.graphml")
 		
 		return graphmlProcessModel
 
@@ -7,9 +7,11 @@ and subgraph log.
 """
 from __future__ import print_function
 import igraph
-import read
 import sys
+import os
 import re
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import GLogReader
 
 """
 Note this currently only takes the top substructure listed in the .g file.
@@ -17,6 +19,11 @@ Note this currently only takes the top substructure listed in the .g file.
 def Compress(gLog, subsPath, outPath):
 	sub = _parseBestSubstructure(subsPath)
 	print(str(sub))
+	#the log is streamed one trace at a time
+	numTraces = 0
+	for record in GLogReader.ReadTraces(gLog):
+		numTraces += 1
+	print("Read "+str(numTraces)+" traces from "+gLog)
 	
 	
 	
@@ -34,28 +41,17 @@ Returns: The best substructure, as an igraph.Graph structure.
 """
 def _parseBestSubstructure(subsPath):
 	substructure = igraph.Graph(directed=True)
-	vertexDict = {}
-	edgeList = []
 	
-	#get the raw subs file string (gbad/subdue output) (replacing linefeeds with some temp pattern makes things easier for re's)
-	subsRaw = open("gLog","r").Read().replace("\n","~")
+	#get the raw subs file string (gbad/subdue output)
+	subsRaw = open(subsPath,"r").read().replace("\r\n","\n")
 	#find the substructures just given a textual anchor pattern: "Normative Pattern (" followed by stuff, followed by double line-feeds
 	start = subsRaw.find("Normative Pattern")
-	subsRaw = subsRaw[start, subsRaw.find("~~",start)] #gets the "Normative Pattern.*\n\n" string
+	subsRaw = subsRaw[start : subsRaw.find("\n\n",start)] #gets the "Normative Pattern.*\n\n" string
 	#within the string, find all the "v" and "d" (edge) declarations
-	for line in subsRaw.split("~"):
-		ln = line.strip()
-		if len(ln) > 2:
-			#parse a vertex declaration
-			if "v " == ln[0:2]:
-				vertices.append()
-			#parse an edge declaration (the labels are meaningless; and all are assumed DIRECTED)
-			if "d "== ln[0:2]:
-				e = (ln.split(" ")[1],ln.split(" ")[2])
-				edges.append(e)
+	vertexDict, edges = GLogReader.ParseDeclarations(subsRaw.split("\n"))
 
 	#add all of the vertices
-	substructure.add_vertices(vertexDict.values())
+	substructure.add_vertices(list(vertexDict.values()))
 	#add all of the edges (by name)
 	edges = [(vertexDict[e[0]],vertexDict[e[1]]) for e in edges]
 	substructure.add_edges(edges)
@@ -76,10 +72,11 @@ def usage():
 if len(sys.argv) != 4:
 	print("Incorrect nunm parameters passed to CompressSubdueLog.py.")
 	usage()
+	exit()
 	
-inputLog = sys.argv[0]	
-subsFile = sys.argv[1]
-outputLog = sys.argv[2]
+inputLog = sys.argv[1]
+subsFile = sys.argv[2]
+outputLog = sys.argv[3]
 Compress(inputLog, subsFile, outputLog)
 
 
@@ -17,9 +17,12 @@ from Dendrogram import *
 import igraph
 import math
 import os
+import MarkovModel
+import TraceGraphStore
+import DendrogramStore
 
 class AnomalyReporter(object):
-	def __init__(self, gbadPath, logPath, resultPath, markovPath, dendrogramPath=None, dendrogramThreshold=0.05, traceGraphPath="../SyntheticData/traceGraphs.py"):
+	def __init__(self, gbadPath, logPath, resultPath, markovPath, dendrogramPath=None, dendrogramThreshold=0.05, traceGraphPath="../SyntheticData/traceGraphs.ptg"):
 		self._gbadPath = gbadPath
 		self._logPath = logPath
 		logFile = open(self._logPath, "r")
@@ -29,8 +32,11 @@ class AnomalyReporter(object):
 		self._resultPath = resultPath
 		self._dendrogramPath = dendrogramPath
 		self._dendrogramThreshold = dendrogramThreshold
-		self._markovModel = self._readMarkovModel(markovPath)
-		#calculate and store the markovian-based trace count; this is used to calculate edge probabilities based on trace counts
+		#read the markov model artifact written by the Retracer (see MarkovModel.py), or a legacy str(dict) markov model file
+		markovModel = MarkovModel.Load(markovPath)
+		self._markovModel = markovModel.ToDict()
+		#store the markovian-based trace count, the number of transitions out of START; this is used to calculate edge probabilities based on trace counts.
+		#It may be less than markovModel.TraceCount, the number of traces replayed, on logs with traces that do not reach START in the mined model
 		self._traceCount = 0.0
 		for edgeKey in self._markovModel:
 			if edgeKey[0].upper() == "START":
@@ -40,35 +46,14 @@ class AnomalyReporter(object):
 		self._traceGraphs = self._readTraceGraphs(traceGraphPath)
 				
 	"""
-	Reads the trace-subgraph file of graph representations of each trace, for which the file is formatted as
-	tuples of (traceNo, [edgeList like ... ('a','s'), ('s','d'), ('g','s')])
+	Opens the trace-graph store of graph representations of each trace (see TraceGraphStore.py), or reads a legacy trace-subgraph
+	file formatted as tuples of (traceNo, [edgeList like ... ('a','s'), ('s','d'), ('g','s')]).
+	
+	Returns: A read-only dict-like of traceNo -> edge list. Stores are memory-mapped, and only the traces looked up are decoded.
 	"""
 	def _readTraceGraphs(self, traceGraphPath):
-		traceGraphDict = {} #dictionary of trace graphs, 
-		
-		with open(traceGraphPath,"r") as tf:
-			for line in tf.readlines():
-				tup = eval(line.strip())
-				traceNo = tup[0]
-				traceGraph = tup[1]
-				if traceNo in traceGraphDict.keys():
-					print("ERROR traceNo already in trageGraph in _readTraceGraphs")
-				traceGraphDict[traceNo] = traceGraph
-		
-		return traceGraphDict
-
-	"""
-	Expected file format is a single line containing the tring version of the markov model,
-	a python dictionary of keys consisting of concatenated src-dst vertex names, and values
-	representing the edge transition counts.
-	"""
-	def _readMarkovModel(self, markovPath):
-		f = open(markovPath, "r")
-		s = f.read().strip()
-		f.close()
+		return TraceGraphStore.Load(traceGraphPath)
 
-		return eval(s)
-	
 	"""
 	Given a file containing gad output, parses the text for all of the anomalies detected. Each
 	anomaly must contain the corresponding trace number associated with a trace in the original
@@ -201,7 +186,7 @@ class AnomalyReporter(object):
 	"""
 	TODO: Dendrogram could certainly be its own class at some point; this is fine for now.
 	
-	A dendrogram is as demonstrated in dendrogram.txt. The intent is for the Dendrogram object
+	A dendrogram is as demonstrated in dendrogram.txt (see DendrogramStore.py; legacy dendrograms are also read). The intent is for the Dendrogram object
 	to support querying, such as "given this anomalous/outlier trace, what is the nearest compressing substructure?"
 	
 	returns: The dendrogram, which is just an ordered list of compression levels, with the last/bottom-most at back
@@ -209,13 +194,12 @@ class AnomalyReporter(object):
 	def _buildDendrogram(self, path):
 		anomalyIds = []
 		dendrogram = []
-		f = open(self._dendrogramPath,"r")
+		store = DendrogramStore.Load(self._dendrogramPath)
 		
 		#build the compression levels, each of which is an object with compressed id's, max compressed id's, compression factor (from gbad), num instances, etc
-		for line in f.readlines():
-			if len(line.strip()) > 0:
-				cl = CompressionLevel(line.strip())
-				dendrogram.append(cl)
+		for level in store:
+			dendrogram.append(CompressionLevel(level))
+		store.Close()
 		
 		#create the edge distributions from the trace subgraph file
 		for level in range(len(dendrogram)):
@@ -235,17 +219,24 @@ class AnomalyReporter(object):
 		rootIds = self._getSubTraceIds(dendrogram, level)
 		sub.Attrib["RootIds"] = rootIds
 		
+		#many root traces share the same graph (variant), so count the root traces of each variant and visit each variant's edges once
+		variantCounts = {}
+		for rootId in rootIds:
+			variantId = self._traceGraphs.GetVariantId(int(rootId))
+			variantCounts[variantId] = variantCounts.get(variantId, 0) + 1
+
 		#build the edge distribution for this substructure
 		edgeDist = {}
-		for rootId in rootIds:
+		for variantId in variantCounts:
+			count = variantCounts[variantId]
 			#count edges connected to this substructure (one vertex in and one out for a given edge, undirected)
-			traceEdges = self._traceGraphs[int(rootId)]
+			traceEdges = self._traceGraphs.GetVariant(variantId)
 			for edge in traceEdges:
 				if (edge[0] in sub.SubGraphVertices and edge[1] not in sub.SubGraphVertices) or (edge[1] in sub.SubGraphVertices and edge[0] not in sub.SubGraphVertices):
-					if edge in edgeDist.keys():
-						edgeDist[edge] += 1
+					if edge in edgeDist:
+						edgeDist[edge] += count
 					else:
-						edgeDist[edge] = 1
+						edgeDist[edge] = count
 		
 		return edgeDist
 		
@@ -1239,16 +1230,11 @@ class AnomalyReporter(object):
 	def _compileDendrogramResult(self, threshold):
 		anomalyIds = []
 		compressionLevels = []
-		f = open(self._dendrogramPath,"r")
-		#parse the dendrogram file; the only important component is backtracking the trace-ids to their original ids
-		for line in f.readlines():
-			idMappings = line.split("{")[1].split("}")[0].split(",")
-			newMap = {}
-			for mapping in idMappings:
-				prevId = mapping.split(":")[0]
-				nextId = mapping.split(":")[1]
-				newMap[prevId] = nextId
-			compressionLevels.append(newMap)
+		store = DendrogramStore.Load(self._dendrogramPath)
+		#read the dendrogram; the only important component is backtracking the trace-ids to their original ids
+		for i in range(store.NumLevels()):
+			compressionLevels.append(store.GetIdMap(i))
+		store.Close()
 
 		#print(str(compressionLevels))
 		#get the total number of traces from the size of the first id-map
@@ -1,19 +1,26 @@
 import igraph
+import json
+import DendrogramStore
 
 """
-Simple class comprising the information in a single compression level, as shown in a line in dendrogram.txt.
+Simple class comprising the information in a single compression level, as stored in a line in dendrogram.txt (see DendrogramStore.py).
 
 All id's are maintained as strings.
+
+@level: A level record, as from DendrogramStore.Load(), or a line of a legacy dendrogram.txt
 """
 class CompressionLevel(object):
-	def __init__(self, line):
-		self.Initialize(line)
+	def __init__(self, level):
+		if isinstance(level, dict):
+			self.FromLevel(level)
+		else:
+			self.Initialize(level)
 
 	"""
-	Takes the grpah portion of the dendrogram (a python list of vertex name pair tuples) and convert to an igraph
+	Takes the graph portion of the dendrogram (a python list of vertex name pair tuples) and convert to an igraph
 	"""
-	def _buildSubGraph(self, line):
-		self.SubGraphEdgeList = eval(line)
+	def _buildSubGraph(self, edgeList):
+		self.SubGraphEdgeList = edgeList
 		
 		vs = set()
 		for edge in self.SubGraphEdgeList:
@@ -36,30 +43,30 @@ class CompressionLevel(object):
 		self.SubGraph = g
         
 	"""
-	Given a line in a dendrogram file, fills in all data for this compression level
+	Given a line in a legacy dendrogram file, fills in all data for this compression level
 	
 	@line: a line like "([1,3,4]1,2,3,4:SUB7:4:2.24336)7,8,9{2:1,1:-1,3:-1,4:-1}#[('a','b'),('c','b')...]#[('h','e'),('r','d')...]"
 	"""
 	def Initialize(self,line):
-		#print("line: >"+line+"<")
-		
-		#copy and preserve the line, why not
-		self.Line = str(line)
+		self.FromLevel(DendrogramStore.ParseLegacyLine(line))
+
+	"""
+	Fills in all data for this compression level from @level, a level record per DendrogramStore.MakeLevel()
+	"""
+	def FromLevel(self, level):
+		#copy and preserve the level, why not
+		self.Line = json.dumps(level, separators=(",",":"))
 		
 		#build the edge distribution surrounding the substructure; remember, this may be empty!!
-		self.EdgeDist= eval(line.split('#')[2])
+		self.EdgeDist = DendrogramStore.LevelEdgeFreqs(level)
 		
-		graphLine = line.split("#")[1]
-		line = line.split("#")[0]
-
-		self._buildSubGraph(graphLine)
-		self.MaxCompressedIds = sorted([id for id in line.split("[")[1].split("]")[0].split(",") if len(id) > 0]) #magic prevents empty max-comp list '[]' from becoming [''] (one item list of empty str)
-		self.CompressedIds = sorted(line.split("]")[1].split(":")[0].split(","))
-		self.UncompressedIds = sorted([id for id in line.split(")")[1].split("{")[0].split(",") if len(id) > 0])
-		self.NumInstances = int(line.split(")")[0].split(":")[-2])
-		self.CompressionFactor = float(line.split(")")[0].split(":")[-1])
-		self.SubName = line.split(")")[0].split(":")[-3]
-		self.Line = line.strip()
+		self._buildSubGraph(DendrogramStore.LevelEdges(level))
+		self.MaxCompressedIds = sorted([str(id) for id in level["maxCompressed"]])
+		self.CompressedIds = sorted([str(id) for id in level["compressed"]])
+		self.UncompressedIds = sorted([str(id) for id in level["uncompressed"]])
+		self.NumInstances = int(level["instances"])
+		self.CompressionFactor = float(level["compValue"])
+		self.SubName = level["sub"]
 
 		#An arbitrary key-value store for other attributes that can be added to a level/substructure
 		self.Attrib = {}
@@ -67,10 +74,9 @@ class CompressionLevel(object):
 		#initialize the id-map: the left id is for the current compression level; right id's mapping to -1 are traces that reached maximum compression
 		self.IdMap = {}
 		self.ReverseIdMap = {} #maps ids in reverse: successors are keys, predecessor ids are values
-		idPairs = line.split("{")[1].split("}")[0].split(",") #from {2:1,1:-1,3:-1,4:-1} gets list: ["2:1","1:-1"...]
-		for pair in idPairs:
-			leftId = pair.split(":")[0]
-			rightId = pair.split(":")[1]
+		for i in range(len(level["mapFrom"])):
+			leftId = str(level["mapFrom"][i])
+			rightId = str(level["mapTo"][i])
 			self.IdMap[leftId] = rightId
 			#reverse map will include only non-negative values
 			if rightId != "-1":
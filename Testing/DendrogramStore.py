@@ -0,0 +1,242 @@
+"""
+The dendrogram written by the SubdueLogCompressor and read by the AnomalyReporter (see Dendrogram.py): one compression level per
+recursive compression, in compression order.
+
+Levels were previously written to dendrogram.txt as hand-rolled strings,
+	([1,3,4]1,2,3,4:SUB7:4:2.24336)7,8,9{2:1,1:-1,3:-1,4:-1}#[('a','b'),('c','b')]#{('h','e'): 3}
+and parsed back with split chains and eval()'s, which break on labels containing any of the delimiters. The store instead holds
+each level as one json object per line, with typed fields, so the compressor can keep appending levels (across processes, as the
+recursive scripts do) to the same dendrogram.txt:
+	"sub"			the compressing substructure's name
+	"instances"		its number of instances, per gbad
+	"compValue"		its compression value, per gbad
+	"maxCompressed"		the ids of the traces it compressed to nothing (or to a single vertex)
+	"compressed"		the ids of all of the traces it compressed, max-compressed ones included
+	"uncompressed"		the ids of the traces not containing it
+	"mapFrom", "mapTo"	the id map, as two parallel arrays: trace mapFrom[i] in this level is trace mapTo[i] in the next, or -1 if it was removed
+	"activities"		the level's activity dictionary, into which the edge arrays below index
+	"edges"			the substructure's edges, as flattened (source, target) activity-id pairs
+	"freqEdges", "freqs"	the edges connecting to the substructure, as flattened pairs, and the number of times each was seen
+All ids are ints. The reader indexes the offset of each line once, then decodes only the levels that are requested. Since the
+compressor appends to whatever dendrogram.txt it is given, a legacy file may be continued by json levels; the format is therefore
+decided per line, a legacy line beginning with "(" and a json one with "{".
+
+Usage:
+	writer = DendrogramWriter("dendrogram.txt")
+	writer.Write(MakeLevel("SUB1", 4, 2.24, maxCompressed, compressed, uncompressed, idMap, subEdges, edgeFreqs))
+	writer.Close()
+
+	store = Load("dendrogram.txt")	#also reads the legacy text format
+	store[i], store.GetIdMap(i), len(store)
+	LevelEdges(store[i]), LevelEdgeFreqs(store[i])
+"""
+
+from __future__ import print_function
+import sys
+import ast
+import json
+import mmap
+
+"""
+Builds the record of a compression level.
+
+@maxCompressed, @compressed, @uncompressed: Trace ids, sorted as ints
+@idMap: The id map of the level, as a list of (id, next id) pairs, next id being -1 for removed traces
+@subEdges: The substructure's (srcName, dstName) edges
+@edgeFreqs: A dict of (srcName, dstName) -> count, for the edges connecting to the substructure
+"""
+def MakeLevel(subName, instances, compValue, maxCompressed, compressed, uncompressed, idMap, subEdges, edgeFreqs):
+	ids = {}
+	activities = []
+	def activityId(activity):
+		if activity not in ids:
+			ids[activity] = len(activities)
+			activities.append(activity)
+		return ids[activity]
+
+	edges = []
+	for edge in subEdges:
+		edges.append(activityId(edge[0]))
+		edges.append(activityId(edge[1]))
+	freqEdges = []
+	freqs = []
+	for edge in edgeFreqs:
+		freqEdges.append(activityId(edge[0]))
+		freqEdges.append(activityId(edge[1]))
+		freqs.append(edgeFreqs[edge])
+
+	return {"sub": subName, "instances": instances, "compValue": compValue,
+		"maxCompressed": [int(i) for i in maxCompressed], "compressed": [int(i) for i in compressed], "uncompressed": [int(i) for i in uncompressed],
+		"mapFrom": [int(pair[0]) for pair in idMap], "mapTo": [int(pair[1]) for pair in idMap],
+		"activities": activities, "edges": edges, "freqEdges": freqEdges, "freqs": freqs}
+
+"""
+Returns the substructure edges of @level, as (srcName, dstName) tuples.
+"""
+def LevelEdges(level):
+	activities = level["activities"]
+	edges = level["edges"]
+	return [(activities[edges[i]], activities[edges[i+1]]) for i in range(0, len(edges), 2)]
+
+"""
+Returns the edges connecting to the substructure of @level, as a dict of (srcName, dstName) -> count.
+"""
+def LevelEdgeFreqs(level):
+	activities = level["activities"]
+	freqEdges = level["freqEdges"]
+	freqs = level["freqs"]
+	edgeFreqs = {}
+	for i in range(len(freqs)):
+		edgeFreqs[(activities[freqEdges[2*i]], activities[freqEdges[2*i+1]])] = freqs[i]
+	return edgeFreqs
+
+"""
+Appends levels to the dendrogram at @path, one line each.
+"""
+class DendrogramWriter(object):
+	def __init__(self, path):
+		self._file = open(path, "a+")
+
+	def Write(self, level):
+		self._file.write(json.dumps(level, separators=(",",":"))+"\n")
+
+	"""
+	Appends all of @levels in a single write.
+	"""
+	def WriteLevels(self, levels):
+		self._file.write("".join([json.dumps(level, separators=(",",":"))+"\n" for level in levels]))
+
+	def Close(self):
+		self._file.close()
+
+"""
+Parses a legacy dendrogram.txt line into a level record.
+"""
+def ParseLegacyLine(line):
+	line = line.strip()
+	mapStart = line.index("{")
+	mapEnd = line.index("}", mapStart)
+	head = line[0:mapStart]
+	inner = head[1:head.index(")")]
+	uncompressed = [i for i in head[head.index(")")+1:].split(",") if len(i) > 0]
+	#an empty compressed-id list leaves no closing bracket
+	if "]" in inner:
+		maxCompressed = [i for i in inner[1:inner.index("]")].split(",") if len(i) > 0]
+		rest = inner[inner.index("]")+1:]
+	else:
+		maxCompressed = []
+		rest = inner[1:]
+	fields = rest.split(":")
+	compressed = [i for i in fields[0].split(",") if len(i) > 0]
+	subName = ":".join(fields[1:-2])
+	idMap = [pair.split(":") for pair in line[mapStart+1:mapEnd].split(",") if len(pair) > 0]
+
+	#the edges and edge frequencies are python literals, separated by a '#' which may also occur in their labels
+	body = line[mapEnd+2:]
+	subEdges, edgeFreqs = [], {}
+	for i in range(len(body)):
+		if body[i] == "#":
+			try:
+				subEdges = ast.literal_eval(body[0:i])
+				edgeFreqs = ast.literal_eval(body[i+1:])
+				break
+			except (ValueError, SyntaxError):
+				continue
+
+	return MakeLevel(subName, int(fields[-2]), float(fields[-1]), maxCompressed, compressed, uncompressed, idMap, subEdges, edgeFreqs)
+
+"""
+Random access to the levels of a dendrogram, which may be a store, a legacy dendrogram.txt, or a legacy one continued by the store.
+"""
+class DendrogramStore(object):
+	def __init__(self):
+		self._offsets = []
+		self._file = None
+		self._map = None
+
+	def Open(self, path):
+		self._file = open(path, "rb")
+		if self._file.seek(0, 2) == 0:
+			return self
+		self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		#index the start and end of each non-empty line
+		start = 0
+		size = len(self._map)
+		while start < size:
+			end = self._map.find(b"\n", start)
+			if end < 0:
+				end = size
+			if len(self._map[start:end].strip()) > 0:
+				self._offsets.append((start, end))
+			start = end + 1
+		return self
+
+	def Close(self):
+		if self._map is not None:
+			self._map.close()
+			self._map = None
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+	def NumLevels(self):
+		return len(self._offsets)
+
+	"""
+	Returns the record of level @i, as built by MakeLevel().
+	"""
+	def GetLevel(self, i):
+		start, end = self._offsets[i]
+		line = self._map[start:end].decode("utf-8").strip()
+		if line[0:1] == "(":
+			return ParseLegacyLine(line)
+		return json.loads(line)
+
+	"""
+	Returns the id map of level @i, as a dict of id -> next id, both as strings.
+	"""
+	def GetIdMap(self, i):
+		level = self.GetLevel(i)
+		return dict(zip([str(id) for id in level["mapFrom"]], [str(id) for id in level["mapTo"]]))
+
+	def __getitem__(self, i):
+		return self.GetLevel(i)
+
+	def __len__(self):
+		return self.NumLevels()
+
+	def __iter__(self):
+		for i in range(self.NumLevels()):
+			yield self.GetLevel(i)
+
+"""
+Returns the DendrogramStore at @path, which may be either a store or a legacy dendrogram.txt.
+"""
+def Load(path):
+	return DendrogramStore().Open(path)
+
+"""
+Converts a legacy dendrogram.txt at @legacyPath to a store at @outputPath.
+"""
+def ConvertLegacy(legacyPath, outputPath):
+	store = Load(legacyPath)
+	levels = [level for level in store]
+	store.Close()
+	ofile = open(outputPath, "w+")
+	ofile.close()
+	writer = DendrogramWriter(outputPath)
+	writer.WriteLevels(levels)
+	writer.Close()
+
+def usage():
+	print("Usage: python DendrogramStore.py [legacy dendrogram.txt path] [output store path]")
+
+def main():
+	if len(sys.argv) < 3:
+		print("ERROR incorrect number of arguments passed to DendrogramStore.py")
+		usage()
+		exit()
+	ConvertLegacy(sys.argv[1], sys.argv[2])
+
+if __name__ == "__main__":
+	main()
@@ -15,7 +15,17 @@ algorithm; it also takes a path to the original trace file from which this model
 on the discovered model, where each walk is regarded as a miniature graph. These mini graphs are output to a .g
 file which can then be fed to SUBDUE.
 
-This script also outputs the markov model of the traces to markovModel.py in the provided output directory.
+This script also outputs the markov model of the traces to markovModel.pmm in the provided output directory (see MarkovModel.py),
+and the graph of each replayed trace to the trace-graph store at the --traceGraphs path (see TraceGraphStore.py).
+
+Each run also saves its replay state, the replay of each distinct sequence of the log, to replayState.prs beside the .g file (see ReplayState.py).
+When the model has changed only slightly since the last run on the same log, as after switching miners or re-mining a sampled log, pass --incremental
+to replay only the sequences whose replay touched a changed activity of the model; the outputs are rewritten from the saved replays of all other
+sequences, and are identical to those of a full replay.
+
+Moves of a trace that the model cannot replay (missing edges, arbitrary links and insertion anomalies) are counted per activity, and the time spent
+in each phase of the run (read, replay, write, markov) is measured; both are written as a json summary to replayStats.json beside the .g file
+(see ReplayStats). Pass --verbose to also print a WARNING for each such move, as each sequence is replayed.
 
 The graph edges are assumed to be unlabelled, so the .g file edge listings will not contain that info. Note the difference
 between this and the example applications of GBAD/SUBDUE, which often use edge labellings.
@@ -24,6 +34,90 @@ from __future__ import print_function
 import igraph
 import sys
 import os
+import multiprocessing
+import collections
+import time
+import json
+#the model compiler lives with the other conversion scripts; it reads either graphml or compiled (.pmc) models
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import ModelCompiler
+import MarkovModel
+import TraceGraphStore
+import GbadWriter
+import ReplayState
+
+#the number of traces replayed, and written, per chunk
+CHUNK_SIZE = 1000
+#the most distinct sequences held in the replay cache, which bounds its memory on logs with very many distinct sequences
+MAX_CACHED_SEQUENCES = 100000
+#the size of the output file buffers
+WRITE_BUFFER_SIZE = 1 << 20
+
+"""
+The conformance counts and phase timings of a replay, summarized to replayStats.json.
+
+Replaying a sequence yields a list of conformance events, as (kind, activity) tuples, for the moves of the sequence that the model cannot replay:
+	missingEdge: the activity (or START) has no model edge to any later activity of the sequence, nor to END
+	arbitraryLink: a link not in the model was made from the activity, to the next activity of the sequence or to END
+	insertionAnomaly: the activity is not in the model, and was linked from the previous activity
+The events are counted per trace, by activity, so a sequence shared by n traces counts n times.
+
+The phase timings are in seconds. When replaying in parallel, the replay, markov and .g rendering (write) time of the workers is summed, so the phases
+may add up to more than the wall time of the run.
+"""
+class ReplayStats(object):
+	KINDS = ["missingEdge", "arbitraryLink", "insertionAnomaly"]
+	PHASES = ["read", "replay", "write", "markov"]
+
+	def __init__(self):
+		#maps kind -> activity -> number of events
+		self.Counts = dict([(kind, dict()) for kind in self.KINDS])
+		self.NonConformingTraces = 0
+		self.Seconds = dict([(phase, 0.0) for phase in self.PHASES])
+
+	"""
+	Counts the conformance events @events of the replay of a sequence, for @count traces with that sequence.
+	"""
+	def AddEvents(self, events, count=1):
+		if len(events) == 0:
+			return
+		for kind, activity in events:
+			self.Counts[kind][activity] = self.Counts[kind].get(activity, 0) + count
+		self.NonConformingTraces += count
+
+	"""
+	Sums the counts and timings of another ReplayStats (as from a replay worker) into this one.
+	"""
+	def Merge(self, stats):
+		for kind in self.KINDS:
+			for activity in stats.Counts[kind]:
+				self.Counts[kind][activity] = self.Counts[kind].get(activity, 0) + stats.Counts[kind][activity]
+		self.NonConformingTraces += stats.NonConformingTraces
+		for phase in self.PHASES:
+			self.Seconds[phase] += stats.Seconds[phase]
+
+	def Total(self, kind):
+		return sum(self.Counts[kind].values())
+
+	"""
+	Returns the summary as a dict: run info @info, the number of traces, the counts of each kind (in total, and by activity, most frequent first)
+	and the phase timings, with @wallSeconds as the total.
+	"""
+	def Summary(self, numTraces, wallSeconds, info):
+		summary = dict(info)
+		summary["numTraces"] = numTraces
+		summary["nonConformingTraces"] = self.NonConformingTraces
+		for kind in self.KINDS:
+			byActivity = sorted(self.Counts[kind].items(), key=lambda item: (-item[1], item[0]))
+			summary[kind+"Counts"] = {"total": self.Total(kind), "byActivity": collections.OrderedDict(byActivity)}
+		seconds = collections.OrderedDict([(phase, round(self.Seconds[phase], 3)) for phase in self.PHASES])
+		seconds["total"] = round(wallSeconds, 3)
+		summary["seconds"] = seconds
+		return summary
+
+	def Save(self, path, numTraces, wallSeconds, info):
+		with open(path, "w") as ofile:
+			json.dump(self.Summary(numTraces, wallSeconds, info), ofile, indent=1)
 
 """
 Oddly named, but this object's responsibility is reading in a model graphml file, and a file containing
@@ -31,8 +125,16 @@ test traces, and replaying each trace on the model to generate a big record to b
 GBAD in their respective formats. Note that each trace is replayed and output as its own 'XP'/'XN' graph.
 """
 class Retracer(object):
-	def __init__(self):
-		pass
+	"""
+	@verbose: Print a WARNING for each move of a sequence that the model cannot replay, rather than only counting them in the replay statistics
+	"""
+	def __init__(self, verbose=False):
+		#maps sequence -> (edge sequence, encoded edge array, trace-graph edge list, conformance events) for each distinct sequence replayed so far
+		self._replayCache = dict()
+		#renders the .g records
+		self._gbadRenderer = GbadWriter.GbadRecordRenderer()
+		self._verbose = verbose
+		self._stats = ReplayStats()
         
 	"""
 	The markov model is initialized not just from the edges encountered in the log, but from the underlying mined model, even if
@@ -60,55 +162,92 @@ class Retracer(object):
 	TODO: Its quite possible that certain process discovery algorithms and heuristics may generate an incomplete model, such
 	that some trace may not be replayabe that model. Not quite clear yet how to handle this.
 
-	@graphPath: Path to a graphml path representing the mined process model
+	@graphPath: Path to a graphml path representing the mined process model, or to its compiled model (see ModelCompiler.py)
 	@tracePath: Path to some .log file containing traces in the form [integer],[anomaly status],[observed sequence]. For example, "123,+,ABCD".
 	@outputPath: The path to which all the walks replayed on the mined model will be stored, in .g format. Each trace is stored as described
 	in the .g examples: prepended with "XP" or "XN" to indicate anomaly-status, a listing of vertices and info, then a listing of edges and info.
-	@useSubdueFormat: A bool indicating whether or not to output SUBDUE or GBAD formatted traces. I'm trying to keep the schema for either
-	the same, they just use different syntax. The graphs/groups.g file in SUBDUE provides the guiding example of the target format in which traces
-	will be output by this class.
+	@useSubdueFormat: Must be false: traces are output in GBAD format only. A true value is rejected with a ValueError before any trace is
+	replayed, since the replay may run in pool workers.
+	@numWorkers: The number of processes with which to replay the traces; the output is identical for any number of workers.
+	@progressCallback: Called after each chunk of traces as progressCallback(numTracesReplayed, tracesPerSecond); defaults to printing both.
+	@incremental: Replay only the sequences affected by the changes to the model since the last run on this log, per the replay state beside @outputPath.
+	Falls back to a full replay if there is no replay state, or it is of a different log.
 	"""
-	def GenerateTraces(self, graphPath, tracePath, outputPath, useSubdueFormat, subgraphPath):
+	def GenerateTraces(self, graphPath, tracePath, outputPath, useSubdueFormat, subgraphPath, numWorkers=1, progressCallback=None, incremental=False):
+		if useSubdueFormat:
+			raise ValueError("SUBDUE output format is not supported by the Retracer; use the gbad format")
 		print("Retracer subgraph-generator replaying traces from "+tracePath+" on mined model "+graphPath+". Output will be saved to "+outputPath)
 
+		runStart = time.time()
 		self._readModel(graphPath)
 		self._initializeMarkovModel()
+		outputDir = outputPath[:outputPath.rfind("/")]
+		statePath = outputDir+"/replayState.prs"
+		logHash = ReplayState.FileHash(tracePath)
+		state = None
+		if incremental:
+			state = self._openReplayState(statePath, logHash)
+		self._stats.Seconds["read"] += time.time() - runStart
 		traceFile = open(tracePath,"r")
-		gFile = open(outputPath,"w+")
-		#output the subgraphs representing each individual trace to subgraphs.py
-		#subgraphPath = os.path.dirname(outputPath)
-		#if len(subgraphPath) <= 2:
-		#	subgraphPath = "./"
-		#subgraphPath += "/subgraphs.py"
-		#print("\n\nOPENING SUBSGRAPHS: "+subgraphPath)
-		subgraphFile = open(subgraphPath,"w+")
-		modelInfo = self._model["name"]
+		gFile = open(outputPath,"wb",WRITE_BUFFER_SIZE)
+		#output the subgraphs representing each individual trace to the trace-graph store
+		traceGraphWriter = TraceGraphStore.TraceGraphWriter(subgraphPath, WRITE_BUFFER_SIZE)
+		#mined models carry their name; synthetic models (e.g. when replaying directly on the generating model) may not
+		if "name" in self._model.attributes():
+			modelInfo = self._model["name"]
+		else:
+			modelInfo = os.path.basename(graphPath)
 
 		#write header info, for convenience
-		header = "Trace replay of "+tracePath+" on model mined from "+graphPath+" for model "+modelInfo+"\n"
-		if useSubdueFormat:
-			header = "%" + header
-		else:
-			header = "//" + header
-		gFile.write(header)
+		header = "//Trace replay of "+tracePath+" on model mined from "+graphPath+" for model "+modelInfo+"\n"
+		gFile.write(header.encode("utf-8"))
+
+		#the replay state of this run is written beside the previous one, which is read during an incremental replay, and then replaces it
+		stateWriter = ReplayState.ReplayStateWriter(statePath+".tmp", self._model.vs["name"], self._edgeMap.keys(), logHash, WRITE_BUFFER_SIZE)
 
 		#prepare and write all of the traces to the target format
-		self._outputTraces(traceFile, gFile, useSubdueFormat, subgraphFile)
+		isIncremental = state is not None
+		if isIncremental:
+			self._outputTracesIncrementally(state, gFile, traceGraphWriter, stateWriter, progressCallback)
+			state.Close()
+		else:
+			self._outputTraces(traceFile, gFile, useSubdueFormat, traceGraphWriter, stateWriter, graphPath, numWorkers, progressCallback)
         
-		markovFile = outputPath[:outputPath.rfind("/")]+"/markovModel.py"
+		markovFile = outputDir+"/markovModel.pmm"
 		print("Outputting markov model to: "+markovFile)
 		
+		start = time.time()
 		self._writeMarkovModel(markovFile)
+		self._stats.Seconds["markov"] += time.time() - start
         
-		subgraphFile.close()
+		start = time.time()
+		traceGraphWriter.Close()
+		stateWriter.Close()
+		os.replace(statePath+".tmp", statePath)
 		traceFile.close()
 		gFile.close()
+		self._stats.Seconds["write"] += time.time() - start
+
+		statsFile = outputDir+"/replayStats.json"
+		info = {"log": tracePath, "model": graphPath, "workers": numWorkers, "incremental": isIncremental}
+		self._stats.Save(statsFile, self._traceCount, time.time() - runStart, info)
+		self._reportStats(statsFile)
+
+	"""
+	Prints a summary of the replay statistics, as saved to @statsFile.
+	"""
+	def _reportStats(self, statsFile):
+		stats = self._stats
+		counts = "("+str(stats.Total("missingEdge"))+" missing edges, "+str(stats.Total("arbitraryLink"))+" arbitrary links, "+str(stats.Total("insertionAnomaly"))+" insertion anomalies)"
+		if stats.NonConformingTraces > 0 and not self._verbose:
+			print("WARNING "+str(stats.NonConformingTraces)+" of "+str(self._traceCount)+" traces could not be fully replayed on the model "+counts+"; pass --verbose for details")
+		else:
+			print(str(stats.NonConformingTraces)+" of "+str(self._traceCount)+" traces could not be fully replayed on the model "+counts)
+		print("Phase times: "+", ".join(["%s %.2fs" % (phase, stats.Seconds[phase]) for phase in ReplayStats.PHASES])+". Replay statistics written to "+statsFile)
 
 	def _writeMarkovModel(self, outputPath):
-		f = open(outputPath,"w+")
-		print("\n\n>>>MARKOV MODEL: "+str(self._markovModel))
-		f.write(str(self._markovModel))
-		f.close()
+		print("Markov model: "+str(len(self._markovModel))+" edges over "+str(self._traceCount)+" traces")
+		MarkovModel.Save(self._markovModel, self._traceCount, outputPath)
 
 	"""
 	Reads in a graph from graphml into an igraph graph object, and also caches the vertex and edge mappings in the object
@@ -118,16 +257,21 @@ class Retracer(object):
 	def _readModel(self, gpath):
 	#read the mined process model
 		print("Reading graph from "+gpath)
-		self._model = igraph.Graph.Read(gpath)
+		self._model = ModelCompiler.ReadModel(gpath)
 
 		#edgeMap maps symbolic (activity1, activity2) name string tuples directly to igraph edges
 		self._edgeMap = {}
 		#revMap maps igraph edges directly back to the (activity1, actvitiy2) named tuples keys of edgeMap
 		self._edgeRevMap = {}
+		#successors maps each activity name to the set of names of its successors in the model, for replay
+		self._successors = dict([(name, set()) for name in self._model.vs["name"]])
+		names = self._model.vs["name"]
 		for edge in self._model.es:
-			key = (self._model.vs[edge.source]["name"], self._model.vs[edge.target]["name"])
+			key = (names[edge.source], names[edge.target])
 			self._edgeMap[key] = edge
 			self._edgeRevMap[edge] = key
+			self._successors[key[0]].add(key[1])
+		self._activitySet = set(names)
 
 	"""
 	Utility for looking up the edge given by two activitiy labels, a and b.
@@ -161,78 +305,321 @@ class Retracer(object):
 	"""
 	Outputs the traces in SUBDUE format, just like the 'groups.g' example found in the graphs/ folder of subdue.
 	
+	The log is streamed and replayed in chunks of CHUNK_SIZE traces, and each chunk's records are rendered into one buffer and written with
+	a single write (see GbadWriter.py), so memory
+	stays flat regardless of the size of the log. With @numWorkers > 1 the chunks are replayed in a process pool, each worker holding its
+	own copy of the model, and their outputs are written back in the original chunk order, so the .g records (and gbad's sequential XP ids) and
+	the trace graphs are byte-identical to a serial run. The workers' markov counts are summed into this object's markov model, also in chunk order.
+
 	@traceFile: a .log file
-	@gFile: the .g file to which traces will be written (as graphs)
+	@gFile: the .g file to which traces will be written (as graphs), opened in binary mode
 	@useSubdueFormat: use subdue format over gbad
-	@subgraphFile: The file to which each trace-graph will be written as a tuple, the first member the trace id, the second item the list of edges representing the graph
+	@traceGraphWriter: The TraceGraphWriter to which each trace-graph will be written, as the trace id and the list of edges representing the graph
+	@stateWriter: The ReplayStateWriter to which each trace's sequence, and the replay of each distinct sequence, will be written
+	@graphPath: The model path, from which each worker reads its own model when @numWorkers > 1
+	@numWorkers: The number of worker processes with which to replay the traces
+	@progressCallback: Called after each chunk as progressCallback(numTracesReplayed, tracesPerSecond)
 	"""
-	def _outputTraces(self, traceFile, gFile, useSubdueFormat, subgraphFile):
-		traces = [line.strip() for line in traceFile.readlines() if len(line.strip()) > 0]
-		ntraces = str(len(traces))
+	def _outputTraces(self, traceFile, gFile, useSubdueFormat, traceGraphWriter, stateWriter, graphPath=None, numWorkers=1, progressCallback=None):
+		if progressCallback is None:
+			progressCallback = _printProgress
+		chunks = self._timedChunks(_readTraceChunks(traceFile))
+
+		isParallel = numWorkers > 1
+		if isParallel:
+			results = self._replayChunksInPool(chunks, useSubdueFormat, graphPath, numWorkers)
+		else:
+			results = (self._replayChunk(chunk, useSubdueFormat) for chunk in chunks)
+
+		#maps sequence -> the trace-graph store's variant id of its edge list, so each distinct edge list is encoded once
+		traceGraphVariants = dict()
 		ctr = 0
+		startTime = time.time()
+		for gText, traceGraphs, replays, markovModel, stats, numTraces in results:
+			start = time.time()
+			gFile.write(gText)
+			#also write the graph representation of the traces to the trace-graph store, for processing later in python
+			for traceNo, sequence, edgeList in traceGraphs:
+				if sequence in traceGraphVariants:
+					traceGraphWriter.AddTrace(traceNo, traceGraphVariants[sequence])
+				else:
+					variantId = traceGraphWriter.AddVariant(edgeList)
+					if len(traceGraphVariants) < MAX_CACHED_SEQUENCES:
+						traceGraphVariants[sequence] = variantId
+					traceGraphWriter.AddTrace(traceNo, variantId)
+				gTrace, events = replays[sequence]
+				stateWriter.Add(traceNo, sequence, gTrace, events)
+			self._stats.Seconds["write"] += time.time() - start
+			if isParallel:
+				start = time.time()
+				self._mergeMarkovModel(markovModel)
+				self._stats.Seconds["markov"] += time.time() - start
+				self._stats.Merge(stats)
+			ctr += numTraces
+			progressCallback(ctr, ctr / max(time.time() - startTime, 1E-6))
+		self._traceCount = ctr
+            
+		print("  Done.")
+
+	"""
+	Yields the chunks of @chunks, timing the reading of each as the read phase.
+	"""
+	def _timedChunks(self, chunks):
+		while True:
+			start = time.time()
+			chunk = next(chunks, None)
+			self._stats.Seconds["read"] += time.time() - start
+			if chunk is None:
+				return
+			yield chunk
+
+	"""
+	Replays the chunks of traces in a pool of @numWorkers processes, yielding each chunk's results in the original chunk order.
+	At most two chunks per worker are in flight at any time, so the log is still streamed rather than read into memory ahead of the workers.
+	"""
+	def _replayChunksInPool(self, chunks, useSubdueFormat, graphPath, numWorkers):
+		pool = multiprocessing.Pool(numWorkers, initializer=_initReplayWorker, initargs=(graphPath, self._verbose))
+		pending = collections.deque()
+		for chunk in chunks:
+			pending.append(pool.apply_async(_replayTraceChunk, ((chunk, useSubdueFormat),)))
+			if len(pending) >= 2 * numWorkers:
+				yield pending.popleft().get()
+		while len(pending) > 0:
+			yield pending.popleft().get()
+		pool.close()
+		pool.join()
+
+	"""
+	Replays a chunk of traces, returning the bytes of their .g records and their trace graphs, and updating this object's markov model.
+
+	Logs are typically dominated by a small number of distinct sequences (variants), so the replay of each distinct sequence, its encoded
+	edge array (from which its .g record is rendered) and its trace-graph edge list are cached by the sequence string.
+	Likewise, the markov model and the conformance counts are updated once per distinct sequence in the chunk, weighted by the number of traces with that sequence.
+
+	@traces: A list of trace lines, as in "123,+,ABCD"
+	@useSubdueFormat: use subdue format over gbad
+	Returns: A tuple of the chunk's .g bytes, its (traceNo, sequence, edge list) trace graphs, the (edge sequence, conformance events) replay of each of its
+	distinct sequences (as a dict), this object's markov model and replay statistics, and the number of traces in the chunk
+	"""
+	def _replayChunk(self, traces, useSubdueFormat):
+		start = time.time()
+		gRecords = []	#(traceNo, encoded edge array) for each trace
+		traceGraphs = []
+		#maps sequence -> number of traces with that sequence in this chunk
+		sequenceCounts = dict()
+		#replays of this chunk that didn't fit in the replay cache
+		chunkCache = dict()
 		for trace in traces:
-			if ctr % 100 == 99:
-				print("\rEmitting trace: "+str(ctr)+" / "+ntraces+" traces                                      ",end="")
-			ctr += 1
 			tokens = trace.split(",")
 			#detect the anomaly status of this trace
 			isAnomalous = "+" == tokens[1]
 			traceNo = int(tokens[0])
 			sequence = tokens[2]
 
-			#"replay" the sequence on the mined model; bear in mind some model-miners may generate incomplete or inaccurate models,
-			#such that every sequence may not be a valid walk on the graph!
-			gTrace = self._replaySequence(sequence) #returns a list of igraph edges defining this walk
-			if useSubdueFormat:
-				print("SUBDUE FORMAT TODO. EXITING")
-				exit()
-				gRecord = self._buildSubdueRecord(isAnomalous, traceNo, gTrace)
+			if sequence in self._replayCache:
+				gTrace, pairs, edgeList, events = self._replayCache[sequence]
+			elif sequence in chunkCache:
+				gTrace, pairs, edgeList, events = chunkCache[sequence]
 			else:
-				gRecord = self._buildGbadRecord(isAnomalous, traceNo, gTrace)
-			gFile.write(gRecord)
-			
-			#also write the graph representation of the trace to the subgraphs.py file, for processing later in python
-			self._writeSubgraph(subgraphFile, traceNo, gTrace, includeEndPoints=False)
-            
-			self._updateMarkovModel(gTrace)
-            
+				#"replay" the sequence on the mined model; bear in mind some model-miners may generate incomplete or inaccurate models,
+				#such that every sequence may not be a valid walk on the graph!
+				events = []
+				gTrace = self._replaySequence(sequence, events) #returns a list of activity tuples defining this walk
+				pairs = self._gbadRenderer.Encode(gTrace)
+				edgeList = self._buildSubgraphEdgeList(gTrace, includeEndPoints=False)
+				if len(self._replayCache) < MAX_CACHED_SEQUENCES:
+					self._replayCache[sequence] = (gTrace, pairs, edgeList, events)
+				else:
+					#the cache is full, so keep this replay only as long as the chunk, for its markov update
+					chunkCache[sequence] = (gTrace, pairs, edgeList, events)
+			sequenceCounts[sequence] = sequenceCounts.get(sequence, 0) + 1
+			gRecords.append((traceNo, pairs))
+			traceGraphs.append((traceNo, sequence, edgeList))
+
+		self._stats.Seconds["replay"] += time.time() - start
+
+		start = time.time()
+		replays = dict()
+		for sequence in sequenceCounts:
+			if sequence in self._replayCache:
+				replay = self._replayCache[sequence]
+			else:
+				replay = chunkCache[sequence]
+			gTrace, events = replay[0], replay[3]
+			self._updateMarkovModel(gTrace, sequenceCounts[sequence])
+			self._stats.AddEvents(events, sequenceCounts[sequence])
+			replays[sequence] = (gTrace, events)
+		self._stats.Seconds["markov"] += time.time() - start
+
+		start = time.time()
+		gText = self._gbadRenderer.RenderBatch(gRecords)
+		self._stats.Seconds["write"] += time.time() - start
+
+		return gText, traceGraphs, replays, self._markovModel, self._stats, len(traces)
+
+	"""
+	Returns the replay state at @statePath if it can be used to replay the log incrementally, that is, if it is of the log with sha1 @logHash; None otherwise.
+	"""
+	def _openReplayState(self, statePath, logHash):
+		if not os.path.exists(statePath):
+			print("WARNING no replay state found at "+statePath+", replaying the full log")
+			return None
+		if not ReplayState.IsReplayState(statePath):
+			print("WARNING "+statePath+" is not a replay state of this version of the Retracer, replaying the full log")
+			return None
+		state = ReplayState.ReplayState().Open(statePath)
+		if state.LogHash != logHash:
+			print("WARNING the replay state at "+statePath+" is of a different log, replaying the full log")
+			state.Close()
+			return None
+		return state
+
+	"""
+	Diffs the model of the replay state @state against this object's model, and returns the ids of the state's variants whose replay may
+	differ on this object's model.
+
+	See _replaySequence(): the replay of a sequence reads only the model edges from START or one of the sequence's activities, to END or one
+	of the sequence's activities, and whether each of its activities is in the model. So a variant is affected if it contains an activity
+	added to or removed from the model, or if an added or removed edge joins two of its activities (or START/END).
+	"""
+	def _affectedVariants(self, state):
+		modelEdges = set(self._edgeMap.keys())
+		#index the edges added to or removed from the model by their source
+		changedSuccessors = dict()
+		changedEdges = modelEdges.symmetric_difference(state.ModelEdges)
+		for srcName, dstName in changedEdges:
+			changedSuccessors.setdefault(srcName, set()).add(dstName)
+		changedActivities = self._activitySet.symmetric_difference(state.ModelActivities)
+		print("Model changed by "+str(len(changedEdges))+" edges and "+str(len(changedActivities))+" activities since the last replay")
+
+		affected = set()
+		for variantId in range(state.NumVariants()):
+			activities = set(state.GetSequence(variantId))
+			if not changedActivities.isdisjoint(activities):
+				affected.add(variantId)
+				continue
+			targets = activities | set(["END"])
+			for srcName in activities | set(["START"]):
+				if srcName in changedSuccessors and not changedSuccessors[srcName].isdisjoint(targets):
+					affected.add(variantId)
+					break
+		return affected
+
+	"""
+	Replays the log of the replay state @state incrementally: only the variants affected by the changes to the model are replayed, and the replays of
+	all others are read back from @state. The .g records, trace graphs and replay state are then rewritten trace by trace in the original log order,
+	in chunks of CHUNK_SIZE traces, so the outputs are identical to those of a full replay of the log.
+
+	The markov model and the conformance counts are rebuilt from the replay of each variant, weighted by its number of traces; visiting the variants in
+	order of first appearance in the log adds any edges not in the model in the same order as a full replay.
+	"""
+	def _outputTracesIncrementally(self, state, gFile, traceGraphWriter, stateWriter, progressCallback=None):
+		if progressCallback is None:
+			progressCallback = _printProgress
+		affected = self._affectedVariants(state)
+		counts = state.VariantCounts()
+		print("Replaying "+str(len(affected))+" of "+str(state.NumVariants())+" distinct sequences ("+str(sum([counts[variantId] for variantId in affected]))+" of "+str(state.NumTraces())+" traces)")
+		start = time.time()
+		replays = dict()
+		for variantId in affected:
+			events = []
+			replays[variantId] = (self._replaySequence(state.GetSequence(variantId), events), events)
+		self._stats.Seconds["replay"] += time.time() - start
+
+		start = time.time()
+		for variantId in range(state.NumVariants()):
+			if variantId in replays:
+				gTrace, events = replays[variantId]
+			else:
+				gTrace, events = state.GetReplay(variantId), state.GetConformance(variantId)
+			self._updateMarkovModel(gTrace, counts[variantId])
+			self._stats.AddEvents(events, counts[variantId])
+		self._stats.Seconds["markov"] += time.time() - start
+
+		#maps variant id -> (sequence, edge sequence, conformance events, encoded edge array, trace-graph store variant id), as the replay cache of _replayChunk()
+		variantCache = dict()
+		numTraces = state.NumTraces()
+		startTime = time.time()
+		for chunkStart in range(0, numTraces, CHUNK_SIZE):
+			start = time.time()
+			gRecords = []
+			for i in range(chunkStart, min(chunkStart + CHUNK_SIZE, numTraces)):
+				traceNo = state.TraceIds[i]
+				variantId = state.TraceVariants[i]
+				if variantId in variantCache:
+					sequence, gTrace, events, pairs, traceGraphVariant = variantCache[variantId]
+				else:
+					sequence = state.GetSequence(variantId)
+					if variantId in replays:
+						gTrace, events = replays[variantId]
+					else:
+						gTrace, events = state.GetReplay(variantId), state.GetConformance(variantId)
+					pairs = self._gbadRenderer.Encode(gTrace)
+					traceGraphVariant = traceGraphWriter.AddVariant(self._buildSubgraphEdgeList(gTrace, includeEndPoints=False))
+					if len(variantCache) < MAX_CACHED_SEQUENCES:
+						variantCache[variantId] = (sequence, gTrace, events, pairs, traceGraphVariant)
+				gRecords.append((traceNo, pairs))
+				traceGraphWriter.AddTrace(traceNo, traceGraphVariant)
+				stateWriter.Add(traceNo, sequence, gTrace, events)
+			gFile.write(self._gbadRenderer.RenderBatch(gRecords))
+			self._stats.Seconds["write"] += time.time() - start
+			ctr = min(chunkStart + CHUNK_SIZE, numTraces)
+			progressCallback(ctr, ctr / max(time.time() - startTime, 1E-6))
+		self._traceCount = numTraces
+
 		print("  Done.")
 
 	"""
-	Writes python representation of graph to file, as a tuple: tup[0]=traceNo, tup[1] = list of edges as named tuples, as in [('a', 'c'), ('f', 'h'), ('a', 'h')]
+	Sums the transition counts of another markov model (as from a replay worker) into this object's markov model.
+	"""
+	def _mergeMarkovModel(self, markovModel):
+		for edge in markovModel:
+			if edge in self._markovModel:
+				self._markovModel[edge] += markovModel[edge]
+			else:
+				self._markovModel[edge] = markovModel[edge]
+
+	"""
+	Writes the graph of a trace to the trace-graph store, as traceNo and its list of edges as named tuples, as in [('a', 'c'), ('f', 'h'), ('a', 'h')]
 	
-	@subgraphFile: Open file handle to which the edge sequence will be written
+	@traceGraphWriter: The TraceGraphWriter to which the edge sequence will be written
 	@traceNo: The trace number
 	@gTrace: A list of named tuples representing the edge sequence given by some graph: [('a', 'c'), ('f', 'h'), ('a', 'h') ... ]
 	@includeEndPoints: Whether or not to include the START and END nodes of each trace
 	"""
-	def _writeSubgraph(self, subgraphFile, traceNo, gTrace, includeEndPoints=False):
-		s = "("+str(traceNo)+","
-		
+	def _writeSubgraph(self, traceGraphWriter, traceNo, gTrace, includeEndPoints=False):
+		traceGraphWriter.Add(traceNo, self._buildSubgraphEdgeList(gTrace, includeEndPoints))
+
+	"""
+	Returns the edge list of the graph written by _writeSubgraph().
+	"""
+	def _buildSubgraphEdgeList(self, gTrace, includeEndPoints=False):
 		#filter end points if not requested to include them
 		if not includeEndPoints:
 			edgeList = [edge for edge in gTrace if edge[0].upper() not in {"START","END"} and edge[1].upper() not in {"START","END"}]
+		else:
+			edgeList = gTrace
 		
 		#edgeList = [(gTrace.vs[e.source]["name"], gTrace.vs[e.target]["name"])  for e in gTrace.es]
-		s += str(edgeList)
-		s += ")\n"
-		
-		subgraphFile.write(s)
+		return edgeList
 		
 	"""
 	Accepts a list of edges code as a list of directed edge pairs: [('a','b'), ('c','f'), ... ]
 	and update in-memory markov model.
+
+	@count: The number of traces replayed as @edgeSequence, by which each of its edge counts is incremented
 	"""
-	def _updateMarkovModel(self, edgeSequence):
+	def _updateMarkovModel(self, edgeSequence, count=1):
 		for edge in edgeSequence:
-			if edge in self._markovModel.keys():
-				self._markovModel[edge] += 1
+			if edge in self._markovModel:
+				self._markovModel[edge] += count
 			else:
 				#this should be unreachable, based on constructing the markov model from the all-behavior-inclusive process model, so warn if reached
 				#the justification for this warning is that no edge should be detected that is not included in the model already; if there is, either the log
 				#was modified (? maybe to add noise), or an error has occurred, so it needs to be justified why this was reached
-				print("\n\n>>> WARNING: new edge detected in _updateMarkovModel not found in original graph: "+str(edge))
-				self._markovModel[edge] = 1
+				if self._verbose:
+					print("\n\n>>> WARNING: new edge detected in _updateMarkovModel not found in original graph: "+str(edge))
+				self._markovModel[edge] = count
         
 	"""
 	Converts an igraph edge into an activity tuple
@@ -263,69 +650,100 @@ class Retracer(object):
 	assumption relied on in this function***. The constraint means, given A and searching for its in/out edges for this partial ordering (p.o.),  it is valid to search to
 	simply search forward for the first node in the p.o. with which A shares an edge, and search backward for the first node which shares an edge with A.
 
+	The forward search is resolved for all activities in a single reverse pass over the sequence, which tracks the next position of each activity.
+	The out-edge of the activity at position i goes to whichever of its model successors occurs next after i, found in O(out-degree), so replay
+	is linear in the length of the sequence rather than quadratic.
+
+	Each move of the sequence that the model cannot replay is recorded as a (kind, activity) conformance event (see ReplayStats), and only printed
+	as a WARNING when verbose.
+
 	Returns: A list of activity tuples representing a direct edge between them: [('a','b'), ('c','f'), ... ]
 
 	@sequence: a sequence of characters representing single activities, partially-ordered
-	@graph: the igraph on which to 'replay' the partial-ordered sequence, thereby generating the ordered sequence to return
+	@events: a list to which the conformance events of the replay are appended
 	"""
-	def _replaySequence(self, sequence):
-		activitySet = set([v["name"] for v in self._model.vs])
+	def _replaySequence(self, sequence, events=None):
+		if events is None:
+			events = []
+		activitySet = self._activitySet
 		#init the edge sequence with the edge from START to sequence[0] the first activity
 		edgeSequence = []
 		initialEdge = self._getEdge("START", sequence[0])
 		if initialEdge == None:
-			print("First node="+str(self._model.vs[0]["name"]))
-			print("ERROR edgeSequence.len = 0 in _replaySequence() of GenerateTraceSubgraphs.py. No edge found from START to first activity of "+sequence)
+			events.append(("missingEdge", "START"))
+			if self._verbose:
+				print("First node="+str(self._model.vs[0]["name"]))
+				print("ERROR edgeSequence.len = 0 in _replaySequence() of GenerateTraceSubgraphs.py. No edge found from START to first activity of "+sequence)
 		else:
 			e = self._edgeToActivityTuple(initialEdge)
 			edgeSequence.append(e)
 
-		#See the header for this search routines' assumptions. Searches forward for first successor; this is necessarily the next edge
+		#See the header for this search routines' assumptions. The first successor downstream of each activity is necessarily its next edge;
+		#walk the sequence backward, tracking the next position of each activity, to find each activity's first downstream successor
+		nextPosition = dict()
+		successorPosition = [None] * len(sequence)
+		for i in range(len(sequence) - 1, -1, -1):
+			activity = sequence[i]
+			if activity in activitySet:
+				for successor in self._successors[activity]:
+					j = nextPosition.get(successor)
+					if j is not None and (successorPosition[i] is None or j < successorPosition[i]):
+						successorPosition[i] = j
+			nextPosition[activity] = i
+
 		i = 0
 		while i < len(sequence) - 1:
 			#handles insertion anomalies: for which the log contains an activity not in the model
 			if sequence[i] not in activitySet:
 				#arbitrarily attach sequence[i] activity to immediately-previous activity
+				events.append(("insertionAnomaly", sequence[i]))
 				if i == 0:
 					e = ("START",sequence[i])
 				else:
 					e = (sequence[i-1],sequence[i])
 				edgeSequence.append(e)
 			else:
-				#search downstream for this activity's edge, given the partial ordering
-				j = i + 1
-				edge = None
-				while j < len(sequence) and edge == None:
-					edge = self._getEdge(sequence[i], sequence[j])
-					#edge = self._getEdge(sequence[i], sequence[j], graph)
-					j += 1
-
-				#Above loop only looks for links up to end of sequence, but excluding END. If we've reached end of sequence w/out finding
-				#an edge, it may be because this activity links directly to END. This if-stmt handles this case
-				if j == len(sequence) and edge == None and self._getEdge(sequence[i], "END") is not None:
+				#this activity's edge, given the partial ordering, goes to its first downstream successor
+				j = successorPosition[i]
+				if j is not None:
+					e = (sequence[i], sequence[j])
+				#The downstream successors only include links up to end of sequence, but excluding END. If there's no downstream successor,
+				#it may be because this activity links directly to END. This handles this case
+				elif "END" in self._successors[sequence[i]]:
 					#activity links to END node
-					edge = self._getEdge(sequence[i], "END")
+					e = (sequence[i], "END")
+				else:
+					e = None
 
-				if edge != None:
-					e = self._edgeToActivityTuple(edge)
+				if e != None:
 					edgeSequence.append(e)
 				else:
 					#this case occurs when, for instance, an activity in the activity-set is anomalously repeated in some out-of-order way, inconsistent with the mined-model
-					print("WARNING no outgoing edge found from activity: "+sequence[i]+" for sequence "+sequence)
 					activity = sequence[i]
 					if i < len(sequence) - 1:
 						nextActivity = sequence[i+1]
 					else:
 						nextActivity = "END"
-					print("Arbitrarily associating activity with next in partial ordering: "+activity+"->"+nextActivity)
+					events.append(("missingEdge", activity))
+					events.append(("arbitraryLink", activity))
+					if self._verbose:
+						print("WARNING no outgoing edge found from activity: "+activity+" for sequence "+sequence)
+						print("Arbitrarily associating activity with next in partial ordering: "+activity+"->"+nextActivity)
 					edgeSequence.append((activity, nextActivity))
 			i += 1
 
 		#add the last transition from last activity to the END node
 		finalEdge = self._getEdge(sequence[len(sequence)-1], "END")
 		if finalEdge == None:
-			print("WARNING no final edge found from activity "+sequence[len(sequence)-1]+"->END node for sequence >"+sequence+"<.")
-			print("Appending arbitrary link.")
+			lastActivity = sequence[len(sequence)-1]
+			if lastActivity in activitySet:
+				events.append(("missingEdge", lastActivity))
+			else:
+				events.append(("insertionAnomaly", lastActivity))
+			events.append(("arbitraryLink", lastActivity))
+			if self._verbose:
+				print("WARNING no final edge found from activity "+lastActivity+"->END node for sequence >"+sequence+"<.")
+				print("Appending arbitrary link.")
 			edgeSequence.append((sequence[len(sequence)-1],"END"))
 		else:
 			e = self._edgeToActivityTuple(finalEdge)
@@ -415,45 +833,57 @@ class Retracer(object):
 	
 	"""
 	Given an edge sequence, builds a single .g record in the form given in those files (vertex declaratons, edge list, etc).
-	The edges are unlabelled.
+	The edges are unlabelled. Replay renders whole chunks of records at once instead; see GbadWriter.py.
 
 	Returns: A formatted string representing the trace .g record (using directed edge syntax)
 
 	@gTrace: A list of directed edges, represent as tuples: [('A','B'),('C','B') ... ]
 	"""
 	def _buildGbadRecord(self, isAnomalous, traceNo, gTrace):
-		vertexCounter = 1
-		#XP is essentially a dont-care in gbad, but the docs say it is required formatting
-		record = "XP # "+str(traceNo)+"\n"
-		
-		#get the set of activities
-		activities = []
-		for e in gTrace:
-			activities += [e[0],e[1]]
-		uniqActivities = set(activities)
-		
-		#build the vertex map
-		vertices = {} #maps vertexName->vertexId, where vertexId is newly assigned by the vertexCounter to fit the gbad/subdue scheme
-		for activity in uniqActivities:
-			vertices[activity] = vertexCounter
-			vertexCounter += 1
+		return self._gbadRenderer.RenderBatch([(traceNo, self._gbadRenderer.Encode(gTrace))]).decode("utf-8")
 
-		#output the vertex declarations
-		vertexList = [(key,vertices[key]) for key in vertices]
-		vertexList.sort(key = lambda v : v[1]) #sort vertices by the new ids (gbad/subdue require id sequences sorted ascending, starting at 1)
-		#output the vertex declarations
-		for tup in vertexList:
-			record += ("v " + str(tup[1]) + " \"" + tup[0] + "\"\n")
+"""
+Streams the non-empty, stripped lines of @traceFile in lists of up to CHUNK_SIZE traces.
+"""
+def _readTraceChunks(traceFile):
+	chunk = []
+	for line in traceFile:
+		trace = line.strip()
+		if len(trace) > 0:
+			chunk.append(trace)
+			if len(chunk) == CHUNK_SIZE:
+				yield chunk
+				chunk = []
+	if len(chunk) > 0:
+		yield chunk
 
-		#build the edge declarations
-		for e in gTrace:
-			record += ("d " + str(vertices[e[0]]) + " " + str(vertices[e[1]]) + " \"e\"\n") #put a "e" label on every edge, just to satisfy gbad. This label could have leverage in the future
+"""
+The default progress callback of the Retracer, which overwrites a single console line.
+"""
+def _printProgress(numTraces, tracesPerSecond):
+	print("\rReplayed %d traces (%.0f traces/s)" % (numTraces, tracesPerSecond), end="")
 
-		return record
+"""
+Each replay worker process holds its own Retracer, with its own copy of the model and replay cache.
+"""
+_workerRetracer = None
+
+def _initReplayWorker(graphPath, verbose=False):
+	global _workerRetracer
+	_workerRetracer = Retracer(verbose)
+	_workerRetracer._readModel(graphPath)
 
+"""
+Replays a chunk of traces in a worker. The worker's markov model and replay statistics are reset per chunk, so the returned ones hold only this chunk's counts.
+"""
+def _replayTraceChunk(args):
+	traces, useSubdueFormat = args
+	_workerRetracer._initializeMarkovModel()
+	_workerRetracer._stats = ReplayStats()
+	return _workerRetracer._replayChunk(traces, useSubdueFormat)
 
 def usage():
-	print("Usage: python ./GenerateTraceSubgraphs.py --graphml=[path to graphml model file] --tracePath=[path to trace file] --outputPath=[output path for .g file] --traceGraphs=[path to which graph of each trace written] [--subdue/--gbad (target format)]")
+	print("Usage: python ./GenerateTraceSubgraphs.py --graphml=[path to graphml model file] --tracePath=[path to trace file] --outputPath=[output path for .g file] --traceGraphs=[path to which graph of each trace written, as a trace-graph store] [--gbad (target format; subdue is not supported)] [--workers=N (replay in N processes)] [--incremental (replay only the sequences affected by changes to the model since the last run on this log)] [--verbose (print a WARNING for each move the model cannot replay)]")
 
 def main():
 	if len(sys.argv) < 5:
@@ -465,6 +895,7 @@ def main():
 	tracePath = None
 	outputPath = None
 	traceGraphPath = None
+	numWorkers = 1
 
 	for arg in sys.argv:
 		if "--graphml=" in arg:
@@ -475,17 +906,26 @@ def main():
 			outputPath = arg.split("=")[1]
 		if "--traceGraphs=" in arg:
 			traceGraphPath = arg.split("=")[1]
+		if "--workers=" in arg:
+			numWorkers = int(arg.split("=")[1])
 			
 	if not modelGraphmlPath or not tracePath or not outputPath or not traceGraphPath:
 		print("\n\nERROR retracer missing arguments, in GenerateTraceSubgraphs.py.\n")
 		usage()
 		exit()
 
-	#use gbad by default; subdue likely not supported, as gbad has been used so much instead
+	#use gbad by default; subdue is not supported, as gbad has been used so much instead
 	useSubdueFormat = "--subdue" in sys.argv and not "--gbad" in sys.argv
+	if useSubdueFormat:
+		print("ERROR subdue output format (--subdue) is not supported by GenerateTraceSubgraphs.py; use --gbad")
+		usage()
+		exit()
+
+	incremental = "--incremental" in sys.argv
+	verbose = "--verbose" in sys.argv
 
-	retracer = Retracer()
-	retracer.GenerateTraces(modelGraphmlPath, tracePath, outputPath, useSubdueFormat, traceGraphPath)
+	retracer = Retracer(verbose)
+	retracer.GenerateTraces(modelGraphmlPath, tracePath, outputPath, useSubdueFormat, traceGraphPath, numWorkers, incremental=incremental)
 
 if __name__ == "__main__":
 	main()
@@ -10,7 +10,11 @@ Similarity metrics are just ad hoc, and will be added to as needed.
 """
 from __future__ import print_function
 import sys
+import os
 import igraph
+#the model compiler lives with the other conversion scripts; it reads either graphml or compiled (.pmc) models
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import ModelCompiler
 
 
 """
@@ -18,8 +22,8 @@ Just some straightforward graph comparion metrics: size, vertex, and edge overla
 Note most of these are not symmetric measures, measuring g1's similarity to g2, not vice versa.
 """
 def Compare(g1Path, g2Path):
-	g1 = igraph.Graph.Read(g1Path)
-	g2 = igraph.Graph.Read(g2Path)
+	g1 = ModelCompiler.ReadModel(g1Path)
+	g2 = ModelCompiler.ReadModel(g2Path)
 	
 	print("Graph comparison stats for "+g1Path+" and "+g2Path+". Cols represent g1, g2, respectively.")
 	#vertex name overlap
@@ -44,7 +48,7 @@ def Compare(g1Path, g2Path):
 	print("Edge set difference s1 - s2: "+str(esetDifference))
 	
 def Usage():
-	print("Usage: python ./GraphCompare.py [primary input graphml path] [second input graphml path]")
+	print("Usage: python ./GraphCompare.py [primary input graphml path] [second input graphml path] (either may instead be a compiled .pmc model)")
 
 if len(sys.argv) != 3:
 	print("ERROR incorrect number of arguments")
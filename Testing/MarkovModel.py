@@ -0,0 +1,133 @@
+"""
+The markov model artifact written by the Retracer (GenerateTraceSubgraphs.py) and read by the AnomalyReporter: the transition
+counts of every (activity, activity) edge of the mined model over the replayed log, and the number of traces replayed.
+
+The model was previously written as str(dict) to markovModel.py and read back with eval(), which is slow and unsafe on large models.
+The artifact instead stores the activities once, in a dictionary table, and each edge as a pair of ids into that table:
+
+File layout:
+	4 bytes		magic "PMM1"
+	uint32		length of the json header
+	json header	{"activities": [names], "numEdges": m, "traceCount": n}
+	int32[2m]	edge pairs (source activity id, target activity id), in the order of the markov model's edges
+	int64[m]	transition counts
+All arrays are little-endian.
+
+Load() is O(edges) and evaluates no python expressions. It also reads the legacy str(dict) files (via ast.literal_eval), for
+existing result folders.
+
+Usage:
+	model = MarkovModel.Load(path)
+	model.ToDict()		-> {('a','b'): count, ...}, the dict the Retracer built
+	model.ToArrays()	-> (sources, targets, counts) numpy arrays, with sources/targets indexing model.Activities
+"""
+
+from __future__ import print_function
+import os
+import sys
+import ast
+import json
+import struct
+import array
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import BinaryArtifact
+
+MAGIC = b"PMM1"
+
+class MarkovModel(object):
+	def __init__(self):
+		self.Activities = []	#activity id -> activity name
+		self.EdgePairs = array.array("i")	#flattened (source id, target id) pairs
+		self.Counts = array.array("q")
+		self.TraceCount = 0
+
+	"""
+	Builds the artifact from a markov model dict of (srcName, dstName) -> transition count, preserving the dict's edge order.
+
+	@markovModel: The dict, as built by the Retracer
+	@traceCount: The number of traces replayed to build the model
+	"""
+	def FromDict(self, markovModel, traceCount):
+		ids = {}
+		self.Activities = []
+		self.EdgePairs = array.array("i")
+		self.Counts = array.array("q")
+		for edge in markovModel:
+			for activity in edge:
+				if activity not in ids:
+					ids[activity] = len(self.Activities)
+					self.Activities.append(activity)
+			self.EdgePairs.append(ids[edge[0]])
+			self.EdgePairs.append(ids[edge[1]])
+			self.Counts.append(markovModel[edge])
+		self.TraceCount = traceCount
+		return self
+
+	def NumEdges(self):
+		return len(self.Counts)
+
+	"""
+	Returns the dict view of the model, (srcName, dstName) -> transition count, in the edge order of the artifact.
+	"""
+	def ToDict(self):
+		activities = self.Activities
+		pairs = self.EdgePairs
+		return dict([((activities[pairs[2*i]], activities[pairs[2*i+1]]), self.Counts[i]) for i in range(len(self.Counts))])
+
+	"""
+	Returns the model as numpy arrays: (sources, targets, counts), where sources and targets are activity ids into self.Activities.
+	"""
+	def ToArrays(self):
+		import numpy as np
+		pairs = np.frombuffer(self.EdgePairs, dtype=np.int32).reshape(-1, 2)
+		counts = np.frombuffer(self.Counts, dtype=np.int64)
+		return pairs[:,0], pairs[:,1], counts
+
+	def Save(self, path):
+		header = {"activities": self.Activities, "numEdges": len(self.Counts), "traceCount": self.TraceCount}
+		headerBytes = json.dumps(header, separators=(",",":")).encode("utf-8")
+
+		ofile = open(path, "wb")
+		ofile.write(MAGIC)
+		ofile.write(struct.pack("<I", len(headerBytes)))
+		ofile.write(headerBytes)
+		ofile.write(BinaryArtifact.ArrayBytes(self.EdgePairs))
+		ofile.write(BinaryArtifact.ArrayBytes(self.Counts))
+		ofile.close()
+
+	"""
+	Reads either the artifact or a legacy str(dict) markov model file. For the latter, the trace count is taken as the number of
+	transitions out of START, as the AnomalyReporter computes its trace count.
+	"""
+	def Load(self, path):
+		ifile = open(path, "rb")
+		data = ifile.read()
+		ifile.close()
+		if data[0:4] != MAGIC:
+			markovModel = ast.literal_eval(data.decode("utf-8").strip())
+			traceCount = sum([markovModel[edge] for edge in markovModel if edge[0].upper() == "START"])
+			return self.FromDict(markovModel, traceCount)
+
+		headerLen = struct.unpack("<I", data[4:8])[0]
+		header = json.loads(data[8:8+headerLen].decode("utf-8"))
+		self.Activities = [str(activity) for activity in header["activities"]]
+		self.TraceCount = header["traceCount"]
+		m = header["numEdges"]
+		offset = 8 + headerLen
+		self.EdgePairs = BinaryArtifact.ReadArray("i", data[offset:offset + 8*m])
+		offset += 8*m
+		self.Counts = BinaryArtifact.ReadArray("q", data[offset:offset + 8*m])
+
+		return self
+
+"""
+Returns the MarkovModel stored at @path, in either format.
+"""
+def Load(path):
+	return MarkovModel().Load(path)
+
+"""
+Saves the markov model dict @markovModel, of (srcName, dstName) -> transition count, to @path.
+"""
+def Save(markovModel, traceCount, path):
+	MarkovModel().FromDict(markovModel, traceCount).Save(path)
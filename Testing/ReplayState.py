@@ -0,0 +1,236 @@
+"""
+The replay state written by the Retracer (GenerateTraceSubgraphs.py) next to its .g output, from which a later run can replay the same log
+incrementally on a changed model (--incremental). It records the model the log was replayed on, as its activities and (activity, activity)
+edges, the sha1 of the log, and the replay of each distinct sequence (variant) of the log: the sequence and its replayed edge list,
+START and END included, as written to the .g file and counted in the markov model, and the conformance events of its replay (see
+ReplayStats in GenerateTraceSubgraphs.py). Each trace maps to its variant id, and variant ids
+are assigned in order of first appearance in the log.
+
+A replay of a sequence only depends on the model edges among the sequence's activities (plus START and END), so when the model changes,
+only the variants touching a changed edge or activity need to be replayed again; the replays of all other variants are read back from here.
+
+File layout:
+	4 bytes		magic "PRS2"
+	variant records, one per variant:
+		uint32			length of the utf-8 sequence
+		uint32			number of replayed edges
+		uint32			number of conformance events
+		bytes			the utf-8 sequence
+		int32[2*numEdges]	replayed edge pairs (source activity id, target activity id)
+		int32[2*numEvents]	conformance events (kind id, activity id), in replay order
+	int64[numVariants]	byte offset of each variant record
+	int64[numTraces]	trace ids, in log order
+	int32[numTraces]	the variant id of each trace
+	json footer		{"activities": [names], "kinds": [conformance event kinds], "modelActivities": [ids], "modelEdges": [flattened id pairs],
+			 "logHash": sha1, "numTraces": n, "numVariants": v}
+	uint32			length of the json footer
+	4 bytes			magic "PRS2"
+All arrays are little-endian. The conformance events, like the replays, are only decoded for the variants that are requested.
+Replay states of the first, "PRS1" version, which kept the conformance events in the footer, are not read; the Retracer replays the full log
+instead, and writes a new state.
+
+Usage:
+	writer = ReplayStateWriter(path, modelActivities, modelEdges, FileHash(logPath))
+	writer.Add(traceNo, "ABCD", [('START','A'), ...], [("missingEdge", "B"), ...])
+	writer.Close()
+
+	state = ReplayState().Open(path)
+	state.GetSequence(variantId), state.GetReplay(variantId), state.GetConformance(variantId), state.ModelEdges, state.VariantCounts()
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import mmap
+import struct
+import array
+import hashlib
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import BinaryArtifact
+
+MAGIC = b"PRS2"
+
+"""
+Streams the replay state to @path, writing the replay of each sequence only on its first appearance.
+
+@modelActivities: The names of the activities of the model the log is replayed on
+@modelEdges: The (srcName, dstName) edges of that model
+@logHash: The sha1 of the replayed log, as from FileHash()
+"""
+class ReplayStateWriter(object):
+	def __init__(self, path, modelActivities, modelEdges, logHash, bufferSize=1 << 20):
+		self._file = open(path, "wb", bufferSize)
+		self._file.write(MAGIC)
+		self._offset = len(MAGIC)
+		self._ids = {}
+		self._activities = []
+		self._modelActivities = [self._activityId(activity) for activity in modelActivities]
+		self._modelEdges = []
+		for edge in modelEdges:
+			self._modelEdges.append(self._activityId(edge[0]))
+			self._modelEdges.append(self._activityId(edge[1]))
+		self._logHash = logHash
+		#maps the sha1 digest of a sequence -> variant id
+		self._variants = {}
+		self._variantOffsets = array.array("q")
+		self._traceIds = array.array("q")
+		self._traceVariants = array.array("i")
+		self._kindIds = {}
+		self._kinds = []
+
+	def _activityId(self, activity):
+		if activity not in self._ids:
+			self._ids[activity] = len(self._activities)
+			self._activities.append(activity)
+		return self._ids[activity]
+
+	def _kindId(self, kind):
+		if kind not in self._kindIds:
+			self._kindIds[kind] = len(self._kinds)
+			self._kinds.append(kind)
+		return self._kindIds[kind]
+
+	"""
+	Appends trace @traceNo, with sequence @sequence; @gTrace, the sequence's replayed edge list, and @events, the (kind, activity) conformance
+	events of its replay, are only written on the sequence's first appearance.
+	"""
+	def Add(self, traceNo, sequence, gTrace, events=None):
+		events = events or []
+		sequenceBytes = sequence.encode("utf-8")
+		key = hashlib.sha1(sequenceBytes).digest()
+		if key not in self._variants:
+			self._variants[key] = len(self._variantOffsets)
+			pairs = array.array("i")
+			for edge in gTrace:
+				pairs.append(self._activityId(edge[0]))
+				pairs.append(self._activityId(edge[1]))
+			eventPairs = array.array("i")
+			for kind, activity in events:
+				eventPairs.append(self._kindId(kind))
+				eventPairs.append(self._activityId(activity))
+			record = struct.pack("<III", len(sequenceBytes), len(gTrace), len(events)) + sequenceBytes + BinaryArtifact.ArrayBytes(pairs) + BinaryArtifact.ArrayBytes(eventPairs)
+			self._variantOffsets.append(self._offset)
+			self._file.write(record)
+			self._offset += len(record)
+		self._traceIds.append(traceNo)
+		self._traceVariants.append(self._variants[key])
+
+	def Close(self):
+		self._file.write(BinaryArtifact.ArrayBytes(self._variantOffsets))
+		self._file.write(BinaryArtifact.ArrayBytes(self._traceIds))
+		self._file.write(BinaryArtifact.ArrayBytes(self._traceVariants))
+		footer = {"activities": self._activities, "kinds": self._kinds, "modelActivities": self._modelActivities, "modelEdges": self._modelEdges, "logHash": self._logHash, "numTraces": len(self._traceIds), "numVariants": len(self._variantOffsets)}
+		footerBytes = json.dumps(footer, separators=(",",":")).encode("utf-8")
+		self._file.write(footerBytes)
+		self._file.write(struct.pack("<I", len(footerBytes)))
+		self._file.write(MAGIC)
+		self._file.close()
+
+"""
+Random access to the variants of a replay state, memory-mapped.
+"""
+class ReplayState(object):
+	def __init__(self):
+		self.Activities = []
+		self.Kinds = []
+		self.ModelActivities = set()
+		self.ModelEdges = set()
+		self.LogHash = ""
+		self.VariantOffsets = array.array("q")
+		self.TraceIds = array.array("q")
+		self.TraceVariants = array.array("i")
+		self._file = None
+		self._map = None
+
+	def Open(self, path):
+		self._file = open(path, "rb")
+		self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		size = len(self._map)
+		if self._map[0:4] != MAGIC or self._map[size-4:size] != MAGIC:
+			raise ValueError("Not a replay state: "+path)
+		footerLen = struct.unpack("<I", self._map[size-8:size-4])[0]
+		footerStart = size - 8 - footerLen
+		footer = json.loads(self._map[footerStart:size-8].decode("utf-8"))
+		self.Activities = footer["activities"]
+		self.Kinds = footer["kinds"]
+		self.ModelActivities = set([self.Activities[i] for i in footer["modelActivities"]])
+		modelEdges = footer["modelEdges"]
+		self.ModelEdges = set([(self.Activities[modelEdges[i]], self.Activities[modelEdges[i+1]]) for i in range(0, len(modelEdges), 2)])
+		self.LogHash = footer["logHash"]
+		n = footer["numTraces"]
+		v = footer["numVariants"]
+
+		traceVariantStart = footerStart - 4*n
+		traceIdStart = traceVariantStart - 8*n
+		offsetStart = traceIdStart - 8*v
+		self.VariantOffsets = BinaryArtifact.ReadArray("q", self._map[offsetStart:traceIdStart])
+		self.TraceIds = BinaryArtifact.ReadArray("q", self._map[traceIdStart:traceVariantStart])
+		self.TraceVariants = BinaryArtifact.ReadArray("i", self._map[traceVariantStart:footerStart])
+		return self
+
+	def Close(self):
+		if self._map is not None:
+			self._map.close()
+			self._file.close()
+			self._map = None
+
+	def NumVariants(self):
+		return len(self.VariantOffsets)
+
+	def NumTraces(self):
+		return len(self.TraceIds)
+
+	"""
+	Returns the sequence of variant @variantId.
+	"""
+	def GetSequence(self, variantId):
+		offset = self.VariantOffsets[variantId]
+		sequenceLen = struct.unpack("<I", self._map[offset:offset+4])[0]
+		return self._map[offset+12:offset+12+sequenceLen].decode("utf-8")
+
+	"""
+	Returns the replayed edge list of variant @variantId, as (srcName, dstName) tuples.
+	"""
+	def GetReplay(self, variantId):
+		offset = self.VariantOffsets[variantId]
+		sequenceLen, numEdges = struct.unpack("<II", self._map[offset:offset+8])
+		start = offset + 12 + sequenceLen
+		pairs = BinaryArtifact.ReadArray("i", self._map[start:start + 8*numEdges])
+		activities = self.Activities
+		return [(activities[pairs[i]], activities[pairs[i+1]]) for i in range(0, len(pairs), 2)]
+
+	"""
+	Returns the (kind, activity) conformance events of the replay of variant @variantId.
+	"""
+	def GetConformance(self, variantId):
+		offset = self.VariantOffsets[variantId]
+		sequenceLen, numEdges, numEvents = struct.unpack("<III", self._map[offset:offset+12])
+		start = offset + 12 + sequenceLen + 8*numEdges
+		pairs = BinaryArtifact.ReadArray("i", self._map[start:start + 8*numEvents])
+		return [(self.Kinds[pairs[i]], self.Activities[pairs[i+1]]) for i in range(0, len(pairs), 2)]
+
+	"""
+	Returns the number of traces of each variant, indexed by variant id.
+	"""
+	def VariantCounts(self):
+		counts = [0] * self.NumVariants()
+		for variantId in self.TraceVariants:
+			counts[variantId] += 1
+		return counts
+
+"""
+Returns the sha1 hex digest of the file at @path, read in blocks.
+"""
+def FileHash(path):
+	h = hashlib.sha1()
+	with open(path, "rb") as ifile:
+		for block in iter(lambda: ifile.read(1 << 20), b""):
+			h.update(block)
+	return h.hexdigest()
+
+"""
+Returns true if the file at @path is a replay state, by its magic bytes.
+"""
+def IsReplayState(path):
+	return BinaryArtifact.HasMagic(path, MAGIC)
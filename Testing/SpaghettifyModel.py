@@ -21,6 +21,8 @@ from __future__ import print_function
 import sys
 import igraph
 import random
+import math
+import numpy as np
 
 """
 Returns average node degree of a graph g.
@@ -56,7 +58,6 @@ def Spaghettify(inputPath, outputPath, rho):
 
 	print("Executing spaghetti on graph "+inputPath+". Output will be written to "+outputPath+".")
 
-	i = 0
 	g = igraph.Graph.Read(inputPath)
 	density = _getAverageDegree(g)
 	print("Input graph density: "+str(density))
@@ -64,48 +65,79 @@ def Spaghettify(inputPath, outputPath, rho):
 	#show the input graph
 	igraph.plot(g)
 	
-	#if density < rho, then no changes will be made to the input graph
-	if density < rho:
+	#if density >= rho, then no changes will be made to the input graph
+	if density >= rho:
 		#this case is perfectly valid, but ought to print something to notify the tester anyway
-		print("WARN density < rho in Spaghettify. Input graph "+inputPath+" will not be modified.")
+		print("WARN density >= rho in Spaghettify. Input graph "+inputPath+" will not be modified.")
+	if rho > maxRho:
+		print("WARN rho > maxRho in Spaghettify. Graph will be densified as far as the START/END constraints allow.")
 	
-	#until density parameter is reached
-	while density < rho and density < maxRho:
-		#add a random edge
-		_addRandomEdge(g)
-		density = _getAverageDegree(g)
-		i+=1
-		if i > 1000:
-			print("WARNING i > 1000 in Spaghettify(), may be running forever...")
+	#add all the edges needed to reach the density parameter at once
+	_densify(g, rho)
+	density = _getAverageDegree(g)
 		
 	g.write_graphml(outputPath)
 	print("Output graph density: "+str(density))
 	igraph.plot(g)
 	
 """
-Adds an edge between two random nodes.
-There are no constraints on the structural characteristics of the edge, the selected nodes are purely random and non-equal.
+Adds uniformly random new edges to g until its average degree reaches rho, or until no more edges can be added.
+There are no constraints on the structural characteristics of the edges, other than that they are new, are not self-loops,
+and that no out-edges are added to END and no in-edges to START.
+
+Every ordered pair (n1,n2) is encoded as n1 * n + n2, and a boolean mask over these codes marks the complement of the graph
+(the pairs that may still be added). The needed number of edges is then sampled from the complement in bulk, and added
+with a single add_edges() call. When the needed edges are a large share of the complement (near-complete graphs), they
+are drawn directly from the enumerated complement; otherwise, batches of random codes are drawn and filtered by the mask,
+which avoids enumerating a mostly-unused complement for sparse targets.
+
+@g: The igraph graph to densify, in place
+@rho: The target average node degree
+Returns: The number of edges added.
 """
-def _addRandomEdge(g):
-	newEdge = False
-	i = 0
-	
-	while not newEdge:
-		#select two nodes uniformly at random
-		n1 = g.vs[random.randint(0, len(g.vs)-1)].index
-		n2 = g.vs[random.randint(0, len(g.vs)-1)].index
-		while n1 == n2:  #reselect if nodes are the same
-			n2 = g.vs[random.randint(0, len(g.vs)-1)].index
-		#make sure we're not adding out edges from END or in-edges to START
-		if g.vs[n1]["name"] != "END" and g.vs[n2]["name"] != "START":
-			#check if n1->n2 is a new edge
-			newEdge = (n1,n2) not in [(e.source, e.target) for e in g.es]
-			if newEdge: #edge is new, so just add it
-				g.add_edge(n1,n2)
-			print(str(i))
-		i += 1
-		if i > 1000:
-			print("WARNING i > 1000 in Spaghettify._addRandomEdge(), may be running forever...")
+def _densify(g, rho):
+	n = len(g.vs)
+	if n < 2:
+		return 0
+
+	#mask of the pairs that may be added
+	mask = np.ones(n * n, dtype=bool)
+	mask[np.arange(n) * (n + 1)] = False #self loops
+	names = g.vs["name"] if "name" in g.vs.attributes() else []
+	if "END" in names:
+		endId = names.index("END")
+		mask[endId * n : (endId + 1) * n] = False #out-edges from END
+	if "START" in names:
+		startId = names.index("START")
+		mask[startId::n] = False #in-edges to START
+	edges = np.array(g.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+	mask[edges[:,0] * n + edges[:,1]] = False
+
+	numCandidates = int(np.count_nonzero(mask))
+	numNeeded = min(int(math.ceil(rho * n)) - len(g.es), numCandidates)
+	if numNeeded <= 0:
+		return 0
+
+	#seed numpy from the random module, so random.seed() still makes runs reproducible
+	rng = np.random.RandomState(random.getrandbits(32))
+	if 2 * numNeeded >= numCandidates:
+		codes = rng.choice(np.flatnonzero(mask), numNeeded, replace=False)
+	else:
+		chosen = []
+		numChosen = 0
+		while numChosen < numNeeded:
+			batch = rng.randint(0, n * n, size=2 * (numNeeded - numChosen) + 16)
+			batch = batch[mask[batch]]
+			#drop repeats within the batch, keeping the random draw order
+			firstIndices = np.unique(batch, return_index=True)[1]
+			batch = batch[np.sort(firstIndices)][0 : numNeeded - numChosen]
+			mask[batch] = False
+			chosen.append(batch)
+			numChosen += len(batch)
+		codes = np.concatenate(chosen)
+
+	g.add_edges(list(zip((codes // n).tolist(), (codes % n).tolist())))
+	return numNeeded
 		
 def usage():
 	print("Usage: python ./SpaghettifyModel.py -input=[graphml path] -output=[output graphml path] -rho=[average node degree param]")
@@ -4,56 +4,273 @@ the subdue log wrt the provided substructure.  It can also delete the substructu
 all traces in which it occurs, deleting all vertices and in/out-edges to/from the substructure.
 
 This script is to be used for a single compression, but as it does so, it will APPEND to dendrogram.txt
-the compressed and non-compressed substructures in this format:
-	([1,2,3]4,5,6:SUB_NAME)7,8,9
-In reality, only two groups are important: those inside parans are all xp/trace ids that were compressed
-by the compressing substructure; the brackets are just sugar to denote also those which reached max compression 
-(they matched the substructure). The SUB_NAME is the ["name"] field given by the substructure. All ids outside the parens
-are those traces that did not contain the subtructure and could not be compressed. Thus on each iteration a new line
+a compression level describing the compressed and non-compressed substructures, as a line of json (see DendrogramStore.py).
+In reality, only two groups are important: the xp/trace ids that were compressed by the compressing substructure, among which
+also those which reached max compression (they matched the substructure), and those traces that did not contain the subtructure
+and could not be compressed. The level is named by the ["name"] field given by the substructure. Thus on each iteration a new line
 is added to dendrogram.txt, giving a paraseable description of the graph's compression.
 
 GBAD/SUBDUE output is all text-based, so this is annoying text-based for parsing the substructures
 and subgraph log.
+
+Recursive compression (--recurse=N) runs the whole loop of the recursive scripts in this process: gbad is called on the compressed
+log, the log is compressed wrt gbad's best substructure, and so on, for up to N iterations or until the log is empty. The trace graphs
+stay in memory across iterations, so the log is parsed only once; each iteration only serializes the traces that it changed, reusing
+the .g text of the others, and dendrogram.txt is held open for the whole run. Any executable taking gbad's arguments and printing
+its output format can stand in for gbad (--gbad=).
+
+Traces and substructures are held as TraceGraphs, the frozensets of their vertex names and (srcName, dstName) edges, since compression
+is only set arithmetic over these; igraph graphs are only built on demand, to plot or save the substructure. Only the traces sharing
+every edge of the substructure can contain it, so the compressor keeps a TraceEdgeIndex from each edge to the traces containing it,
+and only tests these candidates for containment; the index is kept up to date as traces are compressed or deleted, across iterations.
 """
 from __future__ import print_function
 import igraph
 import sys
 import re
 import os
+import subprocess
+import multiprocessing
+import gzip
+#the .g log reader is shared with the conversion scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import GLogReader
+import DendrogramStore
+
+#the size at which the buffer of rendered .g records is flushed to the compressed log
+WRITE_BUFFER_SIZE = 1 << 22
+#the gzip compression level of gzipped logs (--gzip); the default, 9, costs more time than it saves space on .g logs
+GZIP_LEVEL = 6
+
+"""
+A trace (or substructure) graph: its vertex names, and its directed edges as (srcName, dstName) pairs. The vertex and edge sets are
+frozensets, built once, on which the compressor does all of its containment and compression tests; the edge list is also kept in
+declaration order, the order in which the edges are written to the .g log. Vertex names are unique within a trace.
+
+@header: The trace's "XP # id" line; None for substructures
+@oldXpId: The trace's id in the log it was parsed from
+"""
+class TraceGraph(object):
+	#NewXpId is only assigned to the traces kept in the compressed log
+	__slots__ = ("Vertices", "Edges", "EdgeList", "Header", "OldXpId", "NewXpId", "Name", "Instances", "CompValue", "SubdueIds", "GBody")
+
+	def __init__(self, vertices, edgeList, header=None, oldXpId=None):
+		self.Vertices = frozenset(vertices)
+		self.EdgeList = tuple(edgeList)
+		self.Edges = frozenset(self.EdgeList)
+		self.Header = header
+		self.OldXpId = oldXpId
+		self.Name = None
+		self.Instances = None
+		self.CompValue = None
+		#the gbad vertex id of each vertex, name -> id string; only kept for substructures, for their graphml
+		self.SubdueIds = None
+		#the cached .g vertex and edge declarations, as bytes (see LogCompressor._sub2GBody())
+		self.GBody = None
+
+	"""
+	Builds the igraph.Graph of this graph, with vertex "name"/"label" (and "subdueId") attributes, for plotting and graphml output.
+	"""
+	def ToIgraph(self):
+		g = igraph.Graph(directed=True)
+		g.add_vertices(list(self.Vertices))
+		g.add_edges(list(self.EdgeList))
+		for v in g.vs:
+			v["label"] = v["name"]
+			if self.SubdueIds is not None and v["name"] in self.SubdueIds:
+				v["subdueId"] = self.SubdueIds[v["name"]]
+		if self.Name is not None:
+			g["name"] = self.Name
+		if self.Instances is not None:
+			g["instances"] = self.Instances
+			g["compValue"] = self.CompValue
+		return g
+
+	"""
+	Returns a copy of this graph with header @header, sharing its vertex and edge sets (which are never modified), name and .g body.
+	"""
+	def Copy(self, header=None):
+		copy = TraceGraph.__new__(TraceGraph)
+		copy.Vertices = self.Vertices
+		copy.EdgeList = self.EdgeList
+		copy.Edges = self.Edges
+		copy.Header = header
+		copy.OldXpId = None
+		copy.Name = self.Name
+		copy.Instances = None
+		copy.CompValue = None
+		copy.SubdueIds = None
+		copy.GBody = self.GBody
+		return copy
+
+"""
+An inverted index over the traces of a log, from each (srcName, dstName) edge to its posting list. Many traces share the same graph, so the
+postings are over the distinct edge sets of the traces (each counted by its number of traces), rather than over the traces themselves: the
+traces that may contain a substructure are those whose edge set is among the intersection of the posting lists of the substructure's
+edges, taken rarest first. The index is updated incrementally, as traces are replaced by their compressed graphs or deleted from the log.
+
+The index also counts the traces sharing each vertex, for the degenerate-set test (LogCompressor._isDegenerateSet()): the log is degenerate
+once no vertex occurs in two traces. As with the edges, the counts are kept over the distinct vertex sets of the traces: a vertex is shared
+if two distinct vertex sets contain it, or if a vertex set containing it is that of two traces. Only the first and last trace of a vertex
+set touch its vertices, so the counts are kept up to date at about the cost of the postings.
+"""
+class TraceEdgeIndex(object):
+	def __init__(self, traces):
+		self._postings = {}
+		#edge set -> the number of indexed traces having it
+		self._counts = {}
+		#vertex set -> the number of indexed traces having it
+		self._vertexSetCounts = {}
+		#vertex -> the number of distinct vertex sets containing it
+		self._vertexCounts = {}
+		#the number of vertices in two or more distinct vertex sets, and the number of (non-empty) vertex sets of two or more traces
+		self._numSharedVertices = 0
+		self._numSharedVertexSets = 0
+		for trace in traces:
+			self.Add(trace)
+
+	def Add(self, trace):
+		self._addVertices(trace.Vertices)
+		edges = trace.Edges
+		count = self._counts.get(edges, 0)
+		self._counts[edges] = count + 1
+		if count == 0:
+			for edge in edges:
+				if edge in self._postings:
+					self._postings[edge].add(edges)
+				else:
+					self._postings[edge] = set([edges])
 
+	def Remove(self, trace):
+		self._removeVertices(trace.Vertices)
+		edges = trace.Edges
+		count = self._counts.get(edges, 0)
+		if count > 1:
+			self._counts[edges] = count - 1
+		elif count == 1:
+			del self._counts[edges]
+			for edge in edges:
+				posting = self._postings[edge]
+				posting.discard(edges)
+				if len(posting) == 0:
+					del self._postings[edge]
+
+	def Replace(self, oldTrace, newTrace):
+		self.Remove(oldTrace)
+		self.Add(newTrace)
+
+	def _addVertices(self, vertices):
+		count = self._vertexSetCounts.get(vertices, 0)
+		self._vertexSetCounts[vertices] = count + 1
+		if count == 0:
+			for v in vertices:
+				vCount = self._vertexCounts.get(v, 0) + 1
+				self._vertexCounts[v] = vCount
+				if vCount == 2:
+					self._numSharedVertices += 1
+		elif count == 1 and len(vertices) > 0:
+			self._numSharedVertexSets += 1
+
+	def _removeVertices(self, vertices):
+		count = self._vertexSetCounts.get(vertices, 0)
+		if count > 1:
+			self._vertexSetCounts[vertices] = count - 1
+			if count == 2 and len(vertices) > 0:
+				self._numSharedVertexSets -= 1
+		elif count == 1:
+			del self._vertexSetCounts[vertices]
+			for v in vertices:
+				vCount = self._vertexCounts[v] - 1
+				if vCount == 0:
+					del self._vertexCounts[v]
+				else:
+					self._vertexCounts[v] = vCount
+					if vCount == 1:
+						self._numSharedVertices -= 1
+
+	"""
+	Returns true if no vertex occurs in two of the indexed traces.
+	"""
+	def IsDisjoint(self):
+		return self._numSharedVertices == 0 and self._numSharedVertexSets == 0
+
+	"""
+	Returns the set of edge sets containing all of @edges, or None if @edges is empty (every trace is then a candidate). A trace is a
+	candidate if its Edges are in the returned set.
+	"""
+	def Candidates(self, edges):
+		if len(edges) == 0:
+			return None
+		postings = sorted([self._postings.get(edge, ()) for edge in edges], key=len)
+		candidates = set(postings[0])
+		for posting in postings[1:]:
+			if len(candidates) == 0:
+				break
+			candidates.intersection_update(posting)
+		return candidates
+
+"""
+@numWorkers: The number of processes across which the traces are compressed; the output is identical for any number of workers.
+@gzipOutput: Whether to gzip the compressed log; the compressor (and the other GLogReader users) read gzipped logs transparently, but gbad
+does not, so a recursive compression always writes plain logs.
+"""
 class LogCompressor(object):
-	def __init__(self):
+	def __init__(self, numWorkers=1, gzipOutput=False):
+		self._numWorkers = numWorkers
+		self._gzipOutput = gzipOutput
+		self._compressedTraceIds = []
+		self._maxCompressedSubs = set()
+		self._compressedSubs = []
+		self._nonCompressedSubs = []
+		self._deletedSubs = []
+		self._newXpIdCtr = 1
+		#the open DendrogramWriter during a recursive compression; otherwise dendrogram.txt is opened per append
+		self._dendrogramWriter = None
+		#the TraceEdgeIndex of the traces being compressed, built by the first compression of a log
+		self._edgeIndex = None
+
+	"""
+	Resets the per-compression state, as between the iterations of a recursive compression (each of which was previously its own process).
+	"""
+	def _resetIteration(self):
 		self._compressedTraceIds = []
-		#self._dendrogramFile = open("dendrogram.txt","a+")
 		self._maxCompressedSubs = set()
 		self._compressedSubs = []
 		self._nonCompressedSubs = []
 		self._deletedSubs = []
 		self._newXpIdCtr = 1
+
+	"""
+	Appends @level, a level record per DendrogramStore.MakeLevel(), to dendrogram.txt.
+	"""
+	def _writeDendrogramLevel(self, level):
+		self._writeDendrogramLevels([level])
+
+	"""
+	Appends @levels to dendrogram.txt, in a single write.
+	"""
+	def _writeDendrogramLevels(self, levels):
+		if self._dendrogramWriter is not None:
+			self._dendrogramWriter.WriteLevels(levels)
+		else:
+			writer = DendrogramStore.DendrogramWriter("dendrogram.txt")
+			writer.WriteLevels(levels)
+			writer.Close()
 	
 	"""
 	A degenerate case (for both deleteSubs and non-deleteSubs paths) occurs when the remainder of the input log consists of
 	only unique graphs with no shared vertices (and hence no shared edges).
 	
-	@subgraphs: A list of igraph Graph objects describing components of the process
+	@subgraphs: A list of TraceGraphs describing components of the process
 	"""
 	def _isDegenerateSet(self, subgraphs):
-		isDegenerate = False
-		if len(subgraphs) <= 20: #dont worry about this being evaluated too often/inefficiently: either the condition is detected and terminated, or usually a compressing substructure will knock out the log faster, not one at a time
-			"""Lemma: A set of distinct graphs can be detected if they have no shared vertices, since we don't allow hanging edges, for instance.
-				Hence, a linear test (not quadratic comparison) works: loop over the graphs, add their vertices v' to set V''; if at any time any of v' are in V'' before adding, the graphs are not distinct
-			"""
-			uniqVertices = set()
-			isDegenerate = True #set to true, then the loop below attempts to find/disprove uniqueness of the graph set
-			for g in subgraphs:
-				vNames = [v["name"] for v in g.vs]
-				for v in vNames:
-					if v in uniqVertices:
-						isDegenerate = False
-						break
-					uniqVertices.add(v)
-
-		return isDegenerate
+		"""Lemma: A set of distinct graphs can be detected if they have no shared vertices, since we don't allow hanging edges, for instance.
+			Hence, a linear test (not quadratic comparison) works: count the traces containing each vertex; the graphs are distinct iff no count exceeds one.
+			The TraceEdgeIndex keeps these counts up to date as the log is compressed, so the test is evaluated on every iteration, at any log size.
+		"""
+		if self._edgeIndex is None:
+			self._edgeIndex = TraceEdgeIndex(subgraphs)
+		return self._edgeIndex.IsDisjoint()
 
 	"""
 	A degenerate case occurs when the log contains only unique, non-compressible graphs.
@@ -67,47 +284,33 @@ class LogCompressor(object):
 	"""
 	def _degenerateCase(self, subgraphs):
 	
-		f = open("dendrogram.txt","a+")
 		#store the oldXpIds, which are modified below; there's probably no use restoring them, but might as well preserve things
-		oldXpIds = [g["oldXpId"] for g in subgraphs]
+		oldXpIds = [g.OldXpId for g in subgraphs]
 
+		#all of the levels are written at once, finishing the dendrogram
+		levels = []
 		for i in range(len(subgraphs)):
 			g = subgraphs[i]
-			curId = g["oldXpId"]
-			
-			s = "(["+str(curId)+"]"+str(curId)+":"+"SUB_Degen_"+str(i)+":1:1.0)"
+			curId = g.OldXpId
 			
 			#get the list of subs remaining to be compressed (may be empty)
-			remaining = [str(rem["oldXpId"]) for rem in subgraphs[i+1:]]
-			s += ",".join(remaining)
+			remaining = [rem.OldXpId for rem in subgraphs[i+1:]]
 			
-			idDict = dict()
-			idDict[curId] = "-1"
+			idMap = [(curId, -1)]
 			j = 1
 			for rem in subgraphs[i+1:]:
-				idDict[rem["oldXpId"]] = j
-				rem["oldXpId"] = j #update the id's of the remaining substructures
+				idMap.append((rem.OldXpId, j))
+				rem.OldXpId = j #update the id's of the remaining substructures
 				j += 1
 				
-			s += "{"
-			for pair in idDict.items():
-				s += str(pair[0])+":"+str(pair[1])+","
-			s = s[0:-1] #chop trailing comma
-			s += "}"
-			
-			#output the graph description of this subgraph
-			s += "#"
-			s += str(list(self._getEdgeSet(g)))
-			#add empty edge distribution; empty since this case is degenerate and all subgraphs are assumed disconnected
-			s += "#{}"
+			#the level describes this subgraph; its edge distribution is empty, since this case is degenerate and all subgraphs are assumed disconnected
+			levels.append(DendrogramStore.MakeLevel("SUB_Degen_"+str(i), 1, 1.0, [curId], [curId], remaining, idMap, list(self._getEdgeSet(g)), {}))
 
-			f.write(s+"\n")
+		self._writeDendrogramLevels(levels)
 			
 		for i in range(len(subgraphs)):
 			subgraphs[i] = oldXpIds[i]
 
-		f.close()
-
 		
 	"""
 	Note this currently only takes the top substructure listed in the .g file.
@@ -121,102 +324,192 @@ class LogCompressor(object):
 		print("Running SubdueLogCompressor on "+logPath+" using substructures from "+subsPath)
 		print("Outputting compressed log to "+outPath+" with new compressed substructure named: "+compSubName)
 		print("NOTE: once reduced to a single vertex (most compressed) substructure, the substructure will be looped to itself.")
+		self._edgeIndex = None
 		bestSub = self._parseBestSubstructure(subsPath)
 		if bestSub != None:
 			if showSub:
-				layout = bestSub.layout("sugiyama")
-				igraph.plot(bestSub, layout = layout, bbox = (1000,1000), vertex_size=35, vertex_label_size=15)
+				subGraph = bestSub.ToIgraph()
+				layout = subGraph.layout("sugiyama")
+				igraph.plot(subGraph, layout = layout, bbox = (1000,1000), vertex_size=35, vertex_label_size=15)
 			
-			outDir = os.path.dirname(outPath)
-			bestSub["name"] = compSubName
-			#save the substructure
-			bestSub.write_graphml(outDir+os.sep+bestSub["name"]+".graphml")
-			#print(str(bestSub))
-			subgraphs = self._buildAllTraces(logPath)
-			#detects degenerate case when no further compression can occur: log consists of only a set of graphs sharing no vertices or edges
-			if self._isDegenerateSet(subgraphs):
-				#degenerate case detected: write out all subgraphs to dendrogram as unique graphs
-				self._degenerateCase(subgraphs)
-				#all subgraphs effectively compressed, so clear the log to signal completion
-				ofile = open(outPath,"w+")
-				ofile.close()
-			else:
-				if len(subgraphs) == 1: #exception case: sometimes subdue likes to loop over a single graph input, causing infinite recursion on the last graph in some log
-					compressedSubs = subgraphs
-					self._compressedSubs.append(subgraphs[0])
-					deletedSubs = subgraphs
-					self._maxCompressedSubs.add(subgraphs[0]["oldXpId"])
-				else:
-					#print("subgraphs:\n"+str(subgraphs)+"\nend subgraphs")
-					compressedSubs, deletedSubs, edgeFreqs = self._compressAllTraces(subgraphs, bestSub, deleteSubs)
-				#append to the dendrogram file
-				self._appendToDendrogram(bestSub, compSubName, compressedSubs, deletedSubs, edgeFreqs)
-				#print("compressed: "+str(compressedSubs)+"\nend compress subgraphs")
-				self._writeSubs(compressedSubs, outPath)
+			self._compressLog(self._buildAllTraces(logPath), bestSub, outPath, compSubName, deleteSubs)
 		else:
 			print("Compressor exiting with no compression")
 			#output empty log to outPath
 			ofile = open(outPath,"w+")
 			ofile.close()
+
+	"""
+	Runs the recursive compression loop of the recursive scripts in this process: the log at @logPath is compressed wrt the best substructure
+	in @subsPath (as SUB_init), then for each iteration i, @discoveryCommand (gbad) is run on the compressed log at @outPath, and the log is
+	compressed wrt its best substructure (as SUBi). Stops after @numIterations iterations, or once the compressed log is empty.
+
+	The traces are parsed from @logPath once, and then carried across iterations in memory, as they would be re-parsed from the compressed log.
+
+	@discoveryCommand: The substructure discovery command, as a list of arguments, to which the path of the compressed log is appended; for
+	instance [gbadMdlPath, "-mdl", "0.1"]. Any executable printing gbad's output format can stand in for gbad.
+	@numIterations: The maximum number of discovery/compression iterations after the initial compression
+	@resultsPath: If passed, the output of each discovery run is appended to this file, as the scripts did with mdlResult.txt
+	"""
+	def CompressRecursively(self, logPath, subsPath, outPath, discoveryCommand, numIterations, deleteSubs=False, resultsPath=None):
+		print("Running recursive SubdueLogCompressor on "+logPath+" for up to "+str(numIterations)+" iterations, discovering substructures with: "+" ".join(discoveryCommand))
+		if self._gzipOutput:
+			print("WARNING gbad cannot read gzipped logs; the recursive compression will write plain .g logs")
+			self._gzipOutput = False
+		self._dendrogramWriter = DendrogramStore.DendrogramWriter("dendrogram.txt")
+		self._edgeIndex = None
+		subsFile = open(subsPath,"r")
+		subsText = subsFile.read()
+		subsFile.close()
+		subgraphs = self._buildAllTraces(logPath)
+		subgraphs = self._compressIteration(subgraphs, subsText, outPath, "SUB_init", deleteSubs)
+		for i in range(numIterations):
+			#the log is empty once every trace has been compressed away
+			if len(subgraphs) == 0:
+				break
+			print("Compression iteration "+str(i))
+			subsText = self._discoverSubstructures(discoveryCommand, outPath, resultsPath)
+			subgraphs = self._compressIteration(subgraphs, subsText, outPath, "SUB"+str(i), deleteSubs)
+		self._dendrogramWriter.Close()
+		self._dendrogramWriter = None
+
+	"""
+	Runs @discoveryCommand on the .g log at @gPath, returning its output (and appending it to @resultsPath, if passed).
+	"""
+	def _discoverSubstructures(self, discoveryCommand, gPath, resultsPath=None):
+		result = subprocess.run(discoveryCommand + [gPath], stdout=subprocess.PIPE)
+		output = result.stdout.decode("utf-8", "replace")
+		if resultsPath is not None:
+			rfile = open(resultsPath,"a+")
+			rfile.write(output)
+			rfile.close()
+		return output
+
+	"""
+	One iteration of a recursive compression: compresses the in-memory @subgraphs wrt the best substructure in the gbad output @subsText.
+
+	Returns: The traces of the compressed log, as they would be parsed from it by the next iteration; empty if the log was fully compressed
+	"""
+	def _compressIteration(self, subgraphs, subsText, outPath, compSubName, deleteSubs):
+		print("Compressing with new compressed substructure named: "+compSubName)
+		self._resetIteration()
+		bestSub = self._parseBestSubstructureText(subsText)
+		if bestSub == None:
+			print("Compressor exiting with no compression")
+			ofile = open(outPath,"w+")
+			ofile.close()
+			return []
+		return self._compressLog(subgraphs, bestSub, outPath, compSubName, deleteSubs)
+
+	"""
+	Compresses the traces @subgraphs wrt @bestSub, appending the result to the dendrogram and writing the compressed log to @outPath.
+
+	Returns: The traces written to the compressed log, with their ids renumbered as in the log; empty for the degenerate case
+	"""
+	def _compressLog(self, subgraphs, bestSub, outPath, compSubName, deleteSubs):
+		outDir = os.path.dirname(outPath)
+		bestSub.Name = compSubName
+		#save the substructure
+		bestSub.ToIgraph().write_graphml(outDir+os.sep+bestSub.Name+".graphml")
+		#print(str(bestSub))
+		#detects degenerate case when no further compression can occur: log consists of only a set of graphs sharing no vertices or edges
+		if self._isDegenerateSet(subgraphs):
+			#degenerate case detected: write out all subgraphs to dendrogram as unique graphs
+			self._degenerateCase(subgraphs)
+			#all subgraphs effectively compressed, so clear the log to signal completion
+			ofile = open(outPath,"w+")
+			ofile.close()
+			return []
+
+		if len(subgraphs) == 1: #exception case: sometimes subdue likes to loop over a single graph input, causing infinite recursion on the last graph in some log
+			compressedSubs = subgraphs
+			self._compressedSubs.append(subgraphs[0])
+			deletedSubs = subgraphs
+			self._maxCompressedSubs.add(subgraphs[0].OldXpId)
+		else:
+			#print("subgraphs:\n"+str(subgraphs)+"\nend subgraphs")
+			compressedSubs, deletedSubs, edgeFreqs = self._compressAllTraces(subgraphs, bestSub, deleteSubs)
+		#append to the dendrogram file
+		self._appendToDendrogram(bestSub, compSubName, compressedSubs, deletedSubs, edgeFreqs)
+		#print("compressed: "+str(compressedSubs)+"\nend compress subgraphs")
+		writtenSubs = self._writeSubs(compressedSubs, outPath)
+		#invalid subs are dropped from the log, so also from the index
+		if self._edgeIndex is not None and len(writtenSubs) < len(compressedSubs):
+			written = set(writtenSubs)
+			for sub in compressedSubs:
+				if sub not in written:
+					self._edgeIndex.Remove(sub)
+		#the next iteration sees each trace under its id in the compressed log
+		for sub in writtenSubs:
+			sub.OldXpId = str(sub.NewXpId)
+		return writtenSubs
 			
 	"""
-	Given a list of sub-graphs stored in igraph.Graph structures, write each one
+	Given a list of sub-graphs stored as TraceGraphs, write each one
 	to a new output file, suitable as input to subdue/gbad. The graphs are newly labelled
 	with incrementing id's, as required by gbad. Hence the id-mappings must preserved in other ways.
 
-	@subs: A list of igraph structures representing .g traces
+	The records are assembled from the subs' rendered bodies into a single buffer, which is written out in blocks of WRITE_BUFFER_SIZE.
+
+	@subs: A list of TraceGraphs representing .g traces
 	@outPath: The path to which the new .g trace file will be written
+	Returns: The subs written to the file (the valid ones)
 	"""
 	def _writeSubs(self,subs, outPath):
-		ofile = open(outPath, "wb+") #the b and encode() notation below are just to force linux line endings
+		#binary output, to force linux line endings
+		if self._gzipOutput:
+			ofile = gzip.open(outPath, "wb", GZIP_LEVEL)
+		else:
+			ofile = open(outPath, "wb+")
+		writtenSubs = []
+		buf = bytearray()
 
 		for sub in subs:
 			isValidSub = True #This check reflects a critical failure; if the messages below are detected, results are invalid, and fixes are needed upstream
-			if len(sub.vs) == 0:
-				print("ERROR empty sub detected  Edges: "+str(len(sub.es)))
+			if len(sub.Vertices) == 0:
+				print("ERROR empty sub detected  Edges: "+str(len(sub.EdgeList)))
 				isValidSub = False
-			if len(sub.vs) == 1:
-				print("WARNING single-vertex sub detected.  Edges: "+str(len(sub.es)))
-			if len(sub.es) == 0:
-				print("ERROR zero edge substructure detected: "+sub["header"])
+			if len(sub.Vertices) == 1:
+				print("WARNING single-vertex sub detected.  Edges: "+str(len(sub.EdgeList)))
+			if len(sub.EdgeList) == 0:
+				print("ERROR zero edge substructure detected: "+sub.Header)
 				isValidSub = False
 
 			if isValidSub:
-				xpNo = sub["header"][sub["header"].rfind(" ")+1:]
+				xpNo = sub.Header[sub.Header.rfind(" ")+1:]
 				#print("MAPPING "+xpNo+" -> "+str(i))
 				#a hack required by gbad: "xp" declarations must be sequential
-				sub["header"] = sub["header"][0:sub["header"].rfind(" ")]+" "+str(sub["newXpId"])
-				ofile.write((self._sub2GFormatString(sub)+"\n").encode())
+				sub.Header = sub.Header[0:sub.Header.rfind(" ")]+" "+str(sub.NewXpId)
+				if sub.GBody is None:
+					sub.GBody = self._sub2GBody(sub)
+				buf += sub.Header.encode()
+				buf += b"\n"
+				buf += sub.GBody
+				if len(buf) >= WRITE_BUFFER_SIZE:
+					ofile.write(buf)
+					del buf[:]
+				writtenSubs.append(sub)
 			else:
 				print("See previous error line. Error occurred in SubdueLogCompressor._writeSubs")
 
+		ofile.write(buf)
 		ofile.close()
+		return writtenSubs
 
 	"""
-	Given a sub-graph .g trace in igraph form, converts the structure into a string formatted
-	in .g format used by subdue/gbad.
+	Returns the vertex and edge declarations of @sub in .g format used by subdue/gbad, as utf-8 bytes with linux line endings.
 
-	NOTE: This outputs using linux line endings
-
-	returns: string representing this subgraph/trace in .g format
+	The declarations are cached in the sub's GBody, so a trace left unchanged by a compression
+	is not serialized again by the next iteration of a recursive compression.
 	"""
-	def _sub2GFormatString(self,sub):
-		vertexDict = {}
-		s = sub["header"]+"\n"
+	def _sub2GBody(self,sub):
+		#number the vertices from 1, in the order of the vertex set
+		vertexDict = dict(zip(sub.Vertices, map(str, range(1, len(sub.Vertices)+1))))
 		#build the vertex declarations
-		i = 1
-		for v in sub.vs:
-			s += ("v "+str(i)+" \""+v["name"]+"\"\n")
-			vertexDict[v["name"]] = i
-			i += 1
-			
+		parts = ["v %s \"%s\"\n" % (vertexDict[v], v) for v in sub.Vertices]
 		#build the edge declarations
-		for e in sub.es:
-			src = vertexDict[sub.vs[e.source]["name"]]
-			dst = vertexDict[sub.vs[e.target]["name"]]
-			s+= ("d "+str(src)+" "+str(dst)+" \"e\"\n")
-			
-		return s.rstrip()
+		parts += ["d %s %s \"e\"\n" % (vertexDict[src], vertexDict[dst]) for src, dst in sub.EdgeList]
+		return "".join(parts).encode()
 
 	"""
 	Checks if a sub-graph/trace is equal to some compressing substructure.
@@ -230,6 +523,80 @@ class LogCompressor(object):
 		#return len(compNodeSet.difference(subNodeSet)) == 0 and len(compEdgeSet.difference(subEdgeSet)) == 0
 		
 
+	"""
+	Returns the result of @compressFunc(traceSub, compSub, mayContain) for the graph of @traceSub. Compression only depends on the graph, so if
+	@variants, a dict of (vertex set, edge set) -> result, is passed, the result is computed once per variant (distinct graph), by its first trace,
+	and shared by all of the variant's traces. (mayContain is the same for all of them, since it is given by the graph's edges.)
+	"""
+	def _variantResult(self, compressFunc, traceSub, compSub, mayContain, variants):
+		if variants is None:
+			return self._variantFromRaw(compressFunc(traceSub, compSub, mayContain))
+		key = (traceSub.Vertices, traceSub.Edges)
+		result = variants.get(key)
+		if result is None:
+			result = self._variantFromRaw(compressFunc(traceSub, compSub, mayContain))
+			variants[key] = result
+		return result
+
+	"""
+	The variant functions (_deleteVariantSub, _compressVariantSub) return their graph as plain vertex and edge lists, which are the same
+	whether computed here or in a worker (see _compressVariantsInPool), and so is the TraceGraph built from them here.
+
+	@raw: A tuple of (contains, flag, (vertex list, edge list, name) or None, delEdges)
+	Returns: The tuple, with its graph as a TraceGraph
+	"""
+	def _variantFromRaw(self, raw):
+		contains, flag, graphLists, delEdges = raw
+		graph = None
+		if graphLists is not None:
+			graph = TraceGraph(graphLists[0], graphLists[1])
+			graph.Name = graphLists[2]
+		return contains, flag, graph, delEdges
+
+	"""
+	Computes the results of the variants (distinct graphs) of @traceSubs which may contain @bestSub (those whose edges are in @candidates) across a
+	pool of self._numWorkers processes, storing them in @variants as _variantResult() does. Only the results cross process boundaries: the workers
+	are forked after the variants are stored in this module, so they read the very same graphs as a serial run, and their vertex and edge lists come out
+	in the same order. The per-trace id bookkeeping is then done serially, in log order.
+
+	The output only matches a serial run because the workers are forked: a TraceGraph's vertices and edges are frozensets, whose iteration order,
+	and so the vertex numbering of the compressed graphs, depends on the process's string hash seed, which forked workers inherit from the parent.
+	Under the spawn start method, each worker would draw a new hash seed, and its vertex numbering could differ from a serial run's. So the pool is
+	always created with the fork context, and without fork the variants are compressed serially.
+	"""
+	def _compressVariantsInPool(self, traceSubs, bestSub, deleteSub, candidates, variants):
+		global _workerVariants, _workerBestSub, _workerDeleteSub
+		if "fork" not in multiprocessing.get_all_start_methods():
+			print("WARNING fork start method unavailable; compressing serially in SubdueLogCompressor")
+			return
+		keys = []
+		pending = set()
+		for trace in traceSubs:
+			key = (trace.Vertices, trace.Edges)
+			if key not in pending and (candidates is None or trace.Edges in candidates):
+				pending.add(key)
+				keys.append((key, trace))
+		if len(keys) < 2 * self._numWorkers:
+			return
+
+		_workerVariants = [trace for key, trace in keys]
+		_workerBestSub = bestSub
+		_workerDeleteSub = deleteSub
+		numShards = min(len(keys), 4 * self._numWorkers)
+		shards = [(len(keys) * i // numShards, len(keys) * (i+1) // numShards) for i in range(numShards)]
+		pool = multiprocessing.get_context("fork").Pool(self._numWorkers)
+		shardResults = pool.map(_compressVariantShard, shards, 1)
+		pool.close()
+		pool.join()
+		_workerVariants = _workerBestSub = None
+
+		#reduce: in shard order, which is the variants' order of first appearance
+		i = 0
+		for results in shardResults:
+			for raw in results:
+				variants[keys[i][0]] = self._variantFromRaw(raw)
+				i += 1
+
 	"""
 	Deletes a substructure from a trace. This is nuanced, since clients (eg gbad) may handle
 	the results (potentially disconnected graphs) poorly, since potentially-disconnected graphs
@@ -237,6 +604,8 @@ class LogCompressor(object):
 
 	@traceSub: a trace/subgraph
 	@compSub: a prototype substructure by which to attempt to compress traceSub
+	@mayContain: False if traceSub is already known not to contain compSub (it is not a candidate of the edge index)
+	@variants: If passed, the dict in which the deletion of each variant (distinct graph) is computed once, see _variantResult()
 
 	Return Cases:
 	
@@ -249,33 +618,70 @@ class LogCompressor(object):
 		This is just so clients can handle disconnected vertices, since its foreseeable their code was not written to handle edgeless nodes.
 		3) trace EQUALS substructure: the trace is discarded and None is returned
 	"""
-	def _deleteTraceSub(self, traceSub, compSub):
-		#delEdges is a list of named tuples reflecting directed edges: [('a','b'), ('c','b') ... ]
-		delEdges = [] #delEdges only takes a non-empty value if the trace is compressed wrt compSub, but not maximally compressed (one or more edges connect them)
+	def _deleteTraceSub(self, traceSub, compSub, mayContain=True, variants=None):
 		delSub = traceSub
+		contains, equals, delGraph, delEdges = self._variantResult(self._deleteVariantSub, traceSub, compSub, mayContain, variants)
 
 		#trace contains subgraph, so delete it as described above
-		if self._traceContainsSubgraph(traceSub, compSub):
-			self._compressedSubs.append(traceSub["oldXpId"])
+		if contains:
+			self._compressedSubs.append(traceSub.OldXpId)
 			#trace equals subgraph, so entire trace should be deleted: set result to None and return
-			if self._traceEqualsSubgraph(traceSub,compSub):
-				self._maxCompressedSubs.add(traceSub["oldXpId"])
+			if equals:
+				self._maxCompressedSubs.add(traceSub.OldXpId)
 				#print("EQUALITY")
 				delSub = None
 			else:
-				#print("CONTAINMENT: g1"+str([v["name"] for v in traceSub.vs]))
-				#print("g2: "+str([v["name"] for v in compSub.vs]))
-				#get the vertex and edge sets for each subgraph
-				vsTrace = set([v["name"] for v in traceSub.vs])
-				vsComp = set([v["name"] for v in compSub.vs])
-				esTrace = set([(traceSub.vs[e.source]["name"], traceSub.vs[e.target]["name"]) for e in traceSub.es])
-				esComp = set([(compSub.vs[e.source]["name"], compSub.vs[e.target]["name"]) for e in compSub.es])
+				#the variant's .g body is rendered once, and shared by its traces
+				if delGraph.GBody is None:
+					delGraph.GBody = self._sub2GBody(delGraph)
+				delSub = delGraph.Copy(traceSub.Header)
+		else:
+			#append to non-compressed traces
+			self._nonCompressedSubs.append(traceSub.OldXpId)
+
+		return delSub, delEdges
+
+	"""
+	The set arithmetic of _deleteTraceSub(), which only depends on the graph of @traceSub, not on the trace.
+
+	Returns: contains, equals, the vertex and edge lists (and name) of the trace's graph with compSub deleted (None unless the trace properly
+	contains compSub), and delEdges; see _variantFromRaw()
+	"""
+	def _deleteVariantSub(self, traceSub, compSub, mayContain):
+		#delEdges is a list of named tuples reflecting directed edges: [('a','b'), ('c','b') ... ]
+		delEdges = [] #delEdges only takes a non-empty value if the trace is compressed wrt compSub, but not maximally compressed (one or more edges connect them)
+		delGraph = None
+		contains = mayContain and self._traceContainsSubgraph(traceSub, compSub)
+		equals = False
+
+		if contains:
+			#trace equals subgraph, so entire trace should be deleted
+			if self._traceEqualsSubgraph(traceSub,compSub):
+				equals = True
+			else:
+				#print("CONTAINMENT: g1"+str(traceSub.Vertices))
+				#print("g2: "+str(compSub.Vertices))
+				#get the vertex and edge sets for each subgraph (built once, by the TraceGraphs)
+				vsTrace = traceSub.Vertices
+				vsComp = compSub.Vertices
+				esTrace = traceSub.Edges
+				esComp = compSub.Edges
 				#subtract the compressing substructure vertices, edges, from the trace
 				vsDel = vsTrace - vsComp
-				#delete the edges within or incident to/from the compressing substructure
-				esDel = set([e for e in esTrace if e[0] not in vsComp and e[1] not in vsComp])
-				#build delEdges from the set of edges connecting traceSub and compSub
-				delEdges = [e for e in esTrace if (e[0] not in vsComp and e[1] in vsComp) or (e[1] not in vsComp and e[0] in vsComp)]
+				#in one pass over the trace's edges: delete the edges within or incident to/from the compressing substructure, and
+				#build delEdges from the set of edges connecting traceSub and compSub. The endpoints of the remaining edges are the
+				#remaining vertices with a non-zero degree.
+				esDel = set()
+				connected = set()
+				for e in esTrace:
+					srcInComp = e[0] in vsComp
+					dstInComp = e[1] in vsComp
+					if not srcInComp and not dstInComp:
+						esDel.add(e)
+						connected.add(e[0])
+						connected.add(e[1])
+					elif srcInComp != dstInComp:
+						delEdges.append(e)
 				#print("\n\nDEL EDGES: "+str(delEdges))
 				#print("vsDel: "+str(vsDel))
 				#print("esDel: "+str(esDel))
@@ -285,29 +691,18 @@ class LogCompressor(object):
 				#print("comp es: "+str(esComp))
 				#check for vertices associated with no edges, and add reflexive edges to them
 				for v in vsDel:
-					hasEdge = False
-					for e in esDel:
-						hasEdge |= (e[0] == v or e[1] == v)
 					#vertex has no associated edge so add a reflexive edge to it
-					if not hasEdge:
+					if v not in connected:
 						esDel.add((v,v))
 
 				#print("vsDel: "+str(vsDel))
 				#print("esDel: "+str(esDel))
 
-				#create the new sub
-				delSub = igraph.Graph(directed=True)
-				#preserve the trace header
-				delSub["header"] = traceSub["header"]
-				delSub["name"] = compSub["name"]
-				#add the vertices and edges as created above
-				delSub.add_vertices(list(vsDel))
-				delSub.add_edges(list(esDel))
-		else:
-			#append to non-compressed traces
-			self._nonCompressedSubs.append(traceSub["oldXpId"])
+				#create the new sub, with the vertices and edges as created above
+				#the new sub, with the vertices and edges as created above
+				delGraph = (list(vsDel), list(esDel), compSub.Name)
 
-		return delSub, delEdges
+		return contains, equals, delGraph, delEdges
 
 	"""
 	Given a trace subgraph from the log and a compressing substructure, 
@@ -326,42 +721,60 @@ class LogCompressor(object):
 
 	@traceSub: a trace/subgraph
 	@compSub: a prototype substructure by which to attempt to compress traceSub
+	@mayContain: False if traceSub is already known not to contain compSub (it is not a candidate of the edge index)
+	@variants: If passed, the dict in which the compression of each variant (distinct graph) is computed once, see _variantResult()
 	"""
-	def _compressTraceSub(self,traceSub, compSub):
+	def _compressTraceSub(self,traceSub, compSub, mayContain=True, variants=None):
 		compressed = traceSub
-		if self._traceContainsSubgraph(traceSub, compSub):
-			self._compressedSubs.append(traceSub["oldXpId"])
-			#see header: return the compressing substructure with one reflexive loop
-			if self._traceEqualsSubgraph(traceSub, compSub) and len(compSub.vs) == 1:
-				self._maxCompressedSubs.add(traceSub["oldXpId"])
+		contains, isMaxCompressed, compressedGraph, _ = self._variantResult(self._compressVariantSub, traceSub, compSub, mayContain, variants)
+		if contains:
+			self._compressedSubs.append(traceSub.OldXpId)
+			if isMaxCompressed:
+				self._maxCompressedSubs.add(traceSub.OldXpId)
 				print("MAX COMPRESSION")
-				#just copy the sub and add a reflexive loop
-				compressed = igraph.Graph(directed=True)
-				#preserve the trace header
-				compressed["header"] = traceSub["header"]
-				compressed["name"] = compSub["name"]
+			#preserve the trace header; the variant's .g body is rendered once, and shared by its traces
+			if compressedGraph.GBody is None:
+				compressedGraph.GBody = self._sub2GBody(compressedGraph)
+			compressed = compressedGraph.Copy(traceSub.Header)
+		else:
+			#else do nothing, just add trace to uncompressed list
+			self._nonCompressedSubs.append(traceSub.OldXpId)
 				
+		return compressed
+
+	"""
+	The set arithmetic of _compressTraceSub(), which only depends on the graph of @traceSub, not on the trace.
+
+	Returns: contains, whether the trace is maximally compressed (equals a single-vertex compSub), the vertex and edge lists (and name) of the
+	compressed graph (None if the trace does not contain compSub), and an empty delEdges; see _variantFromRaw()
+	"""
+	def _compressVariantSub(self, traceSub, compSub, mayContain):
+		compressed = None
+		contains = mayContain and self._traceContainsSubgraph(traceSub, compSub)
+		isMaxCompressed = False
+		if contains:
+			#see header: return the compressing substructure with one reflexive loop
+			if self._traceEqualsSubgraph(traceSub, compSub) and len(compSub.Vertices) == 1:
+				isMaxCompressed = True
+				#just copy the sub and add a reflexive loop
 				#prepare the compressed sub with a single node and single reflexive edge
 				compNodeSet = self._getNodeSet(compSub)
 				if len(compNodeSet) == 0:
-					compressed.add_vertices([compSub["name"]])
+					vertices = [compSub.Name]
 				else: #else add whatever vertices the compressed structure already had
-					vertices = [v["name"] for v in compSub.vs]
-					compressed.add_vertices(vertices)
+					vertices = list(compNodeSet)
 				
 				compEdgeSet = self._getEdgeSet(compSub)
 				if len(compEdgeSet) == 0:
 					#add a single reflexive loop
-					compressed.add_edges([(compSub.vs[0]["name"], compSub.vs[0]["name"])])
+					edges = [(vertices[0], vertices[0])]
 				else:
-					compressed.add_edges(list(compEdgeSet))	
+					edges = list(compEdgeSet)
+				compressed = (vertices, edges, compSub.Name)
 			#trace properly contains the substructure, so compress wrt it
 			else:
 				#print("CONTAINMENT")
 				#build a new, compressed subgraph from scratch, but keeping the old one's indentifying header
-				compressed = igraph.Graph(directed=True)
-				#preserve the header
-				compressed["header"] = traceSub["header"]
 				#use set arithmetic to compress the trace wrt the compressing substructure
 				compEdgeSet = self._getEdgeSet(compSub)
 				traceEdgeSet = self._getEdgeSet(traceSub)
@@ -372,16 +785,16 @@ class LogCompressor(object):
 				newVertices = [v for v in traceNodeSet.difference(compNodeSet)]
 				#print("old vertices: "+str(traceNodeSet))
 				#print("new vertices: "+str(newVertices))
-				newVertices += [compSub["name"]] #add the new metanode
+				newVertices += [compSub.Name] #add the new metanode
 				newEdges = []
 				#build the edge set, redirecting all in-edges to the substructure to point at SUB1, all out-edges from the substructure to point from SUB1
 				for e in traceEdgeSet:
 					#detect edges incident to substructure
 					if e[0] not in compNodeSet and e[1] in compNodeSet:
-						newEdges.append((e[0],compSub["name"]))
+						newEdges.append((e[0],compSub.Name))
 					#detect out-edges from substructure
 					elif e[0] in compNodeSet and e[1] not in compNodeSet:
-						newEdges.append((compSub["name"],e[1]))
+						newEdges.append((compSub.Name,e[1]))
 					#detect edges unconnected to substructure
 					elif e[0] not in compNodeSet and e[1] not in compNodeSet:
 						newEdges.append(e)
@@ -399,105 +812,66 @@ class LogCompressor(object):
 					newEdges.append((newVertices[0],newVertices[0]))
 
 				#print(str(newVertices))
-				compressed.add_vertices(newVertices)
 				#print(str(newEdges))
-				compressed.add_edges(newEdges)
-		else:
-			#else do nothing, just add trace to uncompressed list
-			self._nonCompressedSubs.append(traceSub["oldXpId"])
+				compressed = (newVertices, newEdges, None)
 				
-		return compressed
+		return contains, isMaxCompressed, compressed, []
 		
 	"""
-	Given the list of compressed and uncompressed traces, appends a string to the dendrogram.txt
-	file as described in the header: ([1,2,3]4,5,6:SUB_NAME)7,8,9
-	Additionally, the id mapping is appended, indicating the mapping of old xp-ids to new one's. This is a defect of
+	Given the list of compressed and uncompressed traces, appends a compression level to the dendrogram.txt
+	file as described in the header.
+	Additionally, the level holds the id mapping, indicating the mapping of old xp-ids to new one's. This is a defect of
 	SUBDUE/gbad, which requires sequentially incrementing id's, starting at 1. Hence removing any traces breaks
-	the sequence, and gbad crashes. A new sequence is generated, so the map string just preserves the id mappings as:
-		{1:2,4:4,3:-1} 
+	the sequence, and gbad crashes. A new sequence is generated, so the map just preserves the id mappings as:
+		1 -> 2, 4 -> 4, 3 -> -1
 	Here, the old xp-id '1' maps to '2' in the new compressed log, 4 to 4, and 3 is set to -1 to indicate it was removed
 	and is not in the new log.
 	
-	THIS IS SERIALIZATION: CHANGE THIS CODE AND THE DESERIALIZATION IN ANOMALYREPORTER/DENDROGRAM.PY ARE BROKEN
+	THIS IS SERIALIZATION: the level format is defined in DendrogramStore.py, and read back by Dendrogram.py/AnomalyReporter
 	
 	@edgeFreqs: A frequency table of ('a','b') -> freq  key/value pairs giving the distribution of edges for this substructure. Often this will be empty. It
 	is passed along as information stuffed into the dendrogram.txt file
 	"""
 	def _appendToDendrogram(self, compSub, compSubName, compressedSubs, deletedSubs, edgeFreqs):
-		s = "("
-		#add the max compressed ids
-		if len(self._maxCompressedSubs) > 0:
-			s += "["
-			for name in sorted([int(id) for id in self._maxCompressedSubs]):
-				s += str(name)+","
-			s = s[:-1] #snip the last comma
-			s += "]"
-		else:
-			s += "[]"
-		#add the rest of the compressed ids
-		for name in sorted([int(id) for id in self._compressedSubs]):
-			s += str(name)+","
-		s = s[:-1]    #snip the last comma
-		#s += (":" + compSubName + ")") #add sub info
-		s += (":" + compSubName + ":"+str(compSub["instances"])+":"+str(compSub["compValue"])+")") #add sub info
-		#add the noncompressed trace ids
-		if len(self._nonCompressedSubs) > 0:
-			for name in sorted([int(id) for id in self._nonCompressedSubs]):
-				s += str(name)+","
-			#snip the last comma
-			s = s[:-1]
-
-		#build the mapping string; this preserves the trace-id mapping info across iterations, since they change
-		mstr = "{"
+		#build the id map; this preserves the trace-id mapping info across iterations, since they change
+		idMap = []
 		for sub in compressedSubs:   #the traces that will be preserved in the next iteration
 			#FAILING HERE??? Don't forget to pass --deleteSubs
 			try:
-				mstr += (str(sub["oldXpId"]) + ":" + str(sub["newXpId"]) + ",")
+				idMap.append((sub.OldXpId, sub.NewXpId))
 			except:
 				print("Exception thrown in SubdueLogCompressor. Likely due to missing --deleteSubs parameter")
-		if len(deletedSubs) > 0:	
-			for sub in deletedSubs: #the traces that were removed on this iteration; these will point to -1 to indicate their removal
-				mstr += (str(sub["oldXpId"]) + ":-1,")
-		mstr = mstr[:-1] #snip the last comma
-		mstr += "}"
-		
-        #add the complete graph description of the compressing substructure as a csv list of edges as v1->v2 directed pairs
-		mstr += "#"
-		mstr += str(list(self._getEdgeSet(compSub)))
+		for sub in deletedSubs: #the traces that were removed on this iteration; these will point to -1 to indicate their removal
+			idMap.append((sub.OldXpId, -1))
 
-		#add the distribution of edges that connected to the compressing substructure; this will often be empty, such as when no edges remain
-		mstr += "#"
-		mstr += str(edgeFreqs)
-		
-		"""
-		for edge in compSub.es:
-		mstr += (compSub.vs[edge[0]]["name"]+"->"compSub.vs[edge[0]]["name"]+",")
-		#delete the lastly appended comma
-		mstr = mstr[0:len(mstr)-1]
-		"""
+		#the level holds the complete graph description of the compressing substructure as its list of edges, and the distribution
+		#of edges that connected to the compressing substructure; this will often be empty, such as when no edges remain
+		level = DendrogramStore.MakeLevel(compSubName, compSub.Instances, compSub.CompValue,
+			sorted([int(id) for id in self._maxCompressedSubs]),
+			sorted([int(id) for id in self._compressedSubs]),
+			sorted([int(id) for id in self._nonCompressedSubs]),
+			idMap, list(self._getEdgeSet(compSub)), edgeFreqs)
 
-		f = open("dendrogram.txt","a+")
-		f.write(s+mstr+"\n")
-		f.close()
+		self._writeDendrogramLevel(level)
 
 	"""
-	Given a igraph Graph g representing a subgraph/trace from the gbad input,
+	Given a TraceGraph g representing a subgraph/trace from the gbad input,
 	returns all edges as a set of named pairs (source, dest).
 	"""
 	def _getEdgeSet(self,g):
-		return set([(g.vs[e.source]["name"], g.vs[e.target ]["name"]) for e in g.es])
+		return g.Edges
 		
 	"""
-	Returns the list of node names in some graph g.
+	Returns the set of node names in some graph g.
 	"""
 	def _getNodeSet(self,g):
-		return set([v["name"] for v in g.vs])
+		return g.Vertices
 
 	"""
 	Detects whether or not a particular trace subgraph contains some compressing substructure.
 
-	@subTrace: An igraph representation of a trace in the .g log
-	@compSub: A compressing substructure also represented as an igraph
+	@subTrace: A TraceGraph representation of a trace in the .g log
+	@compSub: A compressing substructure also represented as a TraceGraph
 
 	Returns: True if the subtrace contains (and may be equal to) the compSub
 	"""
@@ -507,7 +881,7 @@ class LogCompressor(object):
 		subEdgeSet =  self._getEdgeSet(subTrace)
 		compEdgeSet = self._getEdgeSet(compSub)
 
-		#print("sub ["+subTrace["header"]+": "+str(subNodeSet)+"\ncomp: "+str(compNodeSet))
+		#print("sub ["+subTrace.Header+": "+str(subNodeSet)+"\ncomp: "+str(compNodeSet))
 		#print("subed: "+str(subEdgeSet)+"\ncomped: "+str(compEdgeSet))
 		
 		#note < and > check for proper subsets
@@ -525,18 +899,33 @@ class LogCompressor(object):
 	@bestSub: Best-compressing substructure wrt which this log will be compressed
 	@deleteSub: Flag, if true, delete all substructure instances instead of compressing them
 	
+	Only the traces found by the edge index (see TraceEdgeIndex) may contain bestSub, so only these are tested for containment. Each
+	variant (distinct trace graph) is only compressed once; the id bookkeeping is still done per trace, in log order. With multiple workers, the
+	variants are compressed in a process pool up front (the map), and this bookkeeping is the deterministic reduce: newXpIds are assigned, and the
+	connecting edges counted, in the original trace order, exactly as in a serial run.
+	The index is built on the first call for a log, and then updated with the compressed and deleted traces.
+	
 	Returns: List of compressed subs, the deleted subs (only meaningful/non-empty if deleteSub=True), and edge frequencies for each
 	"""
 	def _compressAllTraces(self, traceSubs, bestSub, deleteSub=False):
 		compressedSubs = []
 		deletedSubs = []
 		connectingEdgeFreqs = dict() #the edge collection; this is constructed as a frequency table since in/out edges may not occur the same in every compressable trace (although this will normally be true)
+		if self._edgeIndex is None:
+			self._edgeIndex = TraceEdgeIndex(traceSubs)
+		#None if every trace is a candidate
+		candidates = self._edgeIndex.Candidates(bestSub.Edges)
+		#logs have many duplicate traces, so each variant (distinct graph) is compressed once, and the result fanned out to its traces
+		variants = {}
+		if self._numWorkers > 1:
+			self._compressVariantsInPool(traceSubs, bestSub, deleteSub, candidates, variants)
 		
 		for trace in traceSubs:
+			mayContain = candidates is None or trace.Edges in candidates
 			#if deleteSub, delete the substructure; if no vertices remain, the subgraph is no longer in the trace
 			if deleteSub:
-				#print("DELETING SUB: "+bestSub["name"])
-				sub, connectingEdges = self._deleteTraceSub(trace, bestSub)
+				#print("DELETING SUB: "+bestSub.Name)
+				sub, connectingEdges = self._deleteTraceSub(trace, bestSub, mayContain, variants)
 				#record connecting edges for this trace and bestSub
 				for edge in connectingEdges:
 					if edge in connectingEdgeFreqs.keys():
@@ -545,84 +934,80 @@ class LogCompressor(object):
 						connectingEdgeFreqs[edge] = 1
 
 				#if sub is None or a single vertex (entire subgraph was deleted), just ignore it
-				if sub is not None and len(sub.vs) > 1:
+				if sub is not None and len(sub.Vertices) > 1:
 					"""
 					#bug check
-					if len(sub.vs) == 0:
-						print("ERROR empty sub detected  Edges: "+str(len(sub.es)))
-					if len(sub.vs) == 1:377
-						print("WARNING single-vertex sub detected.  Edges: "+str(len(sub.es)))
+					if len(sub.Vertices) == 0:
+						print("ERROR empty sub detected  Edges: "+str(len(sub.EdgeList)))
+					if len(sub.Vertices) == 1:377
+						print("WARNING single-vertex sub detected.  Edges: "+str(len(sub.EdgeList)))
 					"""
-					sub["oldXpId"]  = trace["oldXpId"]
-					sub["newXpId"] = self._newXpIdCtr
+					sub.OldXpId  = trace.OldXpId
+					sub.NewXpId = self._newXpIdCtr
 					self._newXpIdCtr += 1
 					compressedSubs.append(sub)
+					if sub is not trace:
+						self._edgeIndex.Replace(trace, sub)
 				else:
 					#print("DELETED >>>>>>>>>>>>>")
-					self._maxCompressedSubs.add(trace["oldXpId"])
+					self._maxCompressedSubs.add(trace.OldXpId)
 					deletedSubs.append(trace)
+					self._edgeIndex.Remove(trace)
 			else:
-				sub = self._compressTraceSub(trace, bestSub)
+				sub = self._compressTraceSub(trace, bestSub, mayContain, variants)
 				compressedSubs.append(sub)
+				if sub is not trace:
+					self._edgeIndex.Replace(trace, sub)
 
 		return compressedSubs, deletedSubs, connectingEdgeFreqs
 		
 
 	"""
-	Given a .g log formatted as input to gbad/subdue, builds a 
+	Given a .g log formatted as input to gbad/subdue, builds a TraceGraph for each of its traces.
+	The log is streamed one trace at a time (see GLogReader), so only the TraceGraphs are held in memory.
 	Note that this will disregard comments in the log.
 
 	@logPath: Path to compressed.g log
 	
-	Returns: A list of subgraphs representing all traces in the log, as igraph.Graphs. The vertices of the
-	subgraphs preserve the gbad input vertex ids in the vertex "subdueId" attribute (eg, g.vs[1]["subdueId"])
+	Returns: A list of subgraphs representing all traces in the log, as TraceGraphs.
 	"""
 	def _buildAllTraces(self, logPath):
-			logFile = open(logPath,"r")
-			subgList = []
-			
-			i = 0
-			lines = [line.strip() for line in logFile.readlines()]
-			logFile.close()
-			
-			#chop header string, if there is one 
-			if lines[0][0:2] != "XP":
-				lines = lines[1:]
-			fileStr = "\n".join(lines)
-			#print("FILESTR: "+fileStr)
-			
-			if len(lines) < 5: #sanity check
-				print("WARNING len(lines) < 5 in SubdueLogCompressor._buildAllTraces()")
-			
-			
-			if "~" in fileStr:
-				print("ERROR tilde used as special anchor in _buildAllTrace. File may not contain tildes.")
+		subgList = []
+		#identical trace graphs share their vertex and edge sets, so variants are found by identity (see _variantResult)
+		graphs = {}
+		for record in GLogReader.ReadTraces(logPath):
+			if record.XpId() is None:
+				print("ERROR no trace id in header "+record.Header+" in SubdueLogCompressor._buildAllTraces()")
+			subg = self._declarationsToGraph(record.Vertices, record.Edges, record.Header, record.XpId())
+			key = (subg.Vertices, subg.Edges)
+			if key in graphs:
+				subg.Vertices, subg.Edges = graphs[key]
+			else:
+				graphs[key] = key
+			subgList.append(subg)
 
-			#format the line tokens into a list of strings, each representing a .g subgraph definition, but with newlines replaced by tilde
-			xpTokens = ["XP "+token.strip() for token in fileStr.split("XP") if len(token.strip()) > 3]
-			xpTokens = [token.replace("\n","~") for token in xpTokens]
-			
-			#xpTokens = [token.replace("\n","~").replace("~~","~") for token in fileStr.replace("XP","~XP").split("~") if len(token.strip()) > 0]
-			#for token in xpTokens:
-			#	print(token)
-			#exit()
-			#convert all 'XP' strings to subgraphs
-			#print("BuildAll ("+logPath+"): "+xpTokens[0])
-			subgList = [self._subDeclarationToGraph(xpToken) for xpToken in xpTokens]
+		if len(subgList) == 0: #sanity check
+			print("WARNING no traces found in SubdueLogCompressor._buildAllTraces() for "+logPath)
 
-			return subgList
+		return subgList
 
 	"""
 	Assumptions: the .g substructures are all "d" edges.
 
-	Returns: The best substructure, as an igraph.Graph structure.
+	Returns: The best substructure, as a TraceGraph, preserving the gbad vertex ids in its SubdueIds.
 	"""
 	def _parseBestSubstructure(self,subsPath):
-		vertexDict = {}
-		edges = []
+		subsFile = open(subsPath,"r")
+		subsText = subsFile.read()
+		subsFile.close()
+		return self._parseBestSubstructureText(subsText)
 
+	"""
+	Parses the best substructure from @subsText, the text output of gbad/subdue.
+	"""
+	def _parseBestSubstructureText(self,subsText):
 		#get the raw subs file string (gbad/subdue output) (replacing linefeeds with some temp pattern makes things easier for re's)
-		subsRaw = open(subsPath,"r").read().replace("\r\n","\n").replace("\n","~")
+		subsRaw = subsText.replace("\r\n","\n").replace("\n","~")
 		#print("raw subs:\n"+subsRaw)
 		if len(subsRaw) < 50:
 			print("WARNING Possibly empty substructure file detected. Contents:\n"+subsRaw)
@@ -641,71 +1026,33 @@ class LogCompressor(object):
 		open("gbadThresh.txt","w+").write(str(gbadThreshold))
 		#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 		#print("start: "+str(start))
-		subsRaw = subsRaw[start : subsRaw.find("~~", start)] #gets the "Normative Pattern.*\n\n" string
+		#the declarations are cut from the text itself, not subsRaw, so labels may contain tildes
+		subsText = subsText.replace("\r\n","\n")
+		subsText = subsText[start : subsText.find("\n\n", start)] #gets the "Normative Pattern.*\n\n" string
 		#find the precise start of the vertex declarations
-		subsRaw = subsRaw[ subsRaw.find("    v ") : ]
-		print("subs raw: "+subsRaw)
-		sub = self._subDeclarationToGraph(subsRaw,hasXpHeader=False)
+		subsText = subsText[ subsText.find("    v ") : ]
+		print("subs raw: "+subsText.replace("\n","~"))
+		vertexDict, edges = GLogReader.ParseDeclarations(subsText.split("\n"))
+		sub = self._declarationsToGraph(vertexDict, edges)
+		#preserve the subdue vertex id's of substructures as strings, for their graphml
+		sub.SubdueIds = dict([(vertexDict[k], str(k)) for k in vertexDict.keys()])
 		#store additional data in the graph
-		sub["instances"] = int(subCt)
-		sub["compValue"] = compValue
+		sub.Instances = int(subCt)
+		sub.CompValue = compValue
 		
 		return sub
 		
 	"""
-	Converts a substructure (subgraph) declaration string in .g format to an igraph.Graph structure.
+	Converts the vertex and edge declarations of a trace or substructure, as parsed by GLogReader, to a TraceGraph.
 
-	@subStr: The substructure string starting with 'XP' and newlines replaced with tilde
-	but with all newlines replaced by tilde (just a parsing trick).
-	@hasXpHeader: Whether or not @subStr begins with 'XP # 123'. The gbad output of the best substructure doesn't have this.
+	@vertexDict: The vertex declarations, as a dict of vertex id -> name
+	@edges: The edge declarations, as (src id, dst id, label) tuples; the labels are meaningless, and all edges are assumed DIRECTED
+	@header: The trace's 'XP # 123' line. The gbad output of the best substructure doesn't have this.
+	@oldXpId: The trace's id, from its header
 	
-	Returns: The igraph.Graph structure representing this substructure, having node "name"/"label" attributes
-	that coincide with the declared vertex names.
+	Returns: The TraceGraph representing this substructure, whose vertices are the declared vertex names.
 	"""
-	def _subDeclarationToGraph(self, subStr, hasXpHeader=True):
-		substructure = igraph.Graph(directed=True)
-		vertexDict = {}
-		edges = []
-		
-		#print("HasXpHeader: "+str(hasXpHeader))
-		#print("SUBSTR: "+subStr)
-		
-		lineTokens = subStr.split("~")
-
-		#utilitarian logic for this function, just facilitates parsing logic via @tokenBegin
-		if hasXpHeader:
-			#print("HERE: "+str(lineTokens[0]))
-			substructure["header"] = lineTokens[0]
-			
-			if "#" not in lineTokens[0]:
-				print("DEAD: ")
-				for token in lineTokens:
-					print("tok: "+token)
-			
-			substructure["oldXpId"] = lineTokens[0].split("#")[1].strip()
-			tokenBegin = 1
-		else:
-			tokenBegin = 0
-			
-		#within the string, find all the "v" and "d" (edge) declarations
-		for line in lineTokens[tokenBegin:]:
-			ln = line.strip()
-			if len(ln) > 2:
-				#parse a vertex declaration
-				if "v " == ln[0:2]:
-					vName = ln.split("\"")[1]
-					vId = int(ln.split(" ")[1])
-					vertexDict[vId] = vName
-				#parse an edge declaration (the labels are meaningless; and all are assumed DIRECTED)
-				elif "d "== ln[0:2]:
-					e = (int(ln.split(" ")[1]), int(ln.split(" ")[2]))
-					edges.append(e)
-
-		#print(str(edges))
-		#print(str(vertexDict))
-		
-		#add all of the vertices
-		#substructure.add_vertices(vertexDict.values())
+	def _declarationsToGraph(self, vertexDict, edges, header=None, oldXpId=None):
 		#add all of the edges (by name)
 		edges = [(vertexDict[e[0]], vertexDict[e[1]]) for e in edges]
 		vertices = []
@@ -716,28 +1063,33 @@ class LogCompressor(object):
 		#add vertices parsed separately; this is redundant, but the uniquify step below resolve potential repetition. The step is necessary for single vertex, no edge subgraphs, a degenerate case of subdue output
 		for v in vertexDict.values():
 			vertices.append(v)
-		#uniquify the vertex set
-		vertices = list(set(vertices))
-		#print("adding vertices: "+str(vertices))
-		substructure.add_vertices(vertices)
-		#preserve the subdue vertex id's as strings (it may be useful to preserve these)
-		for v in substructure.vs:
-			for k in vertexDict.keys():
-				if vertexDict[k] == v["name"]:
-					v["subdueId"] = str(k)
-		
-		#copy name as label attributes of vertices for display
-		for v in substructure.vs:
-			v["label"] = v["name"]
-		
-		#print("adding edges: "+str(edges))
-		substructure.add_edges(edges)
-				
-		return substructure
+		#the TraceGraph uniquifies the vertex set
+		return TraceGraph(vertices, edges, header, oldXpId)
+
 
+#the variants to compress, the substructure, and the delete flag, inherited by the forked workers of LogCompressor._compressVariantsInPool()
+_workerVariants = None
+_workerBestSub = None
+_workerDeleteSub = False
+
+"""
+Computes the raw results of the variants _workerVariants[start:end] in a worker.
+"""
+def _compressVariantShard(args):
+	start, end = args
+	compressor = LogCompressor()
+	if _workerDeleteSub:
+		variantFunc = compressor._deleteVariantSub
+	else:
+		variantFunc = compressor._compressVariantSub
+	return [variantFunc(trace, _workerBestSub, True) for trace in _workerVariants[start:end]]
 				
 def usage():
 	print("usage: python SubdueLogCompressor.py [subgraph .g file] [substructure prototype file (subdue/gbad text output)] [output path for new compressed .g log] [optional: name=name of compressed structure]")
+	print("--recurse=N --gbad=[gbad (or stand-in) executable] [--gbadThreshold=0.1] [--results=file]: compress recursively in this process for up to N iterations,")
+	print("  running gbad -mdl on the compressed log each iteration and appending its output to the results file")
+	print("--workers=N: compress the traces across N processes (output is identical to a serial run)")
+	print("--gzip: gzip the compressed log (not with --recurse, since gbad reads each iteration's log)")
 	print("--showSub: pass to display the parsed substructure")
 	print("--deleteSub: pass to delete the substructure from the log. Single node w/out edges will be converted to reflexive nodes.")
 	print("WARNING make sure input has only single line-feed line terminals (linux style), not windows style!!")
@@ -763,7 +1115,31 @@ if __name__ == "__main__":
 		compSubName = "SUBx"
 
 	deleteSub = "--deleteSubs" in sys.argv or "--deleteSubs=true" in sys.argv
+	gzipOutput = "--gzip" in sys.argv or "--gzip=true" in sys.argv
 	showSub = "--showSub" in sys.argv
+	numIterations = 0
+	gbadPath = None
+	gbadThreshold = "0.1"
+	resultsPath = None
+	numWorkers = 1
+	for arg in sys.argv:
+		if "--recurse=" in arg:
+			numIterations = int(arg.split("=")[1])
+		if "--gbad=" in arg:
+			gbadPath = arg.split("=")[1]
+		if "--gbadThreshold=" in arg:
+			gbadThreshold = arg.split("=")[1]
+		if "--results=" in arg:
+			resultsPath = arg.split("=")[1]
+		if "--workers=" in arg:
+			numWorkers = int(arg.split("=")[1])
 	
-	compressor = LogCompressor()
-	compressor.Compress(inputLog, subsFile, outputLogPath, compSubName, showSub, deleteSub)
+	compressor = LogCompressor(numWorkers, gzipOutput)
+	if numIterations > 0:
+		if gbadPath is None:
+			print("ERROR --recurse requires --gbad=[path to gbad executable] in SubdueLogCompressor.py")
+			usage()
+			exit()
+		compressor.CompressRecursively(inputLog, subsFile, outputLogPath, [gbadPath, "-mdl", gbadThreshold], numIterations, deleteSub, resultsPath)
+	else:
+		compressor.Compress(inputLog, subsFile, outputLogPath, compSubName, showSub, deleteSub)
@@ -0,0 +1,323 @@
+"""
+The trace-graph store written by the Retracer (GenerateTraceSubgraphs.py) and read by the AnomalyReporter: the replayed graph of
+each trace, as its list of (activity, activity) edges.
+
+Trace graphs were previously written to traceGraphs.py as one (traceNo,[('a','b'),...]) python literal per line, and read back by
+eval()'ing every line, which is slow on logs with long traces. The store instead holds the activities once, in a dictionary table,
+and interns identical edge lists as variants: the edges of each variant are a slice of a single int32 array of (source id, target id)
+pairs, given by a per-variant offset, and each trace maps to its variant id. Many traces share the same replayed graph, so the store
+shrinks by the duplication factor of the log. The writer streams the variants' edge pairs, and the trailing index is written on Close(),
+so memory stays flat while writing. The reader memory-maps the file and decodes only the traces (or variants) that are requested.
+
+File layout:
+	4 bytes			magic "PTG2"
+	int32[2*numEdges]	edge pairs (source activity id, target activity id), variant after variant
+	int64[numVariants+1]	offsets: the edges of variant v are the pairs offsets[v] to offsets[v+1]-1
+	int64[numTraces]	trace ids, in write order
+	int32[numTraces]	the variant id of each trace
+	json footer		{"activities": [names], "numTraces": n, "numVariants": v, "numEdges": m}
+	uint32			length of the json footer
+	4 bytes			magic "PTG2"
+All arrays are little-endian.
+
+Usage:
+	writer = TraceGraphWriter(path)
+	writer.Add(traceNo, [('a','b'), ...])	#or writer.AddTrace(traceNo, writer.AddVariant([('a','b'), ...]))
+	writer.Close()
+
+	store = Load(path)	#also reads the legacy traceGraphs.py format
+	store[traceNo]		-> [('a','b'), ...]
+	store.GetVariantId(traceNo), store.GetVariant(variantId), store.VariantCounts()
+
+Stores of the first, "PTG1" version, which held one edge list per trace, are not read by Load(); ConvertLegacy() (and so
+"python TraceGraphStore.py [old store] [new store]") converts them, as it does traceGraphs.py files.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import ast
+import json
+import mmap
+import struct
+import array
+import hashlib
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ConversionScripts"))
+import BinaryArtifact
+
+MAGIC = b"PTG2"
+#the magic of the first version of the store, one edge list per trace, without variants
+V1_MAGIC = b"PTG1"
+
+"""
+Streams trace graphs to a store at @path, interning identical edge lists as a single variant.
+"""
+class TraceGraphWriter(object):
+	def __init__(self, path, bufferSize=1 << 20):
+		self._file = open(path, "wb", bufferSize)
+		self._file.write(MAGIC)
+		self._ids = {}
+		self._activities = []
+		#maps the sha1 digest of a variant's encoded edge pairs -> variant id; digests keep memory flat on logs with many variants
+		self._variants = {}
+		self._variantOffsets = array.array("q", [0])
+		self._traceIds = array.array("q")
+		self._traceVariants = array.array("i")
+
+	def _activityId(self, activity):
+		if activity not in self._ids:
+			self._ids[activity] = len(self._activities)
+			self._activities.append(activity)
+		return self._ids[activity]
+
+	"""
+	Appends the graph of trace @traceNo, given as a list of (srcName, dstName) edges. The edges are only written if no previous
+	trace had the identical edge list.
+	"""
+	def Add(self, traceNo, edges):
+		self.AddTrace(traceNo, self.AddVariant(edges))
+
+	"""
+	Interns the edge list @edges, writing it if no previous variant had the identical edge list, and returns its variant id.
+	Callers that know which traces share an edge list can intern it once, and append each trace with AddTrace().
+	"""
+	def AddVariant(self, edges):
+		pairs = array.array("i")
+		for edge in edges:
+			pairs.append(self._activityId(edge[0]))
+			pairs.append(self._activityId(edge[1]))
+		pairBytes = BinaryArtifact.ArrayBytes(pairs)
+		key = hashlib.sha1(pairBytes).digest()
+		if key not in self._variants:
+			self._variants[key] = len(self._variantOffsets) - 1
+			self._file.write(pairBytes)
+			self._variantOffsets.append(self._variantOffsets[-1] + len(edges))
+		return self._variants[key]
+
+	"""
+	Appends trace @traceNo as the variant @variantId, as returned by AddVariant().
+	"""
+	def AddTrace(self, traceNo, variantId):
+		self._traceIds.append(traceNo)
+		self._traceVariants.append(variantId)
+
+	def Close(self):
+		self._file.write(BinaryArtifact.ArrayBytes(self._variantOffsets))
+		self._file.write(BinaryArtifact.ArrayBytes(self._traceIds))
+		self._file.write(BinaryArtifact.ArrayBytes(self._traceVariants))
+		footer = {"activities": self._activities, "numTraces": len(self._traceIds), "numVariants": len(self._variantOffsets) - 1, "numEdges": self._variantOffsets[-1]}
+		footerBytes = json.dumps(footer, separators=(",",":")).encode("utf-8")
+		self._file.write(footerBytes)
+		self._file.write(struct.pack("<I", len(footerBytes)))
+		self._file.write(MAGIC)
+		self._file.close()
+
+"""
+Random access to the trace graphs in a store. Behaves as a read-only dict of traceNo -> [(srcName, dstName), ...] (the per-trace view),
+and also exposes the variants: the distinct edge lists, by variant id, with the number of traces sharing each (the per-variant view).
+"""
+class TraceGraphStore(object):
+	def __init__(self):
+		self.Activities = []
+		self.TraceIds = array.array("q")
+		self.TraceVariants = array.array("i")
+		self.VariantOffsets = array.array("q", [0])
+		self.EdgePairs = array.array("i")
+		self._index = {}
+		self._file = None
+		self._map = None
+
+	"""
+	Opens the store at @path, memory-mapping its arrays (or reading them, on big-endian hosts).
+	"""
+	def Open(self, path):
+		self._file = open(path, "rb")
+		self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		size = len(self._map)
+		if self._map[0:4] != MAGIC or self._map[size-4:size] != MAGIC:
+			raise ValueError("Not a trace-graph store: "+path)
+		footerLen = struct.unpack("<I", self._map[size-8:size-4])[0]
+		footer = json.loads(self._map[size-8-footerLen:size-8].decode("utf-8"))
+		self.Activities = footer["activities"]
+		n = footer["numTraces"]
+		v = footer["numVariants"]
+		m = footer["numEdges"]
+
+		view = memoryview(self._map)
+		edgeStart = 4
+		offsetStart = edgeStart + 8*m
+		traceIdStart = offsetStart + 8*(v+1)
+		traceVariantStart = traceIdStart + 8*n
+		if sys.byteorder == "little":
+			self.EdgePairs = view[edgeStart:offsetStart].cast("i")
+			self.VariantOffsets = view[offsetStart:traceIdStart].cast("q")
+			self.TraceIds = view[traceIdStart:traceVariantStart].cast("q")
+			self.TraceVariants = view[traceVariantStart:traceVariantStart + 4*n].cast("i")
+		else:
+			self.EdgePairs = BinaryArtifact.ReadArray("i", view[edgeStart:offsetStart])
+			self.VariantOffsets = BinaryArtifact.ReadArray("q", view[offsetStart:traceIdStart])
+			self.TraceIds = BinaryArtifact.ReadArray("q", view[traceIdStart:traceVariantStart])
+			self.TraceVariants = BinaryArtifact.ReadArray("i", view[traceVariantStart:traceVariantStart + 4*n])
+		self._index = dict([(self.TraceIds[i], i) for i in range(n)])
+		return self
+
+	"""
+	Builds an in-memory store from a dict of traceNo -> edge list, as read from the legacy traceGraphs.py format.
+	"""
+	def FromDict(self, traceGraphs):
+		ids = {}
+		variants = {}
+		for traceNo in traceGraphs:
+			pairs = array.array("i")
+			for edge in traceGraphs[traceNo]:
+				for activity in edge:
+					if activity not in ids:
+						ids[activity] = len(self.Activities)
+						self.Activities.append(activity)
+					pairs.append(ids[activity])
+			key = pairs.tobytes()
+			if key not in variants:
+				variants[key] = len(self.VariantOffsets) - 1
+				self.EdgePairs.extend(pairs)
+				self.VariantOffsets.append(len(self.EdgePairs) // 2)
+			self.TraceIds.append(traceNo)
+			self.TraceVariants.append(variants[key])
+		self._index = dict([(self.TraceIds[i], i) for i in range(len(self.TraceIds))])
+		return self
+
+	def Close(self):
+		#release the array views before the map they point into
+		self.EdgePairs = self.VariantOffsets = self.TraceIds = self.TraceVariants = None
+		if self._map is not None:
+			self._map.close()
+			self._file.close()
+			self._map = None
+
+	def NumVariants(self):
+		return len(self.VariantOffsets) - 1
+
+	"""
+	Returns the variant id of trace @traceNo.
+	"""
+	def GetVariantId(self, traceNo):
+		return self.TraceVariants[self._index[traceNo]]
+
+	"""
+	Returns the edges of variant @variantId, as (source id, target id) pairs into self.Activities.
+	"""
+	def GetVariantEdgeIds(self, variantId):
+		pairs = self.EdgePairs[2*self.VariantOffsets[variantId]:2*self.VariantOffsets[variantId+1]].tolist()
+		return list(zip(pairs[0::2], pairs[1::2]))
+
+	"""
+	Returns the edges of variant @variantId, as (srcName, dstName) tuples.
+	"""
+	def GetVariant(self, variantId):
+		activities = self.Activities
+		return [(activities[src], activities[dst]) for src, dst in self.GetVariantEdgeIds(variantId)]
+
+	"""
+	Returns the number of traces sharing each variant, indexed by variant id.
+	"""
+	def VariantCounts(self):
+		counts = [0] * self.NumVariants()
+		for variantId in self.TraceVariants:
+			counts[variantId] += 1
+		return counts
+
+	def __getitem__(self, traceNo):
+		return self.GetVariant(self.GetVariantId(traceNo))
+
+	def __contains__(self, traceNo):
+		return traceNo in self._index
+
+	def __len__(self):
+		return len(self._index)
+
+	def __iter__(self):
+		return iter(self.keys())
+
+	def keys(self):
+		return list(self.TraceIds)
+
+"""
+Returns true if the file at @path is a trace-graph store, by its magic bytes.
+"""
+def IsTraceGraphStore(path):
+	return BinaryArtifact.HasMagic(path, MAGIC)
+
+"""
+Reads the legacy traceGraphs.py format, one (traceNo, [edgeList]) python literal per line, into a dict of traceNo -> edge list.
+"""
+def _readLegacyTraceGraphs(path):
+	traceGraphs = {}
+	with open(path, "r") as tf:
+		for line in tf:
+			if len(line.strip()) == 0:
+				continue
+			traceNo, traceGraph = ast.literal_eval(line.strip())
+			if traceNo in traceGraphs:
+				print("ERROR traceNo already in traceGraph in _readLegacyTraceGraphs")
+			traceGraphs[traceNo] = traceGraph
+	return traceGraphs
+
+"""
+Reads a "PTG1" store, whose footer holds no variant count and whose offsets index the traces directly, into a dict of traceNo -> edge list.
+"""
+def _readV1TraceGraphs(path):
+	ifile = open(path, "rb")
+	data = ifile.read()
+	ifile.close()
+	size = len(data)
+	footerLen = struct.unpack("<I", data[size-8:size-4])[0]
+	footer = json.loads(data[size-8-footerLen:size-8].decode("utf-8"))
+	activities = footer["activities"]
+	n = footer["numTraces"]
+	m = footer["numEdges"]
+	offsetStart = 4 + 8*m
+	traceIdStart = offsetStart + 8*(n+1)
+	pairs = BinaryArtifact.ReadArray("i", data[4:offsetStart])
+	offsets = BinaryArtifact.ReadArray("q", data[offsetStart:traceIdStart])
+	traceIds = BinaryArtifact.ReadArray("q", data[traceIdStart:traceIdStart + 8*n])
+	traceGraphs = {}
+	for i in range(n):
+		tracePairs = pairs[2*offsets[i]:2*offsets[i+1]]
+		traceGraphs[traceIds[i]] = [(activities[tracePairs[j]], activities[tracePairs[j+1]]) for j in range(0, len(tracePairs), 2)]
+	return traceGraphs
+
+"""
+Returns the TraceGraphStore at @path, which may be either a store or a legacy traceGraphs.py file.
+"""
+def Load(path):
+	magic = BinaryArtifact.ReadMagic(path)
+	if magic == MAGIC:
+		return TraceGraphStore().Open(path)
+	if magic == V1_MAGIC:
+		raise ValueError("Trace-graph store "+path+" was written by an older Retracer (PTG1); re-run the Retracer, or convert it with: python TraceGraphStore.py "+path+" [output store path]")
+	return TraceGraphStore().FromDict(_readLegacyTraceGraphs(path))
+
+"""
+Converts a legacy traceGraphs.py file, or a "PTG1" store, at @legacyPath to a store at @outputPath.
+"""
+def ConvertLegacy(legacyPath, outputPath):
+	if BinaryArtifact.HasMagic(legacyPath, V1_MAGIC):
+		traceGraphs = _readV1TraceGraphs(legacyPath)
+	else:
+		traceGraphs = _readLegacyTraceGraphs(legacyPath)
+	writer = TraceGraphWriter(outputPath)
+	for traceNo in traceGraphs:
+		writer.Add(traceNo, traceGraphs[traceNo])
+	writer.Close()
+
+def usage():
+	print("Usage: python TraceGraphStore.py [legacy traceGraphs.py or PTG1 store path] [output store path]")
+
+def main():
+	if len(sys.argv) < 3:
+		print("ERROR incorrect number of arguments passed to TraceGraphStore.py")
+		usage()
+		exit()
+	ConvertLegacy(sys.argv[1], sys.argv[2])
+
+if __name__ == "__main__":
+	main()
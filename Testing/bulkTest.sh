@@ -18,10 +18,10 @@ logCompressor="./SubdueLogCompressor.py"
 pnmlPath="../SyntheticData/testModel.pnml"
 pnmlConverterPath="../ConversionScripts/Pnml2Graphml.py"
 minedGraphmlPath="../SyntheticData/minedModel.graphml"
-markovModelPath="../SyntheticData/markovModel.py"
+markovModelPath="../SyntheticData/markovModel.pmm"
 subgraphGeneratorPath="./GenerateTraceSubgraphs.py"
 subdueLogPath="../SyntheticData/test.g"
-traceGraphPath="../SyntheticData/traceGraphs.py"
+traceGraphPath="../SyntheticData/traceGraphs.ptg"
 compressedLog="../SyntheticData/compressed.g"
 gbadFsmLogPath="../SyntheticData/test_fsm.g"
 
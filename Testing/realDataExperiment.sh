@@ -25,10 +25,10 @@ logCompressor="./SubdueLogCompressor.py"
 pnmlPath="$dataDir/testModel.pnml"
 pnmlConverterPath="../ConversionScripts/Pnml2Graphml.py"
 minedGraphmlPath="$dataDir/minedModel.graphml"
-markovModelPath="$dataDir/markovModel.py"
+markovModelPath="$dataDir/markovModel.pmm"
 subgraphGeneratorPath="./GenerateTraceSubgraphs.py"
 subdueLogPath="$dataDir/test.g"
-traceGraphPath="$dataDir/traceGraphs.py"
+traceGraphPath="$dataDir/traceGraphs.ptg"
 compressedLog="$dataDir/compressed.g"
 gbadFsmLogPath="$dataDir/test_fsm.g"
 
@@ -98,9 +98,9 @@ for var in "$@"; do
 		syntheticGraphmlPath="$dataDir/syntheticModel.graphml"
 		pnmlPath="$dataDir/testModel.pnml"
 		minedGraphmlPath="$dataDir/minedModel.graphml"
-		markovModelPath="$dataDir/markovModel.py"
+		markovModelPath="$dataDir/markovModel.pmm"
 		subdueLogPath="$dataDir/test.g"
-		traceGraphPath="$dataDir/traceGraphs.py"
+		traceGraphPath="$dataDir/traceGraphs.ptg"
 		compressedLog="$dataDir/compressed.g"
 		gbadFsmLogPath="$dataDir/test_fsm.g"
 	fi
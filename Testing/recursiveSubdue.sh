@@ -152,22 +152,9 @@ cat /dev/null > "dendrogram.txt"
 #run recursive-compression gbad, building a dendrogram of the subgraphs of the graph
 if [ $recursiveIterations -gt 0 ]; then
 	cp $mdlResult lastMdlResult.txt
-	#compress the best substructure and re-run; all gbad versions should output the same best-substructure, so using mdlResult.txt's ought to be fine
-	python $logCompressor $subdueLogPath lastMdlResult.txt $compressedLog name=SUB_init --deleteSubs=$deleteSubstructures
-	for i in $(seq 0 $recursiveIterations); do
-		echo Compression iteration $i
-		echo Re-running gbad mdl with threshold $gbadThreshold
-		$gbadMdlPath -mdl $gbadThreshold $compressedLog > lastMdlResult.txt
-		cat lastMdlResult.txt >> $mdlResult
-
-		#recompress the best substructure and re-run, using the previous compressed log as input and then outputting to it as well
-		python $logCompressor $compressedLog lastMdlResult.txt $compressedLog name=SUB$i --deleteSubs=$deleteSubstructures
-		#break loop once an empty log is encountered
-		emptinessTest=$(cat $compressedLog)
-		if [[ -z $emptinessTest ]]; then
-			break
-		fi
-	done
+	#compress the best substructure, then re-run gbad on the compressed log and recompress, for iterations 0 to $recursiveIterations or until the log is empty.
+	#The compressor runs this loop itself, keeping the traces in memory across iterations, and appends each gbad result to $mdlResult.
+	python $logCompressor $subdueLogPath lastMdlResult.txt $compressedLog --deleteSubs=$deleteSubstructures --recurse=$(($recursiveIterations + 1)) --gbad=$gbadMdlPath --gbadThreshold=$gbadThreshold --results=$mdlResult
 fi
 
 #REMEMBER: Once anomalies are obtained, they can be used to drive some search for the structural characteristics shared amongst